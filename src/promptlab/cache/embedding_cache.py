@@ -0,0 +1,285 @@
+import asyncio
+import hashlib
+import threading
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+
+from promptlab.db.sql import SQLQuery
+from promptlab.db.sqlite import SQLiteClient
+from promptlab.model.model import EmbeddingModel, aembed_many, embed_many
+from promptlab.types import ModelConfig
+
+
+class EmbeddingCache:
+    """
+    Persistent store of embeddings in the tracer's SQLite database, keyed on
+    (embedding model type, deployment, text hash).
+
+    Vectors are stored as packed float32 BLOBs and read back without copying
+    via numpy.frombuffer. Vectors that can't be a real embedding, such as
+    all zeros or ones holding NaN, are never stored.
+    """
+
+    def __init__(self, db_client: SQLiteClient):
+        self.db_client = db_client
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.db_client.execute_query(SQLQuery.CREATE_EMBEDDING_CACHE_TABLE_QUERY)
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def to_blob(embedding: Any) -> bytes:
+        return np.asarray(embedding, dtype=np.float32).ravel().tobytes()
+
+    @staticmethod
+    def from_blob(blob: bytes) -> np.ndarray:
+        return np.frombuffer(blob, dtype=np.float32)
+
+    @classmethod
+    def is_cacheable(cls, blob: bytes) -> bool:
+        embedding = cls.from_blob(blob)
+        return bool(np.isfinite(embedding).all() and np.any(embedding))
+
+    def get(self, model_config: ModelConfig, text: str) -> Optional[np.ndarray]:
+        rows = self.db_client.fetch_data(
+            SQLQuery.SELECT_EMBEDDING_CACHE_QUERY,
+            (
+                model_config.type,
+                model_config.embedding_model_deployment,
+                self.text_hash(text),
+            ),
+        )
+
+        with self._lock:
+            if not rows:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        return self.from_blob(rows[0]["embedding"])
+
+    def put(self, model_config: ModelConfig, text: str, embedding: Any) -> np.ndarray:
+        blob = self.to_blob(embedding)
+        if not self.is_cacheable(blob):
+            return self.from_blob(blob)
+
+        self.db_client.execute_query(
+            SQLQuery.INSERT_EMBEDDING_CACHE_QUERY,
+            (
+                model_config.type,
+                model_config.embedding_model_deployment,
+                self.text_hash(text),
+                len(blob) // 4,
+                blob,
+                time.time(),
+            ),
+        )
+
+        return self.from_blob(blob)
+
+    def get_many(
+        self, model_config: ModelConfig, texts: List[str]
+    ) -> List[Optional[np.ndarray]]:
+        hashes = [self.text_hash(text) for text in texts]
+
+        found = {}
+        # Stay well under SQLite's limit on the number of bound parameters
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start : start + 500]
+            query = SQLQuery.SELECT_EMBEDDING_CACHE_BATCH_QUERY.format(
+                placeholders=", ".join("?" * len(batch))
+            )
+            rows = self.db_client.fetch_data(
+                query,
+                (model_config.type, model_config.embedding_model_deployment, *batch),
+            )
+            found.update((row["text_hash"], row["embedding"]) for row in rows)
+
+        embeddings = [
+            self.from_blob(found[text_hash]) if text_hash in found else None
+            for text_hash in hashes
+        ]
+
+        with self._lock:
+            misses = sum(embedding is None for embedding in embeddings)
+            self.misses += misses
+            self.hits += len(embeddings) - misses
+
+        return embeddings
+
+    def put_many(
+        self, model_config: ModelConfig, texts: List[str], embeddings: List[Any]
+    ) -> List[np.ndarray]:
+        now = time.time()
+        blobs = [self.to_blob(embedding) for embedding in embeddings]
+        self.db_client.execute_query_many(
+            SQLQuery.INSERT_EMBEDDING_CACHE_QUERY,
+            [
+                (
+                    model_config.type,
+                    model_config.embedding_model_deployment,
+                    self.text_hash(text),
+                    len(blob) // 4,
+                    blob,
+                    now,
+                )
+                for text, blob in zip(texts, blobs)
+                if self.is_cacheable(blob)
+            ],
+        )
+
+        return [self.from_blob(blob) for blob in blobs]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class CachedEmbedding(EmbeddingModel):
+    """
+    Embedding model wrapper that only calls the underlying model for texts
+    that are not in the EmbeddingCache yet
+    """
+
+    def __init__(self, embedding_model: EmbeddingModel, cache: EmbeddingCache):
+        super().__init__(embedding_model.model_config)
+
+        self.embedding_model = embedding_model
+        self.cache = cache
+
+    def __call__(self, text: str) -> np.ndarray:
+        embedding = self.cache.get(self.model_config, text)
+        if embedding is None:
+            embedding = self.cache.put(
+                self.model_config, text, self.embedding_model(text)
+            )
+
+        return embedding
+
+    def embed_many(self, texts: List[str]) -> List[np.ndarray]:
+        embeddings = self.cache.get_many(self.model_config, texts)
+
+        missing = self._missing_texts(texts, embeddings)
+        if missing:
+            computed = self.cache.put_many(
+                self.model_config, missing, embed_many(self.embedding_model, missing)
+            )
+            embeddings = self._fill_missing(texts, embeddings, missing, computed)
+
+        return embeddings
+
+    async def aembed_many(self, texts: List[str]) -> List[np.ndarray]:
+        # Cache reads and writes hit SQLite, keep them off the event loop
+        embeddings = await asyncio.to_thread(
+            self.cache.get_many, self.model_config, texts
+        )
+
+        missing = self._missing_texts(texts, embeddings)
+        if missing:
+            computed = await asyncio.to_thread(
+                self.cache.put_many,
+                self.model_config,
+                missing,
+                await aembed_many(self.embedding_model, missing),
+            )
+            embeddings = self._fill_missing(texts, embeddings, missing, computed)
+
+        return embeddings
+
+    @staticmethod
+    def _missing_texts(texts, embeddings):
+        missing = (text for text, e in zip(texts, embeddings) if e is None)
+        return list(dict.fromkeys(missing))
+
+    @staticmethod
+    def _fill_missing(texts, embeddings, missing, computed):
+        computed = dict(zip(missing, computed))
+        return [
+            computed[text] if embedding is None else embedding
+            for text, embedding in zip(texts, embeddings)
+        ]
+
+
+class SharedEmbedding(EmbeddingModel):
+    """
+    In-memory embeddings shared by the cells of a sweep, so a text such as a
+    reference answer is embedded once rather than once per cell. Concurrent
+    requests for the same text wait for a single call. Only the latest
+    max_entries texts are kept.
+    """
+
+    def __init__(self, embedding_model: EmbeddingModel, max_entries: int = 10_000):
+        # User supplied embedding models may only implement __call__
+        super().__init__(getattr(embedding_model, "model_config", None))
+
+        self.embedding_model = embedding_model
+        self.max_entries = max_entries
+        self._embeddings = {}
+        self._pending = {}
+
+    def __call__(self, text: str) -> Any:
+        embedding = self._embeddings.get(text)
+        if embedding is None:
+            embedding = self.embedding_model(text)
+            self._remember({text: embedding})
+        return embedding
+
+    def embed_many(self, texts: List[str]) -> List[Any]:
+        found, missing = self._lookup(texts)
+        if missing:
+            computed = dict(zip(missing, embed_many(self.embedding_model, missing)))
+            self._remember(computed)
+            found.update(computed)
+
+        return [found[text] for text in texts]
+
+    async def aembed_many(self, texts: List[str]) -> List[Any]:
+        found, missing = self._lookup(texts)
+        missing = [text for text in missing if text not in self._pending]
+        if missing:
+            task = asyncio.ensure_future(self._aembed_missing(missing))
+            for text in missing:
+                self._pending[text] = task
+
+        tasks = {self._pending[text] for text in texts if text in self._pending}
+        for task in tasks:
+            found.update(await task)
+
+        return [found[text] for text in texts]
+
+    def clear(self) -> None:
+        self._embeddings.clear()
+
+    def _lookup(self, texts: List[str]):
+        """Embeddings of the texts that are known, and the unique other texts"""
+        found, missing = {}, []
+        for text in dict.fromkeys(texts):
+            if text in self._embeddings:
+                found[text] = self._embeddings[text]
+            else:
+                missing.append(text)
+        return found, missing
+
+    def _remember(self, embeddings) -> None:
+        self._embeddings.update(embeddings)
+        # Dicts keep insertion order, so the oldest texts go first
+        while len(self._embeddings) > self.max_entries:
+            del self._embeddings[next(iter(self._embeddings))]
+
+    async def _aembed_missing(self, texts: List[str]):
+        try:
+            embeddings = dict(
+                zip(texts, await aembed_many(self.embedding_model, texts))
+            )
+            self._remember(embeddings)
+            return embeddings
+        finally:
+            for text in texts:
+                self._pending.pop(text, None)
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Optional
+
+from promptlab.db.sql import SQLQuery
+from promptlab.db.sqlite import SQLiteClient
+from promptlab.types import CacheConfig, InferenceResult, ModelConfig
+
+
+class InferenceCache:
+    """
+    Persistent cache of model responses, stored in the tracer's SQLite database.
+
+    Entries are keyed on a hash of the model config and the rendered prompts.
+    They expire after ttl_seconds, and the least recently used entries are
+    evicted once the cache holds more than max_entries.
+    """
+
+    def __init__(self, db_client: SQLiteClient, cache_config: CacheConfig = None):
+        self.db_client = db_client
+        self.cache_config = cache_config or CacheConfig()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self.db_client.execute_query(SQLQuery.CREATE_INFERENCE_CACHE_TABLE_QUERY)
+        self.db_client.execute_query(SQLQuery.CREATE_INFERENCE_CACHE_INDEX_QUERY)
+
+        if self.cache_config.ttl_seconds is not None:
+            self.evictions += self.db_client.execute_query(
+                SQLQuery.DELETE_EXPIRED_INFERENCE_CACHE_QUERY,
+                (time.time() - self.cache_config.ttl_seconds,),
+            )
+        rows = self.db_client.fetch_data(SQLQuery.COUNT_INFERENCE_CACHE_QUERY)
+        self._entries = rows[0]["entries"]
+
+    @property
+    def bypass(self) -> bool:
+        return self.cache_config.bypass
+
+    @staticmethod
+    def key(model_config: ModelConfig, system_prompt: str, user_prompt: str) -> str:
+        request = [
+            getattr(model_config, "type", None),
+            getattr(model_config, "inference_model_deployment", None),
+            str(getattr(model_config, "endpoint", None)),
+            getattr(model_config, "api_version", None),
+            system_prompt,
+            user_prompt,
+        ]
+        return hashlib.sha256(json.dumps(request).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[InferenceResult]:
+        now = time.time()
+        rows = self.db_client.fetch_data(SQLQuery.SELECT_INFERENCE_CACHE_QUERY, (key,))
+
+        if rows and self._is_expired(rows[0]["created_at"], now):
+            deleted = self.db_client.execute_query(
+                SQLQuery.DELETE_INFERENCE_CACHE_QUERY, (key,)
+            )
+            with self._lock:
+                self._entries -= deleted
+                self.evictions += deleted
+            rows = []
+
+        if not rows:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        self.db_client.execute_query(SQLQuery.TOUCH_INFERENCE_CACHE_QUERY, (now, key))
+
+        row = rows[0]
+        return InferenceResult(
+            inference=row["inference"],
+            prompt_tokens=row["prompt_tokens"],
+            completion_tokens=row["completion_tokens"],
+            latency_ms=row["latency_ms"],
+        )
+
+    def put(self, key: str, result: InferenceResult) -> None:
+        now = time.time()
+        values = (
+            result.inference,
+            result.prompt_tokens,
+            result.completion_tokens,
+            result.latency_ms,
+            now,
+            now,
+        )
+        # Only a new key adds an entry, e.g. concurrent misses of the same
+        # prompt all put their response
+        inserted = self.db_client.execute_query(
+            SQLQuery.INSERT_INFERENCE_CACHE_QUERY, (key, *values)
+        )
+        if not inserted:
+            self.db_client.execute_query(
+                SQLQuery.UPDATE_INFERENCE_CACHE_QUERY, (*values, key)
+            )
+
+        with self._lock:
+            self._entries += inserted
+            excess = self._excess_entries()
+        if excess:
+            self._evict(excess)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": self._entries,
+        }
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        ttl_seconds = self.cache_config.ttl_seconds
+        return ttl_seconds is not None and created_at < now - ttl_seconds
+
+    def _excess_entries(self) -> int:
+        max_entries = self.cache_config.max_entries
+        if max_entries is None or self._entries <= max_entries:
+            return 0
+
+        # Evict a little more than needed so a full cache doesn't run a
+        # DELETE on every insert
+        return self._entries - max_entries + max_entries // 100
+
+    def _evict(self, count: int) -> None:
+        deleted = self.db_client.execute_query(
+            SQLQuery.EVICT_LRU_INFERENCE_CACHE_QUERY, (count,)
+        )
+        with self._lock:
+            self._entries -= deleted
+            self.evictions += deleted
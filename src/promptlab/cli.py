@@ -1,7 +1,10 @@
+import asyncio
 import click
 import json
 from promptlab.core import PromptLab
+from promptlab.model.model_factory import ModelFactory
 from promptlab.studio.studio import StudioServer
+from promptlab.types import Dataset, ModelConfig, PromptTemplate
 
 
 @click.group()
@@ -45,6 +48,194 @@ def run(config, tracer):
         raise click.Abort()
 
 
+@cli.command()
+@click.option(
+    "--config",
+    "-c",
+    type=click.Path(exists=True),
+    required=True,
+    help="Path to sweep configuration JSON file",
+)
+@click.option(
+    "--tracer",
+    "-t",
+    type=click.Path(exists=True),
+    required=True,
+    help="Path to tracer configuration JSON file",
+)
+@click.option(
+    "--async",
+    "run_async",
+    is_flag=True,
+    default=False,
+    help="Schedule the requests of all cells concurrently",
+)
+def sweep(config, tracer, run_async):
+    """Run every combination of the configured models and prompt templates"""
+    try:
+        with open(config) as f:
+            sweep_config = build_sweep_config(json.load(f))
+        with open(tracer) as f:
+            tracer_config = json.load(f)
+
+        prompt_lab = PromptLab(tracer_config)
+        if run_async:
+            experiment_ids = asyncio.run(prompt_lab.sweep.run_async(sweep_config))
+        else:
+            experiment_ids = prompt_lab.sweep.run(sweep_config)
+
+        for experiment_id in experiment_ids:
+            click.echo(experiment_id)
+        click.echo(f"Sweep of {len(experiment_ids)} experiments completed successfully")
+
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+
+def build_sweep_config(config: dict) -> dict:
+    """Turn the plain JSON of a sweep configuration into models and assets"""
+    dataset = config["dataset"]
+    return {
+        **config,
+        "inference_models": [
+            ModelFactory.get_model(ModelConfig(**model_config))
+            for model_config in config["inference_models"]
+        ],
+        "embedding_model": ModelFactory.get_embedding_model(
+            ModelConfig(**config["embedding_model"])
+        ),
+        "prompt_templates": [
+            PromptTemplate(name=template["name"], version=template.get("version", 0))
+            for template in config["prompt_templates"]
+        ],
+        "dataset": Dataset(
+            name=dataset["name"],
+            description="",
+            file_path="",
+            version=dataset.get("version", 0),
+        ),
+    }
+
+
+def build_experiment_config(config: dict) -> dict:
+    """Turn the plain JSON of an experiment configuration into models and assets"""
+    dataset = config["dataset"]
+    template = config["prompt_template"]
+    return {
+        **config,
+        "inference_model": ModelFactory.get_model(
+            ModelConfig(**config["inference_model"])
+        ),
+        "embedding_model": ModelFactory.get_embedding_model(
+            ModelConfig(**config["embedding_model"])
+        ),
+        "prompt_template": PromptTemplate(
+            name=template["name"], version=template.get("version", 0)
+        ),
+        "dataset": Dataset(
+            name=dataset["name"],
+            description="",
+            file_path="",
+            version=dataset.get("version", 0),
+        ),
+    }
+
+
+@cli.command()
+@click.option(
+    "--config",
+    "-c",
+    type=click.Path(exists=True),
+    required=True,
+    help="Path to experiment configuration JSON file",
+)
+@click.option(
+    "--tracer",
+    "-t",
+    type=click.Path(exists=True),
+    required=True,
+    help="Path to tracer configuration JSON file",
+)
+@click.option(
+    "--shard-size",
+    type=int,
+    default=1000,
+    help="Number of dataset records per shard",
+)
+def submit(config, tracer, shard_size):
+    """Queue the shards of an experiment for workers to process"""
+    try:
+        with open(config) as f:
+            experiment_config = build_experiment_config(json.load(f))
+        with open(tracer) as f:
+            tracer_config = json.load(f)
+
+        prompt_lab = PromptLab(tracer_config)
+        experiment_id = prompt_lab.sharded_experiment.submit(
+            experiment_config, shard_size
+        )
+
+        click.echo(experiment_id)
+
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+
+@cli.command()
+@click.option(
+    "--config",
+    "-c",
+    type=click.Path(exists=True),
+    required=True,
+    help="Path to experiment configuration JSON file",
+)
+@click.option(
+    "--tracer",
+    "-t",
+    type=click.Path(exists=True),
+    required=True,
+    help="Path to tracer configuration JSON file",
+)
+@click.option(
+    "--experiment-id",
+    "-e",
+    required=True,
+    help="Id of the experiment returned by submit",
+)
+@click.option(
+    "--async",
+    "run_async",
+    is_flag=True,
+    default=False,
+    help="Process each shard with run_async",
+)
+def worker(config, tracer, experiment_id, run_async):
+    """Process queued shards of an experiment until none are left"""
+    try:
+        with open(config) as f:
+            experiment_config = build_experiment_config(
+                {**json.load(f), "experiment_id": experiment_id}
+            )
+        with open(tracer) as f:
+            tracer_config = json.load(f)
+
+        prompt_lab = PromptLab(tracer_config)
+        if run_async:
+            shards = asyncio.run(
+                prompt_lab.sharded_experiment.work_async(experiment_config)
+            )
+        else:
+            shards = prompt_lab.sharded_experiment.work(experiment_config)
+
+        click.echo(f"Worker completed {shards} shards")
+
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+
 @cli.command()
 @click.option(
     "--db-dir",
@@ -1,6 +1,8 @@
 from promptlab.asset import Asset
 from promptlab.experiment import Experiment
+from promptlab.shard import ShardedExperiment
 from promptlab.studio.studio import Studio
+from promptlab.sweep import Sweep
 from promptlab.tracer.tracer_factory import TracerFactory
 from promptlab.config import ConfigValidator, TracerConfig
 
@@ -15,4 +17,6 @@ class PromptLab:
 
         self.asset = Asset(self.tracer)
         self.experiment = Experiment(self.tracer)
+        self.sweep = Sweep(self.tracer)
+        self.sharded_experiment = ShardedExperiment(self.tracer)
         self.studio = Studio(self.tracer)
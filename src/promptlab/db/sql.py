@@ -18,7 +18,9 @@ class SQLQuery:
                         experiment_id TEXT PRIMARY KEY,
                         model BLOB,
                         asset BLOB,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        metrics BLOB,
+                        records_evaluated INTEGER
                     )
                 """
 
@@ -41,10 +43,46 @@ class SQLQuery:
                         latency_ms REAL,
                         evaluation BLOB,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        retries INTEGER DEFAULT 0,
+                        time_to_first_token_ms REAL,
+                        inter_token_latency_ms REAL,
+                        tokens_per_second REAL,
                         FOREIGN KEY(experiment_id) REFERENCES experiments(experiment_id)
                     )
                 """
 
+    CREATE_EXPERIMENT_RESULT_INDEX_QUERY = """
+                    CREATE INDEX IF NOT EXISTS idx_experiment_result_record
+                    ON experiment_result (experiment_id, dataset_record_id)
+                """
+
+    UPDATE_EXPERIMENT_METRICS_QUERY = """UPDATE experiments
+                                SET metrics = :metrics,
+                                    records_evaluated = (
+                                        SELECT COUNT(*) FROM experiment_result
+                                        WHERE experiment_id = :experiment_id)
+                                WHERE experiment_id = :experiment_id"""
+
+    SELECT_TABLE_COLUMNS_QUERY = """SELECT name FROM pragma_table_info(?)"""
+
+    ADD_COLUMN_QUERY = """ALTER TABLE {table} ADD COLUMN {column} {column_type}"""
+
+    SELECT_EXPERIMENT_QUERY = (
+        """SELECT experiment_id FROM experiments WHERE experiment_id = ?"""
+    )
+
+    SELECT_EXPERIMENT_EVALUATIONS_QUERY = """SELECT dataset_record_id, evaluation
+                                FROM experiment_result
+                                WHERE experiment_id = ?"""
+
+    SELECT_COMPLETED_RECORD_IDS_QUERY = (
+        """SELECT dataset_record_id FROM experiment_result WHERE experiment_id = ?"""
+    )
+
+    SELECT_COMPLETED_RECORD_IDS_BATCH_QUERY = """SELECT dataset_record_id FROM experiment_result
+                                WHERE experiment_id = ?
+                                AND dataset_record_id IN ({placeholders})"""
+
     INSERT_BATCH_EXPERIMENT_RESULT_QUERY = """
                                 INSERT INTO experiment_result (
                                         experiment_id,
@@ -54,7 +92,11 @@ class SQLQuery:
                                         completion_tokens,
                                         latency_ms,
                                         evaluation,
-                                        created_at
+                                        created_at,
+                                        retries,
+                                        time_to_first_token_ms,
+                                        inter_token_latency_ms,
+                                        tokens_per_second
                                 ) VALUES (
                                         :experiment_id,
                                         :dataset_record_id,
@@ -63,9 +105,126 @@ class SQLQuery:
                                         :completion_tokens,
                                         :latency_ms,
                                         :evaluation,
-                                        :created_at)
+                                        :created_at,
+                                        :retries,
+                                        :time_to_first_token_ms,
+                                        :inter_token_latency_ms,
+                                        :tokens_per_second)
             """
 
+    # Skips records already traced, checked in the write transaction, so
+    # shard workers racing on a shard whose lease ran out trace a record once
+    INSERT_BATCH_NEW_EXPERIMENT_RESULT_QUERY = """
+                                INSERT INTO experiment_result (
+                                        experiment_id,
+                                        dataset_record_id,
+                                        inference,
+                                        prompt_tokens,
+                                        completion_tokens,
+                                        latency_ms,
+                                        evaluation,
+                                        created_at,
+                                        retries,
+                                        time_to_first_token_ms,
+                                        inter_token_latency_ms,
+                                        tokens_per_second
+                                ) SELECT
+                                        :experiment_id,
+                                        :dataset_record_id,
+                                        :inference,
+                                        :prompt_tokens,
+                                        :completion_tokens,
+                                        :latency_ms,
+                                        :evaluation,
+                                        :created_at,
+                                        :retries,
+                                        :time_to_first_token_ms,
+                                        :inter_token_latency_ms,
+                                        :tokens_per_second
+                                WHERE NOT EXISTS (
+                                    SELECT 1 FROM experiment_result
+                                    WHERE experiment_id = :experiment_id
+                                    AND dataset_record_id = :dataset_record_id)"""
+
+    CREATE_EXPERIMENT_SHARD_TABLE_QUERY = """
+                    CREATE TABLE IF NOT EXISTS experiment_shard (
+                        experiment_id TEXT,
+                        shard_index INTEGER,
+                        start_offset INTEGER,
+                        end_offset INTEGER,
+                        record_count INTEGER,
+                        status TEXT DEFAULT 'queued',
+                        worker_id TEXT,
+                        lease_expires_at REAL,
+                        attempts INTEGER DEFAULT 0,
+                        metrics BLOB,
+                        PRIMARY KEY (experiment_id, shard_index),
+                        FOREIGN KEY(experiment_id) REFERENCES experiments(experiment_id)
+                    )
+                """
+
+    INSERT_EXPERIMENT_SHARD_QUERY = """INSERT OR IGNORE INTO experiment_shard(
+                                    experiment_id,
+                                    shard_index,
+                                    start_offset,
+                                    end_offset,
+                                    record_count
+                                ) VALUES (?, ?, ?, ?, ?)"""
+
+    CLAIM_EXPERIMENT_SHARD_QUERY = """UPDATE experiment_shard
+                                SET status = 'leased',
+                                    worker_id = :worker_id,
+                                    lease_expires_at = :lease_expires_at,
+                                    attempts = attempts + 1
+                                WHERE rowid = (
+                                    SELECT rowid FROM experiment_shard
+                                    WHERE experiment_id = :experiment_id
+                                    AND (status = 'queued'
+                                        OR (status = 'leased' AND lease_expires_at < :now))
+                                    AND attempts < :max_attempts
+                                    ORDER BY shard_index
+                                    LIMIT 1)
+                                RETURNING shard_index, start_offset, end_offset, attempts"""
+
+    FAIL_EXHAUSTED_EXPERIMENT_SHARDS_QUERY = """UPDATE experiment_shard
+                                SET status = 'failed', worker_id = NULL, lease_expires_at = NULL
+                                WHERE experiment_id = ? AND status = 'leased'
+                                AND lease_expires_at < ? AND attempts >= ?"""
+
+    RENEW_EXPERIMENT_SHARD_QUERY = """UPDATE experiment_shard SET lease_expires_at = ?
+                                WHERE experiment_id = ? AND shard_index = ?
+                                AND worker_id = ? AND status = 'leased'"""
+
+    COMPLETE_EXPERIMENT_SHARD_QUERY = """UPDATE experiment_shard
+                                SET status = 'done', lease_expires_at = NULL, metrics = ?
+                                WHERE experiment_id = ? AND shard_index = ?
+                                AND worker_id = ? AND status = 'leased'"""
+
+    RELEASE_EXPERIMENT_SHARD_QUERY = """UPDATE experiment_shard
+                                SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                                    worker_id = NULL,
+                                    lease_expires_at = NULL
+                                WHERE experiment_id = ? AND shard_index = ?
+                                AND worker_id = ? AND status = 'leased'"""
+
+    # The metrics of every completed shard, keyed by shard index, collected
+    # in one statement so workers finishing at the same time can't overwrite
+    # each other's shards
+    UPDATE_SHARDED_EXPERIMENT_METRICS_QUERY = """UPDATE experiments
+                                SET metrics = (
+                                        SELECT json_object('shards', json_group_object(shard_index, json(metrics)))
+                                        FROM experiment_shard
+                                        WHERE experiment_id = :experiment_id AND status = 'done'),
+                                    records_evaluated = (
+                                        SELECT COUNT(*) FROM experiment_result
+                                        WHERE experiment_id = :experiment_id)
+                                WHERE experiment_id = :experiment_id"""
+
+    SELECT_EXPERIMENT_SHARD_PROGRESS_QUERY = """SELECT status, COUNT(*) AS shards, SUM(record_count) AS records
+                                FROM experiment_shard
+                                WHERE experiment_id = ?
+                                GROUP BY status"""
+
     INSERT_ASSETS_QUERY = """INSERT INTO assets(
                                     asset_name,
                                     asset_version,
@@ -132,4 +291,96 @@ class SQLQuery:
                                     a.asset_name = prompt_template_name AND a.asset_version = prompt_template_version
                                 """
 
+    CREATE_INFERENCE_CACHE_TABLE_QUERY = """
+                    CREATE TABLE IF NOT EXISTS inference_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        inference TEXT,
+                        prompt_tokens INTEGER,
+                        completion_tokens INTEGER,
+                        latency_ms REAL,
+                        created_at REAL,
+                        last_accessed REAL
+                    )
+                """
+
+    CREATE_INFERENCE_CACHE_INDEX_QUERY = """
+                    CREATE INDEX IF NOT EXISTS idx_inference_cache_last_accessed
+                    ON inference_cache (last_accessed)
+                """
+
+    SELECT_INFERENCE_CACHE_QUERY = """SELECT  inference,
+                                            prompt_tokens,
+                                            completion_tokens,
+                                            latency_ms,
+                                            created_at
+                                    FROM inference_cache
+                                    WHERE cache_key = ?"""
+
+    COUNT_INFERENCE_CACHE_QUERY = """SELECT COUNT(*) AS entries FROM inference_cache"""
+
+    INSERT_INFERENCE_CACHE_QUERY = """INSERT OR IGNORE INTO inference_cache(
+                                            cache_key,
+                                            inference,
+                                            prompt_tokens,
+                                            completion_tokens,
+                                            latency_ms,
+                                            created_at,
+                                            last_accessed
+                                    ) VALUES(?, ?, ?, ?, ?, ?, ?)"""
+
+    UPDATE_INFERENCE_CACHE_QUERY = """UPDATE inference_cache
+                                    SET inference = ?,
+                                        prompt_tokens = ?,
+                                        completion_tokens = ?,
+                                        latency_ms = ?,
+                                        created_at = ?,
+                                        last_accessed = ?
+                                    WHERE cache_key = ?"""
+
+    TOUCH_INFERENCE_CACHE_QUERY = (
+        """UPDATE inference_cache SET last_accessed = ? WHERE cache_key = ?"""
+    )
+
+    DELETE_INFERENCE_CACHE_QUERY = """DELETE FROM inference_cache WHERE cache_key = ?"""
+
+    DELETE_EXPIRED_INFERENCE_CACHE_QUERY = (
+        """DELETE FROM inference_cache WHERE created_at < ?"""
+    )
+
+    EVICT_LRU_INFERENCE_CACHE_QUERY = """DELETE FROM inference_cache
+                                        WHERE cache_key IN (
+                                            SELECT cache_key FROM inference_cache
+                                            ORDER BY last_accessed ASC
+                                            LIMIT ?
+                                        )"""
+
+    CREATE_EMBEDDING_CACHE_TABLE_QUERY = """
+                    CREATE TABLE IF NOT EXISTS embedding_cache (
+                        model_type TEXT,
+                        deployment TEXT,
+                        text_hash TEXT,
+                        dimensions INTEGER,
+                        embedding BLOB,
+                        created_at REAL,
+                        PRIMARY KEY (model_type, deployment, text_hash)
+                    ) WITHOUT ROWID
+                """
+
+    SELECT_EMBEDDING_CACHE_QUERY = """SELECT embedding
+                                    FROM embedding_cache
+                                    WHERE model_type = ? AND deployment = ? AND text_hash = ?"""
+
+    SELECT_EMBEDDING_CACHE_BATCH_QUERY = """SELECT text_hash, embedding
+                                    FROM embedding_cache
+                                    WHERE model_type = ? AND deployment = ? AND text_hash IN ({placeholders})"""
+
+    INSERT_EMBEDDING_CACHE_QUERY = """INSERT OR REPLACE INTO embedding_cache(
+                                            model_type,
+                                            deployment,
+                                            text_hash,
+                                            dimensions,
+                                            embedding,
+                                            created_at
+                                    ) VALUES(?, ?, ?, ?, ?, ?)"""
+
     DEPLOY_ASSET_QUERY = """UPDATE assets SET is_deployed = 1, deployment_time = CURRENT_TIMESTAMP WHERE asset_name = ? and asset_version = ?"""
@@ -20,14 +20,32 @@ class SQLiteClient:
 
         return conn
 
-    def execute_query(self, query: str, params: Tuple = ()):
-        """Execute a query such as CREATE TABLE or INSERT."""
+    def execute_query(self, query: str, params: Tuple = ()) -> int:
+        """Execute a query such as CREATE TABLE or INSERT and return the row count."""
         conn = self.create_connection()
         cursor = conn.cursor()
         cursor.execute(query, params)
         conn.commit()
+        rowcount = cursor.rowcount
         cursor.close()
         conn.close()
+        return rowcount
+
+    def execute_returning(self, query: str, params: Tuple = ()) -> list:
+        """Execute a write query with a RETURNING clause and return its rows."""
+        conn = self.create_connection()
+        # Take the write lock before the query reads anything, so concurrent
+        # processes can't both select the same row to update
+        conn.isolation_level = "IMMEDIATE"
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, params)
+            result = cursor.fetchall()
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        return result
 
     def execute_query_many(self, query: str, params: List[Tuple]):
         """Execute a query such as CREATE TABLE or INSERT."""
@@ -42,6 +60,22 @@ class SQLiteClient:
             cursor.close()
             conn.close()
 
+    def execute_batch(self, query: str, params: List) -> int:
+        """
+        Execute a write query for every set of params in a single transaction
+        and return the row count. Unlike execute_query_many it raises when the
+        transaction fails, so callers know nothing was written.
+        """
+        conn = self.create_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(query, params)
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+            conn.close()
+
     def fetch_data(self, query: str, params: Tuple = ()) -> list:
         """Fetch data from the database using a SELECT query."""
         conn = self.create_connection()
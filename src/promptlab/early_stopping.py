@@ -0,0 +1,160 @@
+import json
+import math
+from typing import Dict, Optional, Tuple
+
+from promptlab.types import EarlyStoppingConfig
+
+
+class RunningStats:
+    """Mean and variance of a stream of values, using Welford's algorithm"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def confidence_sequence(self, alpha: float, rho: float) -> Tuple[float, float]:
+        """
+        Asymptotic confidence sequence of the mean (Waudby-Smith et al.,
+        2021). Unlike a fixed confidence interval it covers the mean at every
+        count at once with probability 1 - alpha, so it can be checked after
+        every value. rho sets the count it is narrowest around.
+        """
+        if self.count < 2:
+            return -math.inf, math.inf
+
+        spread = self.count * rho**2 + 1
+        half_width = math.sqrt(
+            self.variance
+            * 2
+            * spread
+            / (self.count * rho) ** 2
+            * math.log(math.sqrt(spread) / alpha)
+        )
+        return self.mean - half_width, self.mean + half_width
+
+
+def metric_value(evaluation: str, metric: str) -> Optional[float]:
+    """Numeric result of a metric in an evaluation, None if there is none"""
+    for result in json.loads(evaluation):
+        if result["metric"] != metric:
+            continue
+        try:
+            return float(result["result"])
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+class EarlyStopping:
+    """
+    Keeps a running confidence interval of one metric while an experiment
+    processes its records in random order. The experiment stops scheduling
+    records once the interval is narrower than max_interval_width, or once
+    the interval of the per-record difference to a baseline experiment no
+    longer contains zero. The intervals are confidence sequences, as they
+    are checked after every record.
+    """
+
+    def __init__(
+        self, config: EarlyStoppingConfig, baseline: Optional[Dict[str, float]] = None
+    ):
+        self.config = config
+        self.baseline = baseline
+        self.alpha = 1 - config.confidence
+        # Narrowest around min_records, the first record it may stop at
+        log_alpha = -2 * math.log(self.alpha)
+        self.rho = math.sqrt((log_alpha + math.log(log_alpha + 1)) / config.min_records)
+
+        self.records = 0
+        self.stats = RunningStats()
+        self.difference = RunningStats()
+
+    @classmethod
+    def for_experiment(cls, experiment_config, tracer) -> Optional["EarlyStopping"]:
+        config = getattr(experiment_config, "early_stopping", None)
+        if config is None:
+            return None
+
+        baseline = None
+        if config.baseline_experiment_id is not None:
+            evaluations = tracer.get_evaluations(config.baseline_experiment_id)
+            baseline = {
+                record_id: value
+                for record_id, evaluation in evaluations.items()
+                if (value := metric_value(evaluation, config.metric)) is not None
+            }
+            if not baseline:
+                raise ValueError(
+                    f"Baseline experiment {config.baseline_experiment_id} has no "
+                    f"results for {config.metric}"
+                )
+
+        return cls(config, baseline)
+
+    def update(self, record_id, evaluation: str) -> None:
+        self.records += 1
+
+        value = metric_value(evaluation, self.config.metric)
+        if value is None:
+            return
+
+        self.stats.add(value)
+        if self.baseline is not None and str(record_id) in self.baseline:
+            # Both experiments ran the same record, so the paired difference
+            # has far less variance than the two means on their own
+            self.difference.add(value - self.baseline[str(record_id)])
+
+    def decision(self) -> Optional[str]:
+        """Whether the metric is better or worse than the baseline, once decided"""
+        if self.baseline is None or self.difference.count < self.config.min_records:
+            return None
+
+        low, high = self.difference.confidence_sequence(self.alpha, self.rho)
+        if low > 0:
+            return "better"
+        if high < 0:
+            return "worse"
+        return None
+
+    def should_stop(self) -> bool:
+        if (
+            self.config.max_interval_width is not None
+            and self.stats.count >= self.config.min_records
+        ):
+            low, high = self.stats.confidence_sequence(self.alpha, self.rho)
+            if high - low <= self.config.max_interval_width:
+                return True
+
+        return self.decision() is not None
+
+    def summary(self) -> Dict:
+        summary = {
+            "metric": self.config.metric,
+            "confidence": self.config.confidence,
+            "stopped": self.should_stop(),
+            "records": self.records,
+            "mean": self.stats.mean,
+            "interval": list(self.stats.confidence_sequence(self.alpha, self.rho)),
+        }
+        if self.baseline is not None:
+            summary["baseline"] = {
+                "experiment_id": self.config.baseline_experiment_id,
+                "records": self.difference.count,
+                "mean_difference": self.difference.mean,
+                "interval": list(
+                    self.difference.confidence_sequence(self.alpha, self.rho)
+                ),
+                "decision": self.decision(),
+            }
+        return summary
@@ -12,6 +12,11 @@ class ModelType(Enum):
     OLLAMA = "ollama"
 
 
+class ExecutionMode(Enum):
+    THREAD = "thread"
+    PROCESS = "process"
+
+
 class AssetType(Enum):
     PROMPT_TEMPLATE = "prompt_template"
     DATASET = "dataset"
@@ -0,0 +1,101 @@
+import asyncio
+import json
+from contextlib import nullcontext
+from operator import itemgetter
+from typing import Callable, List
+
+from promptlab.enums import ExecutionMode
+from promptlab.evaluator.evaluator_factory import EvaluatorFactory
+from promptlab.process_pool import ProcessPoolEvaluator
+from promptlab.timing import StageTimings
+from promptlab.types import ExperimentConfig
+
+
+def column_accessor(column: str) -> Callable:
+    """Resolve a column_mapping value into a function of (inference, row)"""
+    if column == "$inference":
+        return lambda inference, row: inference
+
+    get_column = itemgetter(column)
+    return lambda inference, row: get_column(row)
+
+
+class EvaluationPlan:
+    """
+    Evaluators and column accessors of an experiment, resolved once when the
+    experiment starts and reused for every record
+    """
+
+    def __init__(
+        self, experiment_config: ExperimentConfig, timings: StageTimings = None
+    ):
+        # Optional StageTimings receiving the evaluation time of each metric
+        self.timings = timings
+        self.steps = []
+        for eval in experiment_config.evaluation:
+            evaluator = EvaluatorFactory.get_evaluator(
+                eval.metric,
+                experiment_config.inference_model,
+                experiment_config.embedding_model,
+                eval.evaluator,
+            )
+            if getattr(eval, "execution", None) == ExecutionMode.PROCESS.value:
+                evaluator = ProcessPoolEvaluator(evaluator)
+            accessors = [
+                (key, column_accessor(value))
+                for key, value in eval.column_mapping.items()
+            ]
+            self.steps.append((f"{eval.metric}", evaluator, accessors))
+
+    def evaluate_batch(self, inferences: List[str], rows: List) -> List[str]:
+        """
+        Evaluate a chunk of records, returning one JSON encoded list of
+        metric results per record
+        """
+        evaluations = [[] for _ in rows]
+        for metric, evaluator, accessors in self.steps:
+            data = self._data(accessors, inferences, rows)
+            with self._measure(metric, len(rows)):
+                evaluation_results = evaluator.evaluate_batch(data)
+            self._append(evaluations, metric, evaluation_results)
+        return [json.dumps(evaluation) for evaluation in evaluations]
+
+    async def aevaluate_batch(self, inferences: List[str], rows: List) -> List[str]:
+        """
+        Asynchronous version of evaluate_batch. Metrics are independent of
+        each other, so they run concurrently.
+        """
+        results = await asyncio.gather(
+            *(
+                self._aevaluate_metric(
+                    metric, evaluator, self._data(accessors, inferences, rows)
+                )
+                for metric, evaluator, accessors in self.steps
+            )
+        )
+
+        evaluations = [[] for _ in rows]
+        for (metric, _, _), evaluation_results in zip(self.steps, results):
+            self._append(evaluations, metric, evaluation_results)
+        return [json.dumps(evaluation) for evaluation in evaluations]
+
+    async def _aevaluate_metric(self, metric, evaluator, data) -> List:
+        with self._measure(metric, len(data)):
+            return await evaluator.aevaluate_batch(data)
+
+    def _measure(self, metric: str, records: int):
+        if self.timings is None:
+            return nullcontext()
+        return self.timings.measure(f"evaluation.{metric}", records)
+
+    @staticmethod
+    def _data(accessors, inferences, rows) -> List[dict]:
+        return [
+            {key: accessor(inference, row) for key, accessor in accessors}
+            for inference, row in zip(inferences, rows)
+        ]
+
+    @staticmethod
+    def _append(evaluations, metric, evaluation_results) -> None:
+        for evaluation, evaluation_result in zip(evaluations, evaluation_results):
+            evaluation.append({"metric": metric, "result": evaluation_result})
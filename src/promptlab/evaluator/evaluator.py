@@ -1,7 +1,27 @@
 from abc import ABC, abstractmethod
+import asyncio
+from typing import List
 
 
 class Evaluator(ABC):
     @abstractmethod
     def evaluate(self, data: dict):
         pass
+
+    def evaluate_batch(self, data: List[dict]) -> List:
+        """
+        Evaluate a chunk of records at once. Override to share work, such as
+        model requests, across the records of a chunk.
+        """
+        return [self.evaluate(record) for record in data]
+
+    async def aevaluate(self, data: dict):
+        """
+        Asynchronous version of evaluate. Override to call async model clients
+        directly, by default evaluate runs in a worker thread.
+        """
+        return await asyncio.to_thread(self.evaluate, data)
+
+    async def aevaluate_batch(self, data: List[dict]) -> List:
+        """Asynchronous version of evaluate_batch"""
+        return await asyncio.to_thread(self.evaluate_batch, data)
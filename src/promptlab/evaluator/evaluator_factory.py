@@ -12,7 +12,7 @@ def import_evaluators():
     package = "promptlab.evaluator"
 
     for _, module_name, _ in pkgutil.iter_modules([os.path.dirname(__file__)]):
-        if module_name != "evaluator_factory" and module_name != "evaluator":
+        if module_name not in ("evaluator_factory", "evaluator", "evaluation_plan"):
             module = importlib.import_module(f"{package}.{module_name}")
             for attr_name in dir(module):
                 attr = getattr(module, attr_name)
@@ -1,8 +1,36 @@
+import asyncio
+from typing import List
+
 from promptlab.evaluator.evaluator import Evaluator
 
 
 class Fluency(Evaluator):
     def evaluate(self, data: dict):
+        inference_result = self.inference(*self._prompts(data))
+        return inference_result.inference
+
+    async def aevaluate(self, data: dict):
+        inference_result = await self.inference(*self._prompts(data))
+        return inference_result.inference
+
+    async def aevaluate_batch(self, data: List[dict]) -> List:
+        # Judge requests for a chunk run concurrently, within the judge
+        # model's concurrency limit. During a run the model's limiter does
+        # the actual limiting and may allow more than max_concurrent_tasks.
+        limiter = getattr(self.inference, "limiter", None)
+        semaphore = asyncio.Semaphore(
+            limiter.max_limit
+            if limiter is not None
+            else getattr(self.inference, "max_concurrent_tasks", 5)
+        )
+
+        async def aevaluate(record):
+            async with semaphore:
+                return await self.aevaluate(record)
+
+        return await asyncio.gather(*(aevaluate(record) for record in data))
+
+    def _prompts(self, data: dict):
         system_prompt = """
                         # Instruction
                         ## Goal
@@ -70,6 +98,4 @@ class Fluency(Evaluator):
 
         user_prompt = user_prompt.replace("{{feedback}}", inference)
 
-        inference_result = self.inference(system_prompt, user_prompt)
-
-        return inference_result.inference
+        return system_prompt, user_prompt
@@ -1,4 +1,7 @@
+from typing import List
+
 from promptlab.evaluator.evaluator import Evaluator
+from promptlab.model.model import aembed_many, embed_many
 import numpy as np
 
 
@@ -7,15 +10,51 @@ class SemanticSimilarity(Evaluator):
         inference = data["response"]
         reference = data["reference"]
 
-        embedding_1 = np.array(self.embedding(inference))
-        embedding_2 = np.array(self.embedding(reference))
+        return self._similarities(
+            [self.embedding(inference)], [self.embedding(reference)]
+        )[0]
+
+    def evaluate_batch(self, data: List[dict]) -> List:
+        if not data:
+            return []
+
+        inferences = [record["response"] for record in data]
+        references = [record["reference"] for record in data]
+
+        # One batched embedding call for the whole chunk
+        embeddings = embed_many(self.embedding, inferences + references)
+
+        return self._similarities(embeddings[: len(data)], embeddings[len(data) :])
+
+    async def aevaluate(self, data: dict):
+        return (await self.aevaluate_batch([data]))[0]
+
+    async def aevaluate_batch(self, data: List[dict]) -> List:
+        if not data:
+            return []
+
+        inferences = [record["response"] for record in data]
+        references = [record["reference"] for record in data]
+
+        embeddings = await aembed_many(self.embedding, inferences + references)
+
+        return self._similarities(embeddings[: len(data)], embeddings[len(data) :])
+
+    @staticmethod
+    def _similarities(embeddings_1, embeddings_2) -> List[float]:
+        """Row-wise cosine similarity of two equally long lists of embeddings"""
+        # One row per record, regardless of whether a model returned a flat
+        # vector or a nested [[...]] one
+        embeddings_1 = np.vstack(embeddings_1).astype(np.float64)
+        embeddings_2 = np.vstack(embeddings_2).astype(np.float64)
+
+        norms = np.linalg.norm(embeddings_1, axis=1) * np.linalg.norm(
+            embeddings_2, axis=1
+        )
+        dots = np.einsum("ij,ij->i", embeddings_1, embeddings_2)
 
-        # Normalization factors of the above embeddings
-        norms_1 = np.linalg.norm(embedding_1, keepdims=True)
-        norms_2 = np.linalg.norm(embedding_2, keepdims=True)
-        embedding_1_normalized = embedding_1 / norms_1
-        embedding_2_normalized = embedding_2 / norms_2
-        similarity = embedding_1_normalized @ embedding_2_normalized.T
-        score = similarity.flatten()
+        # A zero vector has no direction, score it 0 rather than NaN
+        similarities = np.zeros_like(dots)
+        np.divide(dots, norms, out=similarities, where=norms > 0)
 
-        return score.tolist()[0]
+        return similarities.tolist()
@@ -1,19 +1,83 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List
-import json
+from typing import Any, List, Set
 import uuid
 import asyncio
+import time
 
+from promptlab.cache.embedding_cache import CachedEmbedding, EmbeddingCache
+from promptlab.cache.inference_cache import InferenceCache
 from promptlab.config import ConfigValidator, ExperimentConfig
 from promptlab.db.sql import SQLQuery
-from promptlab.evaluator.evaluator_factory import EvaluatorFactory
+from promptlab.early_stopping import EarlyStopping
+from promptlab.evaluator.evaluation_plan import EvaluationPlan
+from promptlab.model.concurrency import AdaptiveLimiter
+from promptlab.model.model import EmbeddingModel, Model
+from promptlab.timing import StageTimings
 from promptlab.tracer.tracer import Tracer
-from promptlab.utils import Utils
+from promptlab.utils import CompiledPromptTemplate, Utils
+
+
+def untraced_records(tracer: Tracer, experiment_id: str, records, batch_size=500):
+    """
+    Records an experiment hasn't traced yet. They are looked up a batch at a
+    time, so memory doesn't grow with the results traced before.
+    """
+    for batch in Utils.batched(records, batch_size):
+        completed_record_ids = tracer.get_completed_record_ids(
+            experiment_id, [str(record["id"]) for record in batch]
+        )
+        for record in batch:
+            if str(record["id"]) not in completed_record_ids:
+                yield record
+
+
+@dataclass
+class ExperimentRun:
+    """
+    State of one experiment while its records are processed, shared by the
+    synchronous and asynchronous loops and by sweep cells
+    """
+
+    experiment_id: str
+    inference_model: Any
+    prompt_template: CompiledPromptTemplate
+    evaluation_plan: EvaluationPlan
+    evaluation_batch_size: int
+    timings: StageTimings
+    timestamp: str
+    # Set when the run resumes an experiment, to skip the records it traced
+    resumed_tracer: Tracer = None
+    early_stopping: EarlyStopping = None
+    # Concurrency limit of async runs
+    limiter: AdaptiveLimiter = None
+    inference_tasks: Set[asyncio.Task] = field(default_factory=set)
+    evaluation_tasks: Set[asyncio.Task] = field(default_factory=set)
+    # (record, inference result) pairs waiting for a full evaluation chunk
+    inferred: List = field(default_factory=list)
+
+    def remaining(self, eval_dataset):
+        """Records of the dataset the experiment hasn't traced yet"""
+        if self.resumed_tracer is None:
+            return iter(eval_dataset)
+        return untraced_records(self.resumed_tracer, self.experiment_id, eval_dataset)
+
+    def should_stop(self) -> bool:
+        return self.early_stopping is not None and self.early_stopping.should_stop()
+
+    def cancel(self) -> None:
+        for task in self.inference_tasks | self.evaluation_tasks:
+            task.cancel()
 
 
 class Experiment:
     def __init__(self, tracer: Tracer):
         self.tracer = tracer
+        self.inference_cache = None
+        self.embedding_cache = None
+        self.run_metrics = None
+        self.timings = None
 
     def run(self, experiment_config: ExperimentConfig):
         """
@@ -33,21 +97,19 @@ class Experiment:
             Utils.split_prompt_template(prompt_template["asset_binary"])
         )
 
-        eval_dataset_path = self.tracer.db_client.fetch_data(
-            SQLQuery.SELECT_DATASET_FILE_PATH_QUERY,
-            (experiment_config.dataset.name, experiment_config.dataset.version),
-        )[0]
-        eval_dataset = Utils.load_dataset(eval_dataset_path["file_path"])
-
-        exp_summary = self.init_batch_eval(
-            eval_dataset,
-            system_prompt,
-            user_prompt,
-            prompt_template_variables,
-            experiment_config,
+        eval_dataset = self._stream_dataset(experiment_config)
+        self._warm_models(
+            [experiment_config.inference_model, experiment_config.embedding_model]
         )
 
-        self.tracer.trace(experiment_config, exp_summary)
+        with self._attach_caches(experiment_config):
+            return self.init_batch_eval(
+                eval_dataset,
+                system_prompt,
+                user_prompt,
+                prompt_template_variables,
+                experiment_config,
+            )
 
     async def run_async(self, experiment_config: ExperimentConfig):
         """
@@ -67,21 +129,170 @@ class Experiment:
             Utils.split_prompt_template(prompt_template["asset_binary"])
         )
 
+        eval_dataset = self._stream_dataset(experiment_config)
+        await self._awarm_models(
+            [experiment_config.inference_model, experiment_config.embedding_model]
+        )
+
+        with self._attach_caches(experiment_config):
+            return await self.init_batch_eval_async(
+                eval_dataset,
+                system_prompt,
+                user_prompt,
+                prompt_template_variables,
+                experiment_config,
+            )
+
+    def _stream_dataset(self, experiment_config: ExperimentConfig):
         eval_dataset_path = self.tracer.db_client.fetch_data(
             SQLQuery.SELECT_DATASET_FILE_PATH_QUERY,
             (experiment_config.dataset.name, experiment_config.dataset.version),
-        )[0]
-        eval_dataset = Utils.load_dataset(eval_dataset_path["file_path"])
+        )[0]["file_path"]
 
-        exp_summary = await self.init_batch_eval_async(
-            eval_dataset,
-            system_prompt,
-            user_prompt,
-            prompt_template_variables,
-            experiment_config,
+        # Early stopping needs records in random order, so that the records
+        # seen so far are a fair sample of the dataset
+        if experiment_config.early_stopping is not None:
+            return Utils.stream_dataset_shuffled(
+                eval_dataset_path, experiment_config.early_stopping.seed
+            )
+        return Utils.stream_dataset(eval_dataset_path)
+
+    @staticmethod
+    def _warm_models(models) -> None:
+        """Connect to the providers before the first record is sent"""
+        for model in models:
+            if isinstance(model, (Model, EmbeddingModel)):
+                model.warm()
+
+    @staticmethod
+    async def _awarm_models(models) -> None:
+        await asyncio.gather(
+            *(
+                model.awarm()
+                for model in models
+                if isinstance(model, (Model, EmbeddingModel))
+            )
+        )
+
+    @staticmethod
+    @contextmanager
+    def _limit_embeddings(embedding_model, inference_models):
+        """
+        Bound the async embedding requests of a run. Requests to the endpoint
+        of one of the inference models take slots from its limiter, requests
+        to other endpoints get a limiter of their own.
+        """
+        # Cache wrappers pass missing texts on to the model they wrap
+        while isinstance(
+            getattr(embedding_model, "embedding_model", None), EmbeddingModel
+        ):
+            embedding_model = embedding_model.embedding_model
+        if not isinstance(embedding_model, EmbeddingModel):
+            yield
+            return
+
+        clients = embedding_model.clients
+        limiter = next(
+            (
+                model.limiter
+                for model in inference_models
+                if clients is not None
+                and getattr(model, "clients", None) is not None
+                and model.clients.key == clients.key
+            ),
+            None,
         )
 
-        self.tracer.trace(experiment_config, exp_summary)
+        previous_limiter = embedding_model.limiter
+        embedding_model.limiter = limiter or AdaptiveLimiter.for_model(embedding_model)
+        try:
+            yield
+        finally:
+            embedding_model.limiter = previous_limiter
+
+    @contextmanager
+    def _attach_caches(self, experiment_config: ExperimentConfig):
+        """
+        Serve repeated model requests from the tracer's database for the
+        duration of a run, when inference_cache or embedding_cache is configured
+        """
+        inference_model = experiment_config.inference_model
+        embedding_model = experiment_config.embedding_model
+        previous_inference_cache = getattr(inference_model, "cache", None)
+
+        if experiment_config.inference_cache is not None:
+            self.inference_cache = InferenceCache(
+                self.tracer.db_client, experiment_config.inference_cache
+            )
+            inference_model.cache = self.inference_cache
+
+        if experiment_config.embedding_cache:
+            self.embedding_cache = EmbeddingCache(self.tracer.db_client)
+            experiment_config.embedding_model = CachedEmbedding(
+                embedding_model, self.embedding_cache
+            )
+
+        try:
+            yield
+        finally:
+            inference_model.cache = previous_inference_cache
+            experiment_config.embedding_model = embedding_model
+
+    def _start_experiment(self, experiment_config: ExperimentConfig):
+        """
+        Start a new experiment, or resume the one identified by
+        experiment_config.experiment_id, returning its id and whether it was
+        resumed
+        """
+        experiment_id = experiment_config.experiment_id
+        if experiment_id and self.tracer.experiment_exists(experiment_id):
+            return experiment_id, True
+
+        experiment_id = experiment_id or str(uuid.uuid4())
+        self.tracer.start_experiment(experiment_config, experiment_id)
+
+        return experiment_id, False
+
+    def _finish_experiment(self, experiment_id: str) -> None:
+        self.tracer.finish_experiment(experiment_id, self.run_metrics)
+
+    def _begin_run(
+        self,
+        experiment_config: ExperimentConfig,
+        prompt_template: CompiledPromptTemplate,
+        limiter: AdaptiveLimiter = None,
+    ) -> "ExperimentRun":
+        """Start, or resume, the experiment of a run and set up its state"""
+        experiment_id, resumed = self._start_experiment(experiment_config)
+        timings = self.timings = StageTimings()
+
+        return ExperimentRun(
+            experiment_id=experiment_id,
+            inference_model=experiment_config.inference_model,
+            prompt_template=prompt_template,
+            evaluation_plan=EvaluationPlan(experiment_config, timings),
+            evaluation_batch_size=experiment_config.evaluation_batch_size,
+            timings=timings,
+            timestamp=datetime.now().isoformat(),
+            resumed_tracer=self.tracer if resumed else None,
+            early_stopping=EarlyStopping.for_experiment(experiment_config, self.tracer),
+            limiter=limiter,
+        )
+
+    def _end_run(self, run: "ExperimentRun") -> str:
+        """Record the run metrics of a finished run with its experiment"""
+        self.run_metrics = {}
+        if run.limiter is not None:
+            self.run_metrics["concurrency"] = run.limiter.metrics()
+        self.run_metrics["timings"] = run.timings.histograms()
+        hedger = getattr(run.inference_model, "hedger", None)
+        if run.limiter is not None and hedger is not None:
+            self.run_metrics["hedging"] = hedger.stats()
+        if run.early_stopping is not None:
+            self.run_metrics["early_stopping"] = run.early_stopping.summary()
+        self._finish_experiment(run.experiment_id)
+
+        return run.experiment_id
 
     def init_batch_eval(
         self,
@@ -90,57 +301,89 @@ class Experiment:
         user_prompt,
         prompt_template_variables,
         experiment_config: ExperimentConfig,
-    ) -> List:
-        inference_model = experiment_config.inference_model
-        experiment_id = str(uuid.uuid4())
-        timestamp = datetime.now().isoformat()
+    ) -> str:
+        run = self._begin_run(
+            experiment_config,
+            CompiledPromptTemplate(
+                system_prompt, user_prompt, prompt_template_variables
+            ),
+        )
 
-        exp_summary = []
+        try:
+            # Evaluate records in chunks, so evaluators can batch their own
+            # requests (e.g. one embedding call for a whole chunk)
+            for eval_records in Utils.batched(
+                run.remaining(eval_dataset), run.evaluation_batch_size
+            ):
+                self._run_chunk(run, eval_records)
+                if run.should_stop():
+                    break
+        finally:
+            # Persist whatever has completed, even if the run is failing
+            self._flush([run])
+
+        return self._end_run(run)
+
+    def _run_chunk(self, run: "ExperimentRun", eval_records, prompts=None) -> None:
+        """
+        Infer, evaluate and trace a chunk of records, rendering their prompts
+        unless they are given
+        """
+        timings = run.timings
+        if prompts is None:
+            with timings.measure("render", len(eval_records)):
+                prompts = run.prompt_template.render_many(eval_records)
+
+        inference_results = [
+            run.inference_model(sys_prompt, usr_prompt)
+            for sys_prompt, usr_prompt in prompts
+        ]
+        for inference_result in inference_results:
+            timings.add(inference_result.timings)
+
+        evaluations = run.evaluation_plan.evaluate_batch(
+            [result.inference for result in inference_results],
+            eval_records,
+        )
 
-        for eval_record in eval_dataset:
-            sys_prompt, usr_prompt = self.prepare_prompts(
-                eval_record, system_prompt, user_prompt, prompt_template_variables
+        for eval_record, inference_result, evaluation in zip(
+            eval_records, inference_results, evaluations
+        ):
+            self._trace(
+                run,
+                self._build_result(
+                    run.experiment_id,
+                    eval_record,
+                    inference_result,
+                    evaluation,
+                    run.timestamp,
+                ),
             )
 
-            inference_result = inference_model(sys_prompt, usr_prompt)
-            evaluation = self.evaluate(
-                inference_result.inference, eval_record, experiment_config
+    def _trace(self, run: "ExperimentRun", eval_result) -> None:
+        start = time.perf_counter_ns()
+        written = self.tracer.trace_result(eval_result)
+        # Results are written in chunks, and each write is shared between the
+        # results it persisted
+        run.timings.record("persist", time.perf_counter_ns() - start, written or 0)
+        if run.early_stopping is not None:
+            run.early_stopping.update(
+                eval_result["dataset_record_id"], eval_result["evaluation"]
             )
 
-            eval = dict()
-            eval["experiment_id"] = experiment_id
-            eval["dataset_record_id"] = eval_record["id"]
-            eval["inference"] = inference_result.inference
-            eval["prompt_tokens"] = inference_result.prompt_tokens
-            eval["completion_tokens"] = inference_result.completion_tokens
-            eval["latency_ms"] = inference_result.latency_ms
-            eval["evaluation"] = evaluation
-            eval["created_at"] = timestamp
-
-            exp_summary.append(eval)
-
-        return exp_summary
+    def _flush(self, runs: List["ExperimentRun"]) -> None:
+        """
+        Persist the results still buffered. Runs of a sweep trace the same
+        records, so the write is shared evenly between them.
+        """
+        start = time.perf_counter_ns()
+        written = self.tracer.flush() or 0
+        duration = time.perf_counter_ns() - start
+        for run in runs:
+            run.timings.record("persist", duration // len(runs), written // len(runs))
 
     def evaluate(self, inference: str, row, experiment_config: ExperimentConfig) -> str:
-        evaluations = []
-        for eval in experiment_config.evaluation:
-            evaluator = EvaluatorFactory.get_evaluator(
-                eval.metric,
-                experiment_config.inference_model,
-                experiment_config.embedding_model,
-                eval.evaluator,
-            )
-            data = dict()
-            for key, value in eval.column_mapping.items():
-                if value == "$inference":
-                    data[key] = inference
-                else:
-                    data[key] = row[value]
-            evaluation_result = evaluator.evaluate(data)
-            evaluations.append(
-                {"metric": f"{eval.metric}", "result": evaluation_result}
-            )
-        return json.dumps(evaluations)
+        return EvaluationPlan(experiment_config).evaluate_batch([inference], [row])[0]
 
     async def init_batch_eval_async(
         self,
@@ -149,76 +392,142 @@ class Experiment:
         user_prompt,
         prompt_template_variables,
         experiment_config: ExperimentConfig,
-    ) -> List:
+    ) -> str:
         """
         Asynchronous version of batch evaluation with concurrency limit
         """
         inference_model = experiment_config.inference_model
-        experiment_id = str(uuid.uuid4())
-        timestamp = datetime.now().isoformat()
-
-        # Get max concurrent tasks from model config or use default
-        max_concurrent_tasks = getattr(inference_model, "max_concurrent_tasks", 5)
 
-        exp_summary = []
+        # Judge metrics call the inference model too, so its requests share
+        # one concurrency limit with the experiment's own inferences. The
+        # limit adapts to the provider when adaptive_concurrency is enabled.
+        limiter = AdaptiveLimiter.for_model(inference_model)
+        previous_limiter = getattr(inference_model, "limiter", None)
+        inference_model.limiter = limiter
 
-        # Prepare all prompts first
-        prepared_prompts = []
-        for eval_record in eval_dataset:
-            sys_prompt, usr_prompt = self.prepare_prompts(
-                eval_record, system_prompt, user_prompt, prompt_template_variables
-            )
-            prepared_prompts.append((eval_record, sys_prompt, usr_prompt))
-
-        # Process in batches with limited concurrency
-        semaphore = asyncio.Semaphore(max_concurrent_tasks)
-
-        async def process_with_semaphore(record, s_prompt, u_prompt):
-            async with semaphore:
-                return await self._process_record_async(
-                    inference_model,
-                    s_prompt,
-                    u_prompt,
-                    record,
-                    experiment_id,
-                    timestamp,
-                    experiment_config,
-                )
+        run = self._begin_run(
+            experiment_config,
+            CompiledPromptTemplate(
+                system_prompt, user_prompt, prompt_template_variables
+            ),
+            limiter,
+        )
 
-        # Create tasks for async execution with semaphore
-        tasks = []
-        for eval_record, sys_prompt, usr_prompt in prepared_prompts:
-            task = asyncio.create_task(
-                process_with_semaphore(eval_record, sys_prompt, usr_prompt)
+        with self._limit_embeddings(
+            experiment_config.embedding_model, [inference_model]
+        ):
+            try:
+                for eval_record in run.remaining(eval_dataset):
+                    # Requests already in flight are still completed and traced
+                    if run.should_stop():
+                        break
+                    await self._add_record_async(run, eval_record)
+
+                await self._drain_async(run)
+            finally:
+                # Don't leave orphaned requests running if a record failed, and
+                # persist whatever has completed
+                run.cancel()
+                inference_model.limiter = previous_limiter
+                self._flush([run])
+
+        return self._end_run(run)
+
+    async def _add_record_async(
+        self, run: "ExperimentRun", eval_record, prompt=None
+    ) -> None:
+        """
+        Start the inference of a record, rendering its prompt unless it is
+        given. Records are pulled from the dataset lazily and a run keeps at
+        most its current concurrency limit of inferences and two evaluation
+        chunks in flight, so memory is bounded by the concurrency window
+        rather than by the size of the dataset.
+        """
+        while (
+            len(run.inference_tasks) >= run.limiter.limit
+            or len(run.evaluation_tasks) >= 2
+        ):
+            await self._collect_async(run)
+            self._schedule_evaluations(run)
+
+        if prompt is None:
+            with run.timings.measure("render"):
+                prompt = run.prompt_template.render(eval_record)
+        run.inference_tasks.add(
+            asyncio.create_task(
+                self._process_record_async(run.inference_model, *prompt, eval_record)
             )
-            tasks.append(task)
+        )
 
-        # Wait for all tasks to complete
-        results = await asyncio.gather(*tasks)
-        exp_summary.extend(results)
+    async def _drain_async(self, run: "ExperimentRun") -> None:
+        """Complete and trace everything a run still has in flight"""
+        while run.inference_tasks or run.evaluation_tasks or run.inferred:
+            self._schedule_evaluations(run, final=not run.inference_tasks)
+            await self._collect_async(run)
 
-        return exp_summary
+    async def _collect_async(self, run: "ExperimentRun") -> None:
+        done, _ = await asyncio.wait(
+            run.inference_tasks | run.evaluation_tasks,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        for task in done:
+            if task in run.inference_tasks:
+                run.inference_tasks.remove(task)
+                run.inferred.append(task.result())
+                run.timings.add(task.result()[1].timings)
+            else:
+                run.evaluation_tasks.remove(task)
+                for eval_result in task.result():
+                    self._trace(run, eval_result)
+
+    def _schedule_evaluations(self, run: "ExperimentRun", final=False) -> None:
+        batch_size = run.evaluation_batch_size
+        while len(run.inferred) >= batch_size or (final and run.inferred):
+            chunk = run.inferred[:batch_size]
+            del run.inferred[:batch_size]
+            run.evaluation_tasks.add(
+                asyncio.create_task(
+                    self._evaluate_chunk_async(
+                        chunk, run.experiment_id, run.timestamp, run.evaluation_plan
+                    )
+                )
+            )
 
     async def _process_record_async(
-        self,
-        inference_model,
-        system_prompt,
-        user_prompt,
-        eval_record,
-        experiment_id,
-        timestamp,
-        experiment_config,
+        self, inference_model, system_prompt, user_prompt, eval_record
     ):
         """
-        Process a single record asynchronously
+        Run inference for a single record asynchronously
         """
         inference_result = await inference_model(system_prompt, user_prompt)
 
-        # Run potentially blocking evaluation in a separate thread
-        evaluation = await asyncio.to_thread(
-            self.evaluate, inference_result.inference, eval_record, experiment_config
+        return eval_record, inference_result
+
+    async def _evaluate_chunk_async(
+        self, chunk, experiment_id, timestamp, evaluation_plan
+    ):
+        """
+        Evaluate a chunk of inferred records
+        """
+        eval_records = [eval_record for eval_record, _ in chunk]
+        inference_results = [inference_result for _, inference_result in chunk]
+
+        evaluations = await evaluation_plan.aevaluate_batch(
+            [result.inference for result in inference_results], eval_records
         )
 
+        return [
+            self._build_result(
+                experiment_id, eval_record, inference_result, evaluation, timestamp
+            )
+            for eval_record, inference_result, evaluation in zip(
+                eval_records, inference_results, evaluations
+            )
+        ]
+
+    def _build_result(
+        self, experiment_id, eval_record, inference_result, evaluation, timestamp
+    ):
         eval_result = dict()
         eval_result["experiment_id"] = experiment_id
         eval_result["dataset_record_id"] = eval_record["id"]
@@ -226,6 +535,10 @@ class Experiment:
         eval_result["prompt_tokens"] = inference_result.prompt_tokens
         eval_result["completion_tokens"] = inference_result.completion_tokens
         eval_result["latency_ms"] = inference_result.latency_ms
+        eval_result["retries"] = inference_result.retries
+        eval_result["time_to_first_token_ms"] = inference_result.time_to_first_token_ms
+        eval_result["inter_token_latency_ms"] = inference_result.inter_token_latency_ms
+        eval_result["tokens_per_second"] = inference_result.tokens_per_second
         eval_result["evaluation"] = evaluation
         eval_result["created_at"] = timestamp
 
@@ -234,11 +547,6 @@ class Experiment:
     def prepare_prompts(
         self, item, system_prompt, user_prompt, prompt_template_variables
     ):
-        for variable in prompt_template_variables:
-            placeholder = f"<{variable}>"
-            replacement = f"<{item[variable]}>"
-
-            system_prompt = system_prompt.replace(placeholder, replacement)
-            user_prompt = user_prompt.replace(placeholder, replacement)
-
-        return system_prompt, user_prompt
+        return CompiledPromptTemplate(
+            system_prompt, user_prompt, prompt_template_variables
+        ).render(item)
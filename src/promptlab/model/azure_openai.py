@@ -1,26 +1,21 @@
 import time
-from typing import Any
-from openai import AzureOpenAI
-from openai import AsyncAzureOpenAI
+from typing import Any, List
 
+from promptlab.model.http_clients import AzureOpenAIClients
 from promptlab.model.model import EmbeddingModel, Model, InferenceResult, ModelConfig
+from promptlab.model.streaming import (
+    STREAM_OPTIONS,
+    StreamTimer,
+    aread_chat_completion_stream,
+    read_chat_completion_stream,
+)
 
 
 class AzOpenAI(Model):
     def __init__(self, model_config: ModelConfig):
         super().__init__(model_config)
 
-        self.client = AzureOpenAI(
-            api_key=model_config.api_key,
-            api_version=model_config.api_version,
-            azure_endpoint=str(model_config.endpoint),
-        )
-
-        self.async_client = AsyncAzureOpenAI(
-            api_key=model_config.api_key,
-            api_version=model_config.api_version,
-            azure_endpoint=str(model_config.endpoint),
-        )
+        self.clients = AzureOpenAIClients(model_config)
 
     def invoke(self, system_prompt: str, user_prompt: str):
         payload = [
@@ -28,14 +23,24 @@ class AzOpenAI(Model):
             {"role": "user", "content": user_prompt},
         ]
 
-        start_time = time.time()
+        if self.stream:
+            timer = StreamTimer()
+            stream = self.clients.client.chat.completions.create(
+                model=self.model_config.inference_model_deployment,
+                messages=payload,
+                stream=True,
+                stream_options=STREAM_OPTIONS,
+            )
+            return read_chat_completion_stream(stream, timer)
+
+        start_time = time.perf_counter_ns()
 
-        chat_completion = self.client.chat.completions.create(
+        chat_completion = self.clients.client.chat.completions.create(
             model=self.model_config.inference_model_deployment, messages=payload
         )
 
-        end_time = time.time()
-        latency_ms = (end_time - start_time) * 1000
+        end_time = time.perf_counter_ns()
+        latency_ms = (end_time - start_time) / 1_000_000
 
         inference = chat_completion.choices[0].message.content
         prompt_token = chat_completion.usage.prompt_tokens
@@ -57,14 +62,24 @@ class AzOpenAI(Model):
             {"role": "user", "content": user_prompt},
         ]
 
-        start_time = time.time()
+        if self.stream:
+            timer = StreamTimer()
+            stream = await self.clients.async_client.chat.completions.create(
+                model=self.model_config.inference_model_deployment,
+                messages=payload,
+                stream=True,
+                stream_options=STREAM_OPTIONS,
+            )
+            return await aread_chat_completion_stream(stream, timer)
+
+        start_time = time.perf_counter_ns()
 
-        chat_completion = await self.async_client.chat.completions.create(
+        chat_completion = await self.clients.async_client.chat.completions.create(
             model=self.model_config.inference_model_deployment, messages=payload
         )
 
-        end_time = time.time()
-        latency_ms = (end_time - start_time) * 1000
+        end_time = time.perf_counter_ns()
+        latency_ms = (end_time - start_time) / 1_000_000
 
         inference = chat_completion.choices[0].message.content
         prompt_token = chat_completion.usage.prompt_tokens
@@ -79,22 +94,31 @@ class AzOpenAI(Model):
 
 
 class AzOpenAI_Embedding(EmbeddingModel):
+    max_batch_size = 2048
+
     def __init__(self, model_config: ModelConfig):
         super().__init__(model_config)
 
-        self.client = AzureOpenAI(
-            api_key=model_config.api_key,
-            api_version=model_config.api_version,
-            azure_endpoint=str(model_config.endpoint),
-        )
+        self.clients = AzureOpenAIClients(model_config)
 
     def __call__(self, text: str) -> Any:
-        embedding = (
-            self.client.embeddings.create(
-                input=text, model=self.model_config.embedding_model_deployment
-            )
-            .data[0]
-            .embedding
+        # Through embed_many, so single texts are retried too
+        return self.embed_many([text])[0]
+
+    def _embed_batch(self, texts: List[str]) -> List[Any]:
+        response = self.clients.client.embeddings.create(
+            input=texts, model=self.model_config.embedding_model_deployment
+        )
+
+        return [item.embedding for item in sorted(response.data, key=_by_index)]
+
+    async def _aembed_batch(self, texts: List[str]) -> List[Any]:
+        response = await self.clients.async_client.embeddings.create(
+            input=texts, model=self.model_config.embedding_model_deployment
         )
 
-        return embedding
+        return [item.embedding for item in sorted(response.data, key=_by_index)]
+
+
+def _by_index(item):
+    return item.index
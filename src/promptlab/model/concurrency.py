@@ -0,0 +1,204 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from statistics import median
+from typing import Dict, Optional
+
+import httpx
+import openai
+
+# Status codes providers use to ask clients to slow down
+THROTTLING_STATUS_CODES = {429, 503}
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    """Whether an error means the provider is overloaded or rate limiting us"""
+    if isinstance(
+        error,
+        (
+            TimeoutError,
+            asyncio.TimeoutError,
+            httpx.TimeoutException,
+            openai.APITimeoutError,
+            openai.RateLimitError,
+        ),
+    ):
+        return True
+
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+
+    return status_code in THROTTLING_STATUS_CODES
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for the async requests of a model, adjusted with AIMD.
+
+    The limit grows by one after a full window of healthy requests and is
+    halved when a request is throttled, times out, or the median latency of
+    the last latency_window requests drifts past latency_tolerance times the
+    median of the last latency_history requests. Medians keep a few unusually
+    short or long responses from moving either side, and the reference
+    follows the provider as it slowly changes. With adaptive=False the limit
+    stays fixed and only the request counters are kept.
+    """
+
+    def __init__(
+        self,
+        limit: int = 5,
+        max_limit: int = None,
+        min_limit: int = 1,
+        adaptive: bool = True,
+        latency_tolerance: float = 3.0,
+        backoff: float = 0.5,
+        latency_window: int = 10,
+        latency_history: int = 200,
+    ):
+        self.limit = limit
+        self.max_limit = max(max_limit or limit, limit)
+        self.min_limit = min_limit
+        self.adaptive = adaptive
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.latency_window = latency_window
+
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.history = [(0.0, limit)]
+
+        self._waiters = deque()
+        self._successes = 0
+        self._epoch = 0
+        self._latencies = deque(maxlen=max(latency_history, 2 * latency_window))
+        # Latencies recorded since the last decrease
+        self._fresh_latencies = 0
+        self._started_at = time.monotonic()
+
+    @classmethod
+    def for_model(cls, model) -> "AdaptiveLimiter":
+        limit = getattr(model, "max_concurrent_tasks", 5)
+        model_config = getattr(model, "model_config", None)
+
+        if getattr(model_config, "adaptive_concurrency", False):
+            return cls(limit, max_limit=model_config.max_adaptive_concurrency)
+        return cls(limit, adaptive=False)
+
+    @asynccontextmanager
+    async def slot(self, track_latency: bool = True):
+        """
+        Hold one unit of concurrency for the duration of a request. Requests
+        of another kind, e.g. embeddings sharing a chat model's endpoint, pass
+        track_latency=False so their latency doesn't skew the baseline.
+        """
+        await self._acquire()
+        epoch = self._epoch
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as error:
+            self._release()
+            self._on_error(error, epoch)
+            raise
+        except BaseException:
+            # Cancelled, says nothing about the provider's health
+            self._release()
+            raise
+        else:
+            self._release()
+            self._on_success(
+                time.perf_counter() - start if track_latency else None, epoch
+            )
+
+    def metrics(self) -> Dict:
+        return {
+            "concurrency_limit": self.limit,
+            "concurrency_history": [list(change) for change in self.history],
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "errors": self.errors,
+        }
+
+    async def _acquire(self) -> None:
+        while self.in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Hand a wake-up we can no longer use to the next waiter
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+        self.in_flight += 1
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        free = self.limit - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def _on_success(self, latency: Optional[float], epoch: int) -> None:
+        self.requests += 1
+
+        if latency is not None:
+            self._latencies.append(latency)
+            self._fresh_latencies += 1
+            if self._latency_degraded():
+                self._decrease(epoch)
+                return
+
+        self._successes += 1
+        if self._successes >= self.limit:
+            self._successes = 0
+            self._set_limit(min(self.max_limit, self.limit + 1))
+
+    def _on_error(self, error: Exception, epoch: int) -> None:
+        self.requests += 1
+        self._successes = 0
+
+        if is_throttling_error(error):
+            self.throttled += 1
+            self._decrease(epoch)
+        else:
+            self.errors += 1
+
+    def _decrease(self, epoch: int) -> None:
+        # Requests started before the last decrease were sent at the old
+        # limit, a burst of them failing together only counts once
+        if epoch != self._epoch:
+            return
+
+        self._epoch += 1
+        self._successes = 0
+        # Judge the new limit by requests sent at it
+        self._fresh_latencies = 0
+        self._set_limit(max(self.min_limit, int(self.limit * self.backoff)))
+
+    def _latency_degraded(self) -> bool:
+        if (
+            self._fresh_latencies < self.latency_window
+            or len(self._latencies) < 2 * self.latency_window
+        ):
+            return False
+
+        recent = list(self._latencies)[-self.latency_window :]
+        return median(recent) > self.latency_tolerance * median(self._latencies)
+
+    def _set_limit(self, limit: int) -> None:
+        if not self.adaptive or limit == self.limit:
+            return
+
+        self.limit = limit
+        self.history.append((round(time.monotonic() - self._started_at, 3), limit))
+        self._wake()
@@ -0,0 +1,105 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+from promptlab.types import ModelConfig
+
+
+class Hedger:
+    """
+    Sends a duplicate of a slow request once it has been running longer than
+    the given percentile of recently observed latencies, and keeps whichever
+    copy answers first. At most budget of all requests are hedged.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        budget: float = 0.05,
+        min_samples: int = 20,
+        window: int = 1000,
+    ):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._latencies = deque(maxlen=window)
+
+    @classmethod
+    def for_config(cls, model_config: ModelConfig) -> Optional["Hedger"]:
+        percentile = getattr(model_config, "hedge_percentile", None)
+        if percentile is None:
+            return None
+
+        return cls(percentile, budget=getattr(model_config, "hedge_budget", 0.05))
+
+    def delay(self) -> Optional[float]:
+        """Seconds after which a request gets hedged, None until enough samples"""
+        if len(self._latencies) < self.min_samples:
+            return None
+
+        latencies = sorted(self._latencies)
+        index = math.ceil(self.percentile / 100 * len(latencies)) - 1
+        return latencies[min(max(index, 0), len(latencies) - 1)]
+
+    async def run(
+        self,
+        request: Callable[[], Awaitable],
+        hedge: Optional[Callable[[], Awaitable]] = None,
+    ):
+        """
+        Await request(), hedging it with hedge(), by default a second call of
+        request, if it is slow. Only the first copy of a request is timed, a
+        hedge may have to wait for quota of its own before it is sent.
+        """
+        self.requests += 1
+        delay = self.delay()
+
+        primary = asyncio.ensure_future(self._timed(request))
+        if delay is None or self.hedged >= self.budget * self.requests:
+            return await primary
+
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+
+            self.hedged += 1
+            hedge = asyncio.ensure_future((hedge or request)())
+            tasks.add(hedge)
+
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
+                )
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded:
+                    if succeeded[0] is hedge:
+                        self.hedge_wins += 1
+                    return succeeded[0].result()
+
+                # A copy that failed still leaves the other one a chance
+                if not tasks:
+                    return done.pop().result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+        }
+
+    async def _timed(self, request: Callable[[], Awaitable]):
+        start = time.perf_counter()
+        result = await request()
+        self._latencies.append(time.perf_counter() - start)
+        return result
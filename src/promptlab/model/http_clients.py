@@ -0,0 +1,228 @@
+import asyncio
+import importlib.util
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from openai import AsyncAzureOpenAI, AsyncOpenAI, AzureOpenAI, OpenAI
+from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+
+from promptlab.types import ModelConfig
+
+
+def connection_limits(model_config: ModelConfig) -> httpx.Limits:
+    """
+    Keep as many connections open as requests the model may have in flight,
+    unless max_connections is configured
+    """
+    connections = getattr(model_config, "max_connections", None)
+    if not connections:
+        connections = getattr(model_config, "max_concurrent_tasks", 5)
+        if getattr(model_config, "adaptive_concurrency", False):
+            connections = max(connections, model_config.max_adaptive_concurrency)
+
+    return httpx.Limits(
+        max_connections=connections,
+        max_keepalive_connections=connections,
+        keepalive_expiry=getattr(model_config, "keepalive_expiry", 30.0),
+    )
+
+
+class SharedClients(ABC):
+    """
+    Sync and async clients of a provider, shared by every model and embedding
+    model with the same endpoint and credentials, so inference, judge and
+    embedding requests reuse one pool of connections. The pool is as large as
+    the largest any of these models asks for. An async client is bound to the
+    event loop it was created on, so every loop gets clients of its own.
+    """
+
+    # key -> (client, httpx client, URL to warm connections with, settings
+    # the clients were created with)
+    _clients: Dict[Tuple, Tuple[Any, Any, str, Tuple]] = {}
+    # event loop -> {key -> (client, httpx client, URL, settings)}
+    _async_clients = weakref.WeakKeyDictionary()
+    # key -> (httpx.Limits, http2), merged over every model of the key
+    _settings: Dict[Tuple, Tuple[httpx.Limits, bool]] = {}
+    # Sync clients replaced by larger pools, closed by close_all
+    _replaced: List[Any] = []
+    _lock = threading.Lock()
+
+    def __init__(self, model_config: ModelConfig):
+        self.model_config = model_config
+        http2 = bool(getattr(model_config, "http2", False))
+        if http2 and importlib.util.find_spec("h2") is None:
+            raise ValueError(
+                "http2 requires the h2 package, install it with "
+                "pip install 'promptlab[http2]'"
+            )
+
+        self.key = (
+            type(self).__name__,
+            str(model_config.endpoint),
+            model_config.api_key,
+            getattr(model_config, "api_version", None),
+        )
+        self._requested = (connection_limits(model_config), http2)
+        with self._lock:
+            self._settings[self.key] = self._merge(
+                self._settings.get(self.key), self._requested
+            )
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return self._current_settings()[0]
+
+    @property
+    def http2(self) -> bool:
+        return self._current_settings()[1]
+
+    @property
+    def client(self):
+        return self._entry()[0]
+
+    @property
+    def async_client(self):
+        return self._async_entry()[0]
+
+    def warm(self) -> None:
+        """Open a connection to the provider ahead of the first request"""
+        _, http_client, url = self._entry()
+        try:
+            http_client.head(url)
+        except Exception:
+            # Connection problems surface, and are retried, on the first
+            # real request. The openai package may bring its own httpx fork,
+            # so its errors aren't necessarily httpx.HTTPError.
+            pass
+
+    async def awarm(self, connections: int = 1) -> None:
+        """Open up to connections connections at once ahead of a run"""
+        _, http_client, url = self._async_entry()
+        # A single HTTP/2 connection multiplexes all requests
+        connections = 1 if self.http2 else min(connections, self.limits.max_connections)
+        await asyncio.gather(
+            *(http_client.head(url) for _ in range(connections)),
+            return_exceptions=True,
+        )
+
+    @classmethod
+    def close_all(cls) -> None:
+        """Close the sync clients and forget all clients and settings"""
+        with cls._lock:
+            for _, http_client, _, _ in cls._clients.values():
+                http_client.close()
+            for http_client in cls._replaced:
+                http_client.close()
+            cls._clients.clear()
+            cls._replaced.clear()
+            cls._async_clients.clear()
+            cls._settings.clear()
+
+    @staticmethod
+    def _merge(
+        settings: Optional[Tuple[httpx.Limits, bool]],
+        requested: Tuple[httpx.Limits, bool],
+    ) -> Tuple[httpx.Limits, bool]:
+        """The larger of two pool settings"""
+        if settings is None:
+            return requested
+
+        (limits, http2), (other, other_http2) = settings, requested
+        connections = max(limits.max_connections, other.max_connections)
+        return (
+            httpx.Limits(
+                max_connections=connections,
+                max_keepalive_connections=connections,
+                keepalive_expiry=max(limits.keepalive_expiry, other.keepalive_expiry),
+            ),
+            http2 or other_http2,
+        )
+
+    def _current_settings(self) -> Tuple[httpx.Limits, bool]:
+        # A copy unpickled in another process finds only its own settings
+        return self._settings.get(self.key, self._requested)
+
+    def _entry(self) -> Tuple[Any, Any, str]:
+        with self._lock:
+            settings = self._current_settings()
+            entry = self._clients.get(self.key)
+            if entry is None or entry[3] != settings:
+                # A model created after the pool asked for a larger one.
+                # Requests may still use the old client, so it is only
+                # closed by close_all.
+                if entry is not None:
+                    self._replaced.append(entry[1])
+                entry = self._clients[self.key] = (*self._connect(), settings)
+            return entry[:3]
+
+    def _async_entry(self) -> Tuple[Any, Any, str]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            settings = self._current_settings()
+            clients = self._async_clients.setdefault(loop, {})
+            entry = clients.get(self.key)
+            if entry is None or entry[3] != settings:
+                entry = clients[self.key] = (*self._aconnect(), settings)
+            return entry[:3]
+
+    @abstractmethod
+    def _connect(self) -> Tuple[Any, Any, str]:
+        """Sync client, its httpx client and the base url it sends requests to"""
+        pass
+
+    @abstractmethod
+    def _aconnect(self) -> Tuple[Any, Any, str]:
+        """Async client, its httpx client and the base url it sends requests to"""
+        pass
+
+
+class OpenAIClients(SharedClients):
+    """Clients of OpenAI compatible APIs, e.g. DeepSeek and OpenRouter"""
+
+    def _connect(self):
+        http_client = DefaultHttpxClient(limits=self.limits, http2=self.http2)
+        # Retries are handled by the model's RetryPolicy, not the client
+        client = OpenAI(
+            api_key=self.model_config.api_key,
+            base_url=str(self.model_config.endpoint),
+            max_retries=0,
+            http_client=http_client,
+        )
+        return client, http_client, str(client.base_url)
+
+    def _aconnect(self):
+        http_client = DefaultAsyncHttpxClient(limits=self.limits, http2=self.http2)
+        client = AsyncOpenAI(
+            api_key=self.model_config.api_key,
+            base_url=str(self.model_config.endpoint),
+            max_retries=0,
+            http_client=http_client,
+        )
+        return client, http_client, str(client.base_url)
+
+
+class AzureOpenAIClients(SharedClients):
+    def _connect(self):
+        http_client = DefaultHttpxClient(limits=self.limits, http2=self.http2)
+        client = AzureOpenAI(
+            api_key=self.model_config.api_key,
+            api_version=self.model_config.api_version,
+            azure_endpoint=str(self.model_config.endpoint),
+            max_retries=0,
+            http_client=http_client,
+        )
+        return client, http_client, str(client.base_url)
+
+    def _aconnect(self):
+        http_client = DefaultAsyncHttpxClient(limits=self.limits, http2=self.http2)
+        client = AsyncAzureOpenAI(
+            api_key=self.model_config.api_key,
+            api_version=self.model_config.api_version,
+            azure_endpoint=str(self.model_config.endpoint),
+            max_retries=0,
+            http_client=http_client,
+        )
+        return client, http_client, str(client.base_url)
@@ -1,15 +1,55 @@
 from abc import ABC, abstractmethod
-from typing import Any, Union, Awaitable
+from typing import Any, Iterator, List, Union, Awaitable
 import asyncio
+import time
 
+from promptlab.enums import ExecutionMode
+from promptlab.model.hedging import Hedger
+from promptlab.model.rate_limit import RateLimiter
+from promptlab.model.retry import RetryPolicy
+from promptlab.process_pool import ProcessBatcher
 from promptlab.types import InferenceResult, ModelConfig
 
 
 class Model(ABC):
+    # Optional InferenceCache consulted before invoking the model
+    cache = None
+    # Optional AdaptiveLimiter bounding concurrent async requests, shared by
+    # everything that calls the model during a run (inference and judges)
+    limiter = None
+    # Optional SharedClients holding the provider's pooled connections
+    clients = None
+    # Per run state that stays in this process when the model is sent to a
+    # worker process
+    _process_local_state = (
+        "cache",
+        "limiter",
+        "rate_limiter",
+        "hedger",
+        "process_batcher",
+    )
+
     def __init__(self, model_config: ModelConfig):
         self.model_config = model_config
         self.config = model_config
         self.max_concurrent_tasks = getattr(model_config, "max_concurrent_tasks", 5)
+        # Stream responses to measure the time to first token
+        self.stream = getattr(model_config, "stream", False)
+        # Requests and tokens per minute quota, shared per model config
+        self.rate_limiter = RateLimiter.for_config(model_config)
+        self.retry_policy = RetryPolicy.for_config(model_config)
+        # Optional Hedger duplicating slow async requests
+        self.hedger = Hedger.for_config(model_config)
+        # In process execution mode async calls run invoke in worker processes
+        self.process_batcher = None
+        if getattr(model_config, "execution", None) == ExecutionMode.PROCESS.value:
+            self.process_batcher = ProcessBatcher(self.invoke)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in self._process_local_state:
+            state.pop(name, None)
+        return state
 
     @abstractmethod
     def invoke(self, system_prompt: str, user_prompt: str) -> InferenceResult:
@@ -21,6 +61,16 @@ class Model(ABC):
         """Asynchronous invocation of the model"""
         pass
 
+    def warm(self) -> None:
+        """Open a connection to the provider before a run starts"""
+        if self.clients is not None:
+            self.clients.warm()
+
+    async def awarm(self) -> None:
+        """Open a connection for every request run_async may send at once"""
+        if self.clients is not None:
+            await self.clients.awarm(self.max_concurrent_tasks)
+
     def invoke_async(self, system_prompt: str, user_prompt: str) -> InferenceResult:
         """Helper method to run async method in sync context"""
         return asyncio.run(self.ainvoke(system_prompt, user_prompt))
@@ -33,20 +83,271 @@ class Model(ABC):
         try:
             # If we're in an async context and the caller is awaiting this call
             if asyncio.get_event_loop().is_running():
-                return self.ainvoke(system_prompt, user_prompt)
+                return self._ainvoke(system_prompt, user_prompt)
         except RuntimeError:
             # If we're not in an async context, use the sync version
             pass
 
         # Default to synchronous invocation
-        return self.invoke(system_prompt, user_prompt)
+        return self._invoke(system_prompt, user_prompt)
+
+    def _invoke(self, system_prompt: str, user_prompt: str) -> InferenceResult:
+        """Synchronous invocation, served from the cache when possible"""
+        if self.cache is None or self.cache.bypass:
+            return self._invoke_with_retries(system_prompt, user_prompt)
+
+        key = self.cache.key(self.model_config, system_prompt, user_prompt)
+        inference_result = self.cache.get(key)
+        if inference_result is None:
+            inference_result = self._invoke_with_retries(system_prompt, user_prompt)
+            self.cache.put(key, inference_result)
+
+        return inference_result
+
+    async def _ainvoke(self, system_prompt: str, user_prompt: str) -> InferenceResult:
+        """Asynchronous invocation, served from the cache when possible"""
+        if self.cache is None or self.cache.bypass:
+            return await self._ainvoke_with_retries(system_prompt, user_prompt)
+
+        # Cache lookups hit SQLite, keep them off the event loop
+        key = self.cache.key(self.model_config, system_prompt, user_prompt)
+        inference_result = await asyncio.to_thread(self.cache.get, key)
+        if inference_result is None:
+            inference_result = await self._ainvoke_with_retries(
+                system_prompt, user_prompt
+            )
+            await asyncio.to_thread(self.cache.put, key, inference_result)
+
+        return inference_result
+
+    def _invoke_with_retries(
+        self, system_prompt: str, user_prompt: str
+    ) -> InferenceResult:
+        inference_result, retries = self.retry_policy.call(
+            self._invoke_limited, system_prompt, user_prompt
+        )
+        inference_result.retries = retries
+
+        return inference_result
+
+    async def _ainvoke_with_retries(
+        self, system_prompt: str, user_prompt: str
+    ) -> InferenceResult:
+        # Every attempt waits for quota and a concurrency slot again, and
+        # gives the slot back while backing off
+        inference_result, retries = await self.retry_policy.acall(
+            self._ainvoke_limited, system_prompt, user_prompt
+        )
+        inference_result.retries = retries
+
+        return inference_result
+
+    def _invoke_limited(self, system_prompt: str, user_prompt: str) -> InferenceResult:
+        queued_at = time.perf_counter_ns()
+        if self.rate_limiter is None:
+            return self._invoke_timed(queued_at, system_prompt, user_prompt)
+
+        estimated_tokens = self.rate_limiter.acquire(system_prompt, user_prompt)
+        inference_result = self._invoke_timed(queued_at, system_prompt, user_prompt)
+        self.rate_limiter.settle(estimated_tokens, inference_result)
+
+        return inference_result
+
+    def _invoke_timed(
+        self, queued_at: int, system_prompt: str, user_prompt: str
+    ) -> InferenceResult:
+        sent_at = time.perf_counter_ns()
+        inference_result = self.invoke(system_prompt, user_prompt)
+        inference_result.timings = {
+            **inference_result.timings,
+            "queue_wait": sent_at - queued_at,
+            "network": time.perf_counter_ns() - sent_at,
+        }
+
+        return inference_result
+
+    async def _ainvoke_limited(
+        self, system_prompt: str, user_prompt: str
+    ) -> InferenceResult:
+        return await self._ainvoke_reserved(
+            self._ainvoke_hedged, system_prompt, user_prompt
+        )
+
+    async def _ainvoke_reserved(
+        self, send, system_prompt: str, user_prompt: str
+    ) -> InferenceResult:
+        """
+        Reserve quota and a concurrency slot for one provider request, and
+        send it with send. A request cancelled while in flight, e.g. the
+        slower copy of a hedged request, keeps its estimated tokens charged.
+        """
+        queued_at = time.perf_counter_ns()
+
+        # Wait for quota before taking a concurrency slot, so requests held
+        # back by the rate limit don't count as in flight
+        if self.rate_limiter is not None:
+            estimated_tokens = await self.rate_limiter.aacquire(
+                system_prompt, user_prompt
+            )
+
+        if self.limiter is None:
+            inference_result = await self._ainvoke_timed(
+                queued_at, send, system_prompt, user_prompt
+            )
+        else:
+            async with self.limiter.slot():
+                inference_result = await self._ainvoke_timed(
+                    queued_at, send, system_prompt, user_prompt
+                )
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.settle(estimated_tokens, inference_result)
+
+        return inference_result
+
+    async def _ainvoke_timed(
+        self, queued_at: int, send, system_prompt: str, user_prompt: str
+    ) -> InferenceResult:
+        sent_at = time.perf_counter_ns()
+        inference_result = await send(system_prompt, user_prompt)
+        inference_result.timings = {
+            **inference_result.timings,
+            "queue_wait": sent_at - queued_at,
+            "network": time.perf_counter_ns() - sent_at,
+        }
+
+        return inference_result
+
+    async def _ainvoke_hedged(
+        self, system_prompt: str, user_prompt: str
+    ) -> InferenceResult:
+        # Only the provider call is timed and hedged, once the request holds
+        # its quota and concurrency slot, so waiting in the queue never looks
+        # like a slow provider. The hedge is a request of its own, it reserves
+        # quota and takes a concurrency slot before it is sent.
+        if self.hedger is None:
+            return await self._ainvoke_model(system_prompt, user_prompt)
+
+        return await self.hedger.run(
+            lambda: self._ainvoke_model(system_prompt, user_prompt),
+            lambda: self._ainvoke_reserved(
+                self._ainvoke_model, system_prompt, user_prompt
+            ),
+        )
+
+    async def _ainvoke_model(
+        self, system_prompt: str, user_prompt: str
+    ) -> InferenceResult:
+        if self.process_batcher is None:
+            return await self.ainvoke(system_prompt, user_prompt)
+
+        return await self.process_batcher.submit(system_prompt, user_prompt)
 
 
 class EmbeddingModel(ABC):
+    # Most inputs a single embeddings request to the provider can carry
+    max_batch_size = 1
+    # Optional SharedClients holding the provider's pooled connections
+    clients = None
+    # Optional AdaptiveLimiter bounding concurrent async requests during a
+    # run, shared with the inference model when both use the same endpoint
+    limiter = None
+
     def __init__(self, model_config: ModelConfig):
         self.model_config = model_config
         self.config = model_config
+        self.max_concurrent_tasks = getattr(model_config, "max_concurrent_tasks", 5)
+        self.retry_policy = RetryPolicy.for_config(model_config)
+        self.batch_size = min(
+            getattr(model_config, "embedding_batch_size", None) or self.max_batch_size,
+            self.max_batch_size,
+        )
 
     @abstractmethod
     def __call__(self, text: str) -> Any:
         pass
+
+    async def aembed(self, text: str) -> Any:
+        """Asynchronous version of __call__"""
+        return (await self.aembed_many([text]))[0]
+
+    def warm(self) -> None:
+        if self.clients is not None:
+            self.clients.warm()
+
+    async def awarm(self) -> None:
+        if self.clients is not None:
+            await self.clients.awarm(self.max_concurrent_tasks)
+
+    def embed_many(self, texts: List[str]) -> List[Any]:
+        """Embed a list of texts using as few provider requests as possible"""
+        unique_texts = list(dict.fromkeys(texts))
+
+        embeddings = {}
+        for batch in self._batches(unique_texts):
+            batch_embeddings, _ = self.retry_policy.call(self._embed_batch, batch)
+            embeddings.update(zip(batch, batch_embeddings))
+
+        return [embeddings[text] for text in texts]
+
+    async def aembed_many(self, texts: List[str]) -> List[Any]:
+        """Asynchronous version of embed_many, sending the batches concurrently"""
+        unique_texts = list(dict.fromkeys(texts))
+        batches = list(self._batches(unique_texts))
+
+        results = await asyncio.gather(
+            *(
+                self.retry_policy.acall(self._aembed_batch_limited, batch)
+                for batch in batches
+            )
+        )
+
+        embeddings = {}
+        for batch, (batch_embeddings, _) in zip(batches, results):
+            embeddings.update(zip(batch, batch_embeddings))
+
+        return [embeddings[text] for text in texts]
+
+    def _embed_batch(self, texts: List[str]) -> List[Any]:
+        """Embed one provider-sized batch, override to use a batched request"""
+        return [self(text) for text in texts]
+
+    async def _aembed_batch(self, texts: List[str]) -> List[Any]:
+        """
+        Asynchronous version of _embed_batch, override to use the provider's
+        async client. By default _embed_batch runs in a worker thread.
+        """
+        return await asyncio.to_thread(self._embed_batch, texts)
+
+    async def _aembed_batch_limited(self, texts: List[str]) -> List[Any]:
+        if self.limiter is None:
+            return await self._aembed_batch(texts)
+
+        # Batches vary widely in size, so their latency says little about
+        # the provider's health
+        async with self.limiter.slot(track_latency=False):
+            return await self._aembed_batch(texts)
+
+    def _batches(self, texts: List[str]) -> Iterator[List[str]]:
+        for start in range(0, len(texts), self.batch_size):
+            yield texts[start : start + self.batch_size]
+
+
+def embed_many(embedding_model, texts: List[str]) -> List[Any]:
+    """
+    Embed texts with embedding_model.embed_many, or one by one with __call__
+    for user supplied embedding models that only implement the protocol
+    """
+    if hasattr(embedding_model, "embed_many"):
+        return embedding_model.embed_many(texts)
+
+    embeddings = {text: embedding_model(text) for text in dict.fromkeys(texts)}
+    return [embeddings[text] for text in texts]
+
+
+async def aembed_many(embedding_model, texts: List[str]) -> List[Any]:
+    """Asynchronous version of embed_many, running sync models in a thread"""
+    if hasattr(embedding_model, "aembed_many"):
+        return await embedding_model.aembed_many(texts)
+
+    return await asyncio.to_thread(embed_many, embedding_model, texts)
@@ -0,0 +1,39 @@
+from promptlab.enums import ModelType
+from promptlab.model.azure_openai import AzOpenAI, AzOpenAI_Embedding
+from promptlab.model.deepseek import DeepSeek, DeepSeek_Embedding
+from promptlab.model.model import EmbeddingModel, Model
+from promptlab.model.ollama import Ollama, Ollama_Embedding
+from promptlab.model.openrouter import OpenRouter, OpenRouter_Embedding
+from promptlab.types import ModelConfig
+
+
+class ModelFactory:
+    _models = {
+        ModelType.AZURE_OPENAI.value: AzOpenAI,
+        ModelType.DEEPSEEK.value: DeepSeek,
+        ModelType.OPENROUTER.value: OpenRouter,
+        ModelType.OLLAMA.value: Ollama,
+    }
+
+    _embedding_models = {
+        ModelType.AZURE_OPENAI.value: AzOpenAI_Embedding,
+        ModelType.DEEPSEEK.value: DeepSeek_Embedding,
+        ModelType.OPENROUTER.value: OpenRouter_Embedding,
+        ModelType.OLLAMA.value: Ollama_Embedding,
+    }
+
+    @staticmethod
+    def get_model(model_config: ModelConfig) -> Model:
+        model_class = ModelFactory._models.get(model_config.type)
+        if model_class is None:
+            raise ValueError(f"Unknown model type: {model_config.type}")
+
+        return model_class(model_config)
+
+    @staticmethod
+    def get_embedding_model(model_config: ModelConfig) -> EmbeddingModel:
+        model_class = ModelFactory._embedding_models.get(model_config.type)
+        if model_class is None:
+            raise ValueError(f"Unknown embedding model type: {model_config.type}")
+
+        return model_class(model_config)
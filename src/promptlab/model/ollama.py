@@ -1,16 +1,37 @@
-from typing import Any
-import ollama
-import asyncio
+from typing import Any, List
 import time
 
+import ollama
+
+from promptlab.model.http_clients import SharedClients
 from promptlab.model.model import EmbeddingModel, Model, InferenceResult, ModelConfig
+from promptlab.model.streaming import StreamTimer, aclose_stream
+
+
+class OllamaClients(SharedClients):
+    def _connect(self):
+        client = ollama.Client(host=self._host(), limits=self.limits, http2=self.http2)
+        # The ollama client keeps its httpx client in _client
+        return client, client._client, str(client._client.base_url)
+
+    def _aconnect(self):
+        client = ollama.AsyncClient(
+            host=self._host(), limits=self.limits, http2=self.http2
+        )
+        return client, client._client, str(client._client.base_url)
+
+    def _host(self):
+        return str(self.model_config.endpoint) if self.model_config.endpoint else None
 
 
 class Ollama(Model):
     def __init__(self, model_config: ModelConfig):
         super().__init__(model_config)
 
-        self.client = ollama
+        self.clients = OllamaClients(model_config)
+        # How long the server keeps the model loaded after a request, e.g.
+        # "30m", or -1 to keep it loaded, so batches don't reload it cold
+        self.keep_alive = getattr(model_config, "keep_alive", None)
 
     def invoke(self, system_prompt: str, user_prompt: str):
         payload = [
@@ -18,68 +39,124 @@ class Ollama(Model):
             {"role": "user", "content": user_prompt},
         ]
 
-        chat_completion = self.client.chat(
-            model=self.model_config.inference_model_deployment, messages=payload
+        if self.stream:
+            timer = StreamTimer()
+            stream = self.clients.client.chat(
+                model=self.model_config.inference_model_deployment,
+                messages=payload,
+                keep_alive=self.keep_alive,
+                stream=True,
+            )
+            parts, chunk = [], None
+            try:
+                for chunk in stream:
+                    self._read_chunk(chunk, timer, parts)
+            finally:
+                stream.close()
+            return self._stream_result(chunk, timer, parts)
+
+        start_time = time.perf_counter_ns()
+
+        chat_completion = self.clients.client.chat(
+            model=self.model_config.inference_model_deployment,
+            messages=payload,
+            keep_alive=self.keep_alive,
         )
 
-        latency_ms = chat_completion.total_duration
-        inference = chat_completion.message.content
-        prompt_token = chat_completion.eval_count
-        completion_token = chat_completion.prompt_eval_count
+        end_time = time.perf_counter_ns()
+        latency_ms = (end_time - start_time) / 1_000_000
 
-        return InferenceResult(
-            inference=inference,
-            prompt_tokens=prompt_token,
-            completion_tokens=completion_token,
-            latency_ms=latency_ms,
-        )
+        return self._inference_result(chat_completion, latency_ms)
 
     async def ainvoke(self, system_prompt: str, user_prompt: str) -> InferenceResult:
         """
         Asynchronous invocation of the Ollama model
-        Note: Ollama doesn't have a native async API, so we run it in a thread pool
         """
         payload = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
         ]
 
-        start_time = time.time()
-
-        # Run the synchronous Ollama call in a thread pool
-        loop = asyncio.get_event_loop()
-        chat_completion = await loop.run_in_executor(
-            None,
-            lambda: self.client.chat(
-                model=self.model_config.inference_model_deployment, messages=payload
-            ),
+        if self.stream:
+            timer = StreamTimer()
+            stream = await self.clients.async_client.chat(
+                model=self.model_config.inference_model_deployment,
+                messages=payload,
+                keep_alive=self.keep_alive,
+                stream=True,
+            )
+            parts, chunk = [], None
+            try:
+                async for chunk in stream:
+                    self._read_chunk(chunk, timer, parts)
+            finally:
+                await aclose_stream(stream)
+            return self._stream_result(chunk, timer, parts)
+
+        start_time = time.perf_counter_ns()
+
+        chat_completion = await self.clients.async_client.chat(
+            model=self.model_config.inference_model_deployment,
+            messages=payload,
+            keep_alive=self.keep_alive,
         )
 
-        end_time = time.time()
-        latency_ms = (end_time - start_time) * 1000
+        end_time = time.perf_counter_ns()
+        latency_ms = (end_time - start_time) / 1_000_000
+
+        return self._inference_result(chat_completion, latency_ms)
 
-        inference = chat_completion.message.content
-        prompt_token = chat_completion.eval_count
-        completion_token = chat_completion.prompt_eval_count
+    @staticmethod
+    def _read_chunk(chunk, timer: StreamTimer, parts) -> None:
+        if chunk.message.content:
+            timer.token()
+            parts.append(chunk.message.content)
+
+    @staticmethod
+    def _stream_result(last_chunk, timer: StreamTimer, parts) -> InferenceResult:
+        # The last chunk carries the token counts of the whole response
+        return timer.result(
+            "".join(parts),
+            getattr(last_chunk, "prompt_eval_count", None) or 0,
+            getattr(last_chunk, "eval_count", None) or 0,
+        )
 
+    @staticmethod
+    def _inference_result(chat_completion, latency_ms: float) -> InferenceResult:
+        # prompt_eval_count counts the prompt tokens, eval_count the tokens
+        # of the response
         return InferenceResult(
-            inference=inference,
-            prompt_tokens=prompt_token,
-            completion_tokens=completion_token,
+            inference=chat_completion.message.content,
+            prompt_tokens=chat_completion.prompt_eval_count,
+            completion_tokens=chat_completion.eval_count,
             latency_ms=latency_ms,
         )
 
 
 class Ollama_Embedding(EmbeddingModel):
+    max_batch_size = 512
+
     def __init__(self, model_config: ModelConfig):
         super().__init__(model_config)
 
-        self.client = ollama
+        self.clients = OllamaClients(model_config)
+        self.keep_alive = getattr(model_config, "keep_alive", None)
 
     def __call__(self, text: str) -> Any:
-        embedding = self.client.embed(
+        # Through embed_many, so single texts are retried too
+        return self.embed_many([text])[0]
+
+    def _embed_batch(self, texts: List[str]) -> List[Any]:
+        return self.clients.client.embed(
             model=self.model_config.embedding_model_deployment,
-            input=text,
+            input=texts,
+            keep_alive=self.keep_alive,
         )["embeddings"]
 
-        return embedding
+    async def _aembed_batch(self, texts: List[str]) -> List[Any]:
+        response = await self.clients.async_client.embed(
+            model=self.model_config.embedding_model_deployment,
+            input=texts,
+            keep_alive=self.keep_alive,
+        )
+        return response["embeddings"]
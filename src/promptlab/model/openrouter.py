@@ -1,9 +1,14 @@
 import time
-from typing import Any
-from openai import OpenAI
-from openai import AsyncOpenAI
+from typing import Any, List
 
+from promptlab.model.http_clients import OpenAIClients
 from promptlab.model.model import Model, EmbeddingModel
+from promptlab.model.streaming import (
+    STREAM_OPTIONS,
+    StreamTimer,
+    aread_chat_completion_stream,
+    read_chat_completion_stream,
+)
 from promptlab.types import InferenceResult, ModelConfig
 
 
@@ -15,12 +20,7 @@ class OpenRouter(Model):
 
     def __init__(self, model_config: ModelConfig):
         super().__init__(model_config)
-        self.client = OpenAI(
-            api_key=model_config.api_key, base_url=str(model_config.endpoint)
-        )
-        self.async_client = AsyncOpenAI(
-            api_key=model_config.api_key, base_url=str(model_config.endpoint)
-        )
+        self.clients = OpenAIClients(model_config)
         self.deployment = model_config.inference_model_deployment
 
     def invoke(self, system_prompt: str, user_prompt: str):
@@ -38,11 +38,22 @@ class OpenRouter(Model):
             "X-Title": "PromptLab",  # Replace with your actual site name
         }
 
-        start_time = time.time()
-        chat_completion = self.client.chat.completions.create(
+        if self.stream:
+            timer = StreamTimer()
+            stream = self.clients.client.chat.completions.create(
+                model=self.deployment,
+                messages=payload,
+                extra_headers=extra_headers,
+                stream=True,
+                stream_options=STREAM_OPTIONS,
+            )
+            return read_chat_completion_stream(stream, timer)
+
+        start_time = time.perf_counter_ns()
+        chat_completion = self.clients.client.chat.completions.create(
             model=self.deployment, messages=payload, extra_headers=extra_headers
         )
-        end_time = time.time()
+        end_time = time.perf_counter_ns()
         inference = chat_completion.choices[0].message.content
 
         # Some providers might not return usage info
@@ -50,7 +61,7 @@ class OpenRouter(Model):
         completion_token = getattr(chat_completion.usage, "completion_tokens", 0)
 
         # Calculate latency
-        latency_ms = (end_time - start_time) * 1000
+        latency_ms = (end_time - start_time) / 1_000_000
 
         return InferenceResult(
             inference=inference,
@@ -74,14 +85,25 @@ class OpenRouter(Model):
             "X-Title": "PromptLab",  # Replace with your actual site name
         }
 
-        start_time = time.time()
+        if self.stream:
+            timer = StreamTimer()
+            stream = await self.clients.async_client.chat.completions.create(
+                model=self.deployment,
+                messages=payload,
+                extra_headers=extra_headers,
+                stream=True,
+                stream_options=STREAM_OPTIONS,
+            )
+            return await aread_chat_completion_stream(stream, timer)
+
+        start_time = time.perf_counter_ns()
 
-        chat_completion = await self.async_client.chat.completions.create(
+        chat_completion = await self.clients.async_client.chat.completions.create(
             model=self.deployment, messages=payload, extra_headers=extra_headers
         )
 
-        end_time = time.time()
-        latency_ms = (end_time - start_time) * 1000
+        end_time = time.perf_counter_ns()
+        latency_ms = (end_time - start_time) / 1_000_000
 
         inference = chat_completion.choices[0].message.content
 
@@ -103,35 +125,38 @@ class OpenRouter_Embedding(EmbeddingModel):
     embedding models through the OpenRouter API.
     """
 
+    max_batch_size = 256
+
     def __init__(self, model_config: ModelConfig):
         super().__init__(model_config)
 
-        self.client = OpenAI(
-            api_key=model_config.api_key, base_url=str(model_config.endpoint)
-        )
+        self.clients = OpenAIClients(model_config)
 
     def __call__(self, text: str) -> Any:
+        return self.embed_many([text])[0]
+
+    def _embed_batch(self, texts: List[str]) -> List[Any]:
+        # Failures are retried by the retry policy of embed_many and
+        # aembed_many, and then reach the caller
+        response = self.clients.client.embeddings.create(
+            model=self.model_config.embedding_model_deployment,
+            input=texts,
+            extra_headers=self._extra_headers(),
+        )
+        return [item.embedding for item in response.data]
+
+    async def _aembed_batch(self, texts: List[str]) -> List[Any]:
+        response = await self.clients.async_client.embeddings.create(
+            model=self.model_config.embedding_model_deployment,
+            input=texts,
+            extra_headers=self._extra_headers(),
+        )
+        return [item.embedding for item in response.data]
+
+    @staticmethod
+    def _extra_headers():
         # Add OpenRouter-specific headers
-        extra_headers = {
+        return {
             "HTTP-Referer": "https://promptlab.local",
             "X-Title": "PromptLab",
         }
-
-        try:
-            # Try to use the embedding API
-            response = self.client.embeddings.create(
-                model=self.model_config.embedding_model_deployment,
-                input=text,
-                extra_headers=extra_headers,
-            )
-            embedding = response.data[0].embedding
-        except Exception as e:
-            # If embedding fails, return a dummy embedding
-            # This is a fallback for models that don't support embeddings
-            print(f"Warning: Embedding failed with error: {e}")
-            # Return a dummy embedding of 1536 dimensions (common size)
-            import numpy as np
-
-            embedding = np.zeros(1536).tolist()
-
-        return embedding
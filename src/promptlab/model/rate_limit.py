@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+
+from promptlab.types import InferenceResult, ModelConfig
+
+
+class TokenBucket:
+    """
+    Refills per_minute units evenly over a minute and holds at most
+    burst_seconds worth of them. Reservations may overdraw the bucket, the
+    caller then waits until the debt is paid back.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(self.rate * burst_seconds, 1.0)
+        self.balance = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take amount from the bucket, returning the seconds to wait before using it"""
+        with self._lock:
+            self._refill()
+            self.balance -= amount
+            return max(0.0, -self.balance / self.rate)
+
+    def settle(self, amount: float) -> None:
+        """Correct an earlier reservation, a negative amount is a refund"""
+        with self._lock:
+            self._refill()
+            self.balance = min(self.capacity, self.balance - amount)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.balance = min(
+            self.capacity, self.balance + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+
+class RateLimiter:
+    """
+    Requests and tokens per minute quota of a model deployment. Limiters are
+    shared by every model built from the same config, so inference and judge
+    calls to one deployment draw from the same quota.
+    """
+
+    _limiters = {}
+    _limiters_lock = threading.Lock()
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+    ):
+        self.requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    @classmethod
+    def for_config(cls, model_config: ModelConfig) -> Optional["RateLimiter"]:
+        requests_per_minute = getattr(model_config, "requests_per_minute", None)
+        tokens_per_minute = getattr(model_config, "tokens_per_minute", None)
+        if not requests_per_minute and not tokens_per_minute:
+            return None
+
+        key = (
+            model_config.type,
+            str(model_config.endpoint),
+            model_config.inference_model_deployment,
+            requests_per_minute,
+            tokens_per_minute,
+        )
+        with cls._limiters_lock:
+            if key not in cls._limiters:
+                cls._limiters[key] = cls(requests_per_minute, tokens_per_minute)
+            return cls._limiters[key]
+
+    @staticmethod
+    def estimate_tokens(system_prompt: str, user_prompt: str) -> int:
+        # Roughly four characters per token for English text
+        return (len(system_prompt) + len(user_prompt)) // 4 + 1
+
+    def acquire(self, system_prompt: str, user_prompt: str) -> int:
+        """Block until a request fits the quota, returning the reserved tokens"""
+        estimated_tokens, wait = self._reserve(system_prompt, user_prompt)
+        if wait:
+            time.sleep(wait)
+        return estimated_tokens
+
+    async def aacquire(self, system_prompt: str, user_prompt: str) -> int:
+        """Asynchronous version of acquire"""
+        estimated_tokens, wait = self._reserve(system_prompt, user_prompt)
+        if wait:
+            await asyncio.sleep(wait)
+        return estimated_tokens
+
+    def settle(self, estimated_tokens: int, inference_result: InferenceResult) -> None:
+        """Replace the reserved estimate with the tokens the request actually used"""
+        if self.tokens is None:
+            return
+
+        used_tokens = (inference_result.prompt_tokens or 0) + (
+            inference_result.completion_tokens or 0
+        )
+        self.tokens.settle(used_tokens - estimated_tokens)
+
+    def _reserve(self, system_prompt: str, user_prompt: str):
+        estimated_tokens = self.estimate_tokens(system_prompt, user_prompt)
+
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(estimated_tokens))
+
+        return estimated_tokens, wait
@@ -0,0 +1,115 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional, Tuple
+
+import httpx
+import openai
+
+from promptlab.model.concurrency import is_throttling_error
+from promptlab.types import ModelConfig
+
+# Server side failures that are worth sending the same request again for
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Whether a failed model request can safely be sent again"""
+    if is_throttling_error(error):
+        return True
+
+    if isinstance(
+        error, (ConnectionError, httpx.TransportError, openai.APIConnectionError)
+    ):
+        return True
+
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+
+    return status_code in RETRYABLE_STATUS_CODES
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Delay the provider asked for in the Retry-After headers of an error"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return max(float(retry_after_ms) / 1000, 0.0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after is None:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+
+    # Retry-After may also be an HTTP date
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RetryPolicy:
+    """
+    Retries model requests that failed with a retryable error, waiting an
+    exponentially growing, fully jittered delay between attempts, or as long
+    as the provider asked for via Retry-After.
+    """
+
+    def __init__(
+        self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 30.0
+    ):
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def for_config(cls, model_config: ModelConfig) -> "RetryPolicy":
+        return cls(
+            max_attempts=getattr(model_config, "max_attempts", 3),
+            base_delay=getattr(model_config, "retry_base_delay", 0.5),
+            max_delay=getattr(model_config, "retry_max_delay", 30.0),
+        )
+
+    def delay(self, retry: int, error: BaseException) -> float:
+        """Seconds to wait before the given retry, counting from 1"""
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return retry_after
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retry))
+
+    def call(self, func: Callable, *args) -> Tuple[Any, int]:
+        """Call func until it succeeds, returning its result and the retry count"""
+        for retry in range(self.max_attempts):
+            try:
+                return func(*args), retry
+            except Exception as error:
+                if not self._should_retry(retry, error):
+                    raise
+                time.sleep(self.delay(retry + 1, error))
+
+    async def acall(self, func: Callable, *args) -> Tuple[Any, int]:
+        """Asynchronous version of call, for a coroutine function"""
+        for retry in range(self.max_attempts):
+            try:
+                return await func(*args), retry
+            except Exception as error:
+                if not self._should_retry(retry, error):
+                    raise
+                await asyncio.sleep(self.delay(retry + 1, error))
+
+    def _should_retry(self, retry: int, error: Exception) -> bool:
+        return retry + 1 < self.max_attempts and is_retryable_error(error)
@@ -0,0 +1,114 @@
+import time
+
+from promptlab.types import InferenceResult
+
+# Asks OpenAI compatible APIs to send the token usage in a final chunk
+STREAM_OPTIONS = {"include_usage": True}
+
+
+class StreamTimer:
+    """
+    Times a streamed response from the moment its request is sent: the time
+    to the first token, the mean gap between the chunks that follow, and the
+    rate tokens were generated at after the first one.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter_ns()
+        self.first_token_at = None
+        self.last_token_at = None
+        self.chunks = 0
+
+    def token(self) -> None:
+        """Note the arrival of a chunk carrying output"""
+        now = time.perf_counter_ns()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self.last_token_at = now
+        self.chunks += 1
+
+    def result(
+        self, inference: str, prompt_tokens: int, completion_tokens: int
+    ) -> InferenceResult:
+        finished_at = time.perf_counter_ns()
+        inference_result = InferenceResult(
+            inference=inference,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_ms=(finished_at - self.started_at) / 1_000_000,
+        )
+        if self.first_token_at is None:
+            return inference_result
+
+        time_to_first_token = self.first_token_at - self.started_at
+        inference_result.time_to_first_token_ms = time_to_first_token / 1_000_000
+        inference_result.timings = {"time_to_first_token": time_to_first_token}
+
+        if self.chunks > 1:
+            inference_result.inter_token_latency_ms = (
+                (self.last_token_at - self.first_token_at)
+                / (self.chunks - 1)
+                / 1_000_000
+            )
+
+        # Providers that don't report usage send about one token per chunk
+        tokens = completion_tokens or self.chunks
+        if finished_at > self.first_token_at:
+            inference_result.tokens_per_second = tokens / (
+                (finished_at - self.first_token_at) / 1_000_000_000
+            )
+
+        return inference_result
+
+
+def read_chat_completion_stream(stream, timer: StreamTimer) -> InferenceResult:
+    """Build the result of a streamed OpenAI compatible chat completion"""
+    parts = []
+    usage = None
+    try:
+        for chunk in stream:
+            _read_chunk(chunk, timer, parts)
+            usage = chunk.usage or usage
+    finally:
+        # Give the connection back to the pool when reading fails
+        stream.close()
+
+    return _stream_result(timer, parts, usage)
+
+
+async def aread_chat_completion_stream(stream, timer: StreamTimer) -> InferenceResult:
+    """Asynchronous version of read_chat_completion_stream"""
+    parts = []
+    usage = None
+    try:
+        async for chunk in stream:
+            _read_chunk(chunk, timer, parts)
+            usage = chunk.usage or usage
+    finally:
+        # Also when the request is cancelled, e.g. by a faster hedge
+        await aclose_stream(stream)
+
+    return _stream_result(timer, parts, usage)
+
+
+async def aclose_stream(stream) -> None:
+    """Close an async stream that may not have been read to its end"""
+    # openai's AsyncStream closes with close(), async generators with aclose()
+    close = getattr(stream, "aclose", None) or stream.close
+    await close()
+
+
+def _read_chunk(chunk, timer: StreamTimer, parts) -> None:
+    # The usage chunk has no choices
+    if chunk.choices and chunk.choices[0].delta.content:
+        timer.token()
+        parts.append(chunk.choices[0].delta.content)
+
+
+def _stream_result(timer: StreamTimer, parts, usage) -> InferenceResult:
+    # Some providers might not return usage info
+    return timer.result(
+        "".join(parts),
+        getattr(usage, "prompt_tokens", 0),
+        getattr(usage, "completion_tokens", 0),
+    )
@@ -0,0 +1,244 @@
+import asyncio
+import atexit
+import copy
+import itertools
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+from promptlab.evaluator.evaluator import Evaluator
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# In a worker process, the objects sent by WorkerRefs by their key, the most
+# recently used last
+_registry: "OrderedDict[str, Any]" = OrderedDict()
+_registry_size = 32
+_keys = itertools.count()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Shared pool of worker processes. It is created on first use and kept warm
+    for the rest of the session, so workers are not started per record or
+    per run.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+            atexit.register(shutdown_process_pool)
+        return _pool
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+class _Unregistered:
+    """Answer of a worker that doesn't hold the object of a task yet"""
+
+
+def _call_registered(key: str, payload: Optional[bytes], func: Callable, *args):
+    """Run func with a registered object in a worker, registering payload"""
+    obj = _registry.get(key)
+    if obj is None:
+        if payload is None:
+            return _Unregistered()
+        obj = _registry[key] = pickle.loads(payload)
+        if len(_registry) > _registry_size:
+            _registry.popitem(last=False)
+    _registry.move_to_end(key)
+    return func(obj, *args)
+
+
+class WorkerRef:
+    """
+    An object kept by the worker processes of the pool in a registry of their
+    own, so that tasks only carry its key instead of the pickled object. The
+    object is pickled once, when the first worker needs it, and is only sent
+    to a worker that answers a task with _Unregistered, along with that task.
+    """
+
+    def __init__(self, obj: Any):
+        self.obj = obj
+        self.key = f"{os.getpid()}:{next(_keys)}"
+        self._payload: Optional[bytes] = None
+
+    def submit(self, func: Callable, *args) -> Future:
+        """Start func(obj, *args) in the pool, to be completed by result"""
+        return get_process_pool().submit(_call_registered, self.key, None, func, *args)
+
+    def result(self, future: Future, func: Callable, *args) -> Any:
+        result = future.result()
+        if isinstance(result, _Unregistered):
+            result = (
+                get_process_pool()
+                .submit(_call_registered, self.key, self._pickled(), func, *args)
+                .result()
+            )
+        return result
+
+    async def acall(self, func: Callable, *args) -> Any:
+        """Run func(obj, *args) in the pool"""
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            get_process_pool(), _call_registered, self.key, None, func, *args
+        )
+        if isinstance(result, _Unregistered):
+            result = await loop.run_in_executor(
+                get_process_pool(),
+                _call_registered,
+                self.key,
+                self._pickled(),
+                func,
+                *args,
+            )
+        return result
+
+    def _pickled(self) -> bytes:
+        if self._payload is None:
+            self._payload = pickle.dumps(self.obj)
+        return self._payload
+
+
+def _call_many(func: Callable, args_list: List[Tuple]) -> List[Tuple[bool, Any]]:
+    """Run a batch of calls in a worker, keeping each call's error separate"""
+    results = []
+    for args in args_list:
+        try:
+            results.append((True, func(*args)))
+        except Exception as error:
+            results.append((False, error))
+    return results
+
+
+def _evaluate_batch(evaluator: Evaluator, data: List[dict]) -> List:
+    return evaluator.evaluate_batch(data)
+
+
+class ProcessBatcher:
+    """
+    Collects calls made concurrently from the event loop into batches and runs
+    each batch as a single task in the process pool, so that small calls
+    don't each pay for a round trip to a worker. The function, e.g. a bound
+    method of a model, is sent to each worker once.
+    """
+
+    def __init__(
+        self, func: Callable, max_batch_size: int = 32, max_delay: float = 0.005
+    ):
+        self.func = WorkerRef(func)
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+
+        self._pending: List[Tuple[Tuple, asyncio.Future]] = []
+        self._flush_handle = None
+        self._batches = set()
+
+    async def submit(self, *args) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((args, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.max_delay, self._flush
+            )
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        batch = asyncio.ensure_future(
+            self.func.acall(_call_many, [args for args, _ in pending])
+        )
+        self._batches.add(batch)
+        batch.add_done_callback(self._batches.discard)
+        batch.add_done_callback(lambda batch: self._resolve(batch, pending))
+
+    @staticmethod
+    def _resolve(batch: asyncio.Future, pending) -> None:
+        futures = [future for _, future in pending]
+        if batch.cancelled():
+            for future in futures:
+                future.cancel()
+            return
+        if batch.exception() is not None:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(batch.exception())
+            return
+
+        for future, (ok, value) in zip(futures, batch.result()):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+
+class ProcessPoolEvaluator(Evaluator):
+    """
+    Runs a picklable evaluator in the process pool. Each chunk of records is
+    split into one batch per worker, so CPU-bound metrics use every core. The
+    evaluator is sent to each worker once, batches only carry the records.
+    """
+
+    def __init__(self, evaluator: Evaluator):
+        self.evaluator = evaluator
+        self.worker_evaluator = WorkerRef(self._picklable_evaluator())
+
+    def evaluate(self, data: dict):
+        return self.evaluate_batch([data])[0]
+
+    def evaluate_batch(self, data: List[dict]) -> List:
+        batches = self._split(data)
+        futures = [
+            self.worker_evaluator.submit(_evaluate_batch, batch) for batch in batches
+        ]
+        return [
+            result
+            for future, batch in zip(futures, batches)
+            for result in self.worker_evaluator.result(future, _evaluate_batch, batch)
+        ]
+
+    async def aevaluate_batch(self, data: List[dict]) -> List:
+        results = await asyncio.gather(
+            *(
+                self.worker_evaluator.acall(_evaluate_batch, batch)
+                for batch in self._split(data)
+            )
+        )
+        return [result for batch_results in results for result in batch_results]
+
+    def _picklable_evaluator(self) -> Evaluator:
+        # The models attached by EvaluatorFactory hold network clients and
+        # can't be sent to a worker, CPU-bound evaluators don't need them
+        evaluator = copy.copy(self.evaluator)
+        vars(evaluator).pop("inference", None)
+        vars(evaluator).pop("embedding", None)
+        return evaluator
+
+    @staticmethod
+    def _split(data: List[dict]) -> List[List[dict]]:
+        workers = os.cpu_count() or 1
+        size = max(-(-len(data) // workers), 1)
+        return [data[start : start + size] for start in range(0, len(data), size)]
@@ -0,0 +1,362 @@
+from contextlib import contextmanager
+from typing import Dict, Optional
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+from promptlab.config import ConfigValidator, ExperimentConfig
+from promptlab.db.sql import SQLQuery
+from promptlab.db.sqlite import SQLiteClient
+from promptlab.experiment import Experiment, untraced_records
+from promptlab.utils import Utils
+
+
+class LeaseLost(Exception):
+    """A worker's lease on a shard ran out, or another worker took it over"""
+
+
+class ShardQueue:
+    """
+    Queue of dataset shards in the tracer's database. A worker claims a shard
+    by taking a lease on it, and keeps renewing the lease while it works.
+    Shards whose lease ran out, e.g. because their worker crashed, can be
+    claimed again by any other worker, until they have been claimed
+    max_attempts times. After that they are marked failed.
+    """
+
+    def __init__(
+        self,
+        db_client: SQLiteClient,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 3,
+    ):
+        self.db_client = db_client
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(max_attempts, 1)
+
+        self.db_client.execute_query(SQLQuery.CREATE_EXPERIMENT_SHARD_TABLE_QUERY)
+
+    def enqueue(self, experiment_id: str, dataset_path: str, shard_size: int) -> int:
+        """Split the dataset into shards of shard_size records and queue them"""
+        shards = [
+            (experiment_id, shard_index, start, end, records)
+            for shard_index, (start, end, records) in enumerate(
+                Utils.dataset_shards(dataset_path, shard_size)
+            )
+        ]
+        # Shards that are already queued keep their state, so an experiment
+        # can be submitted again
+        self.db_client.execute_query_many(
+            SQLQuery.INSERT_EXPERIMENT_SHARD_QUERY, shards
+        )
+        return len(shards)
+
+    def claim(self, experiment_id: str, worker_id: str) -> Optional[Dict]:
+        now = time.time()
+        # Shards whose last attempt crashed its worker are not retried forever
+        self.db_client.execute_query(
+            SQLQuery.FAIL_EXHAUSTED_EXPERIMENT_SHARDS_QUERY,
+            (experiment_id, now, self.max_attempts),
+        )
+        rows = self.db_client.execute_returning(
+            SQLQuery.CLAIM_EXPERIMENT_SHARD_QUERY,
+            {
+                "experiment_id": experiment_id,
+                "worker_id": worker_id,
+                "lease_expires_at": now + self.lease_seconds,
+                "now": now,
+                "max_attempts": self.max_attempts,
+            },
+        )
+        return rows[0] if rows else None
+
+    def renew(self, experiment_id: str, shard_index: int, worker_id: str) -> bool:
+        """Extend a lease, False if the worker no longer holds it"""
+        return bool(
+            self.db_client.execute_query(
+                SQLQuery.RENEW_EXPERIMENT_SHARD_QUERY,
+                (
+                    time.time() + self.lease_seconds,
+                    experiment_id,
+                    shard_index,
+                    worker_id,
+                ),
+            )
+        )
+
+    def complete(
+        self,
+        experiment_id: str,
+        shard_index: int,
+        worker_id: str,
+        metrics: Optional[Dict] = None,
+    ) -> bool:
+        """
+        Mark a shard done with the run metrics of its worker, and record the
+        metrics of all completed shards with the experiment
+        """
+        completed = bool(
+            self.db_client.execute_query(
+                SQLQuery.COMPLETE_EXPERIMENT_SHARD_QUERY,
+                (json.dumps(metrics or {}), experiment_id, shard_index, worker_id),
+            )
+        )
+        if completed:
+            self.db_client.execute_query(
+                SQLQuery.UPDATE_SHARDED_EXPERIMENT_METRICS_QUERY,
+                {"experiment_id": experiment_id},
+            )
+        return completed
+
+    def release(self, experiment_id: str, shard_index: int, worker_id: str) -> None:
+        """
+        Put a shard back in the queue right away, e.g. after a failure, or
+        mark it failed once it used up its attempts
+        """
+        self.db_client.execute_query(
+            SQLQuery.RELEASE_EXPERIMENT_SHARD_QUERY,
+            (self.max_attempts, experiment_id, shard_index, worker_id),
+        )
+
+    def progress(self, experiment_id: str) -> Dict[str, Dict[str, int]]:
+        """Shard and record counts of an experiment by status"""
+        rows = self.db_client.fetch_data(
+            SQLQuery.SELECT_EXPERIMENT_SHARD_PROGRESS_QUERY, (experiment_id,)
+        )
+        return {
+            row["status"]: {"shards": row["shards"], "records": row["records"]}
+            for row in rows
+        }
+
+    @contextmanager
+    def lease(self, experiment_id: str, shard_index: int, worker_id: str):
+        """
+        Renew a lease in the background for as long as the block runs. The
+        block gets an event that is set once the lease is lost, after which
+        the shard belongs to whichever worker claims it next.
+        """
+        stopped = threading.Event()
+        lost = threading.Event()
+
+        def keep_alive():
+            expires_at = time.time() + self.lease_seconds
+            while not stopped.wait(self.lease_seconds / 3):
+                try:
+                    renewed = self.renew(experiment_id, shard_index, worker_id)
+                except Exception:
+                    # e.g. the database is locked, try again until the lease
+                    # runs out
+                    renewed = None
+                if renewed:
+                    expires_at = time.time() + self.lease_seconds
+                elif renewed is False or time.time() >= expires_at:
+                    lost.set()
+                    return
+
+        keeper = threading.Thread(target=keep_alive, daemon=True)
+        keeper.start()
+        try:
+            yield lost
+        finally:
+            stopped.set()
+            keeper.join()
+
+
+class ShardedExperiment(Experiment):
+    """
+    Runs one experiment with any number of worker processes, which may be on
+    other hosts sharing the tracer's database and the dataset file. submit
+    queues the dataset's shards, and each worker started with the returned
+    experiment_id claims shards until none are left. All results are traced
+    under the same experiment_id, and the run metrics of every shard are
+    kept with the experiment under "shards".
+    """
+
+    def __init__(self, tracer, lease_seconds: float = 60.0, max_attempts: int = 3):
+        super().__init__(tracer)
+        self.queue = ShardQueue(tracer.db_client, lease_seconds, max_attempts)
+
+    def submit(
+        self, experiment_config: ExperimentConfig, shard_size: int = 1000
+    ) -> str:
+        """Record the experiment and queue its shards, returning its id"""
+        if shard_size < 1:
+            raise ValueError("shard_size must be at least 1")
+
+        experiment_config = ExperimentConfig(**experiment_config)
+        ConfigValidator.validate_experiment_config(experiment_config)
+        if experiment_config.early_stopping is not None:
+            raise ValueError("early_stopping is not supported for sharded experiments")
+
+        experiment_id, _ = self._start_experiment(experiment_config)
+        self.queue.enqueue(
+            experiment_id, self._dataset_path(experiment_config), shard_size
+        )
+
+        return experiment_id
+
+    def work(self, experiment_config: ExperimentConfig, worker_id: str = None) -> int:
+        """
+        Process shards of the experiment identified by
+        experiment_config.experiment_id until the queue is empty, returning
+        the number of shards this worker completed
+        """
+        experiment_config, worker_id, template, dataset_path = self._prepare_worker(
+            experiment_config, worker_id
+        )
+        self._warm_models(
+            [experiment_config.inference_model, experiment_config.embedding_model]
+        )
+
+        completed = 0
+        with self._attach_caches(experiment_config):
+            while shard := self.queue.claim(experiment_config.experiment_id, worker_id):
+                try:
+                    with self._shard(experiment_config, shard, worker_id) as lost:
+                        self.init_batch_eval(
+                            self._leased_records(
+                                experiment_config.experiment_id,
+                                dataset_path,
+                                shard,
+                                lost,
+                            ),
+                            *template,
+                            experiment_config,
+                        )
+                except LeaseLost:
+                    # Another worker owns the shard now, move on to the next
+                    continue
+                completed += 1
+
+        return completed
+
+    async def work_async(
+        self, experiment_config: ExperimentConfig, worker_id: str = None
+    ) -> int:
+        """Asynchronous version of work"""
+        experiment_config, worker_id, template, dataset_path = self._prepare_worker(
+            experiment_config, worker_id
+        )
+        await self._awarm_models(
+            [experiment_config.inference_model, experiment_config.embedding_model]
+        )
+
+        completed = 0
+        with self._attach_caches(experiment_config):
+            while shard := self.queue.claim(experiment_config.experiment_id, worker_id):
+                try:
+                    with self._shard(experiment_config, shard, worker_id) as lost:
+                        await self.init_batch_eval_async(
+                            self._leased_records(
+                                experiment_config.experiment_id,
+                                dataset_path,
+                                shard,
+                                lost,
+                            ),
+                            *template,
+                            experiment_config,
+                        )
+                except LeaseLost:
+                    # Another worker owns the shard now, move on to the next
+                    continue
+                completed += 1
+
+        return completed
+
+    def progress(self, experiment_id: str) -> Dict[str, Dict[str, int]]:
+        return self.queue.progress(experiment_id)
+
+    def _prepare_worker(self, experiment_config: ExperimentConfig, worker_id: str):
+        experiment_config = ExperimentConfig(**experiment_config)
+        ConfigValidator.validate_experiment_config(experiment_config)
+
+        if not experiment_config.experiment_id or not self.tracer.experiment_exists(
+            experiment_config.experiment_id
+        ):
+            raise ValueError(
+                "experiment_id must identify an experiment queued with submit"
+            )
+
+        worker_id = (
+            worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        )
+
+        prompt_template = self.tracer.db_client.fetch_data(
+            SQLQuery.SELECT_ASSET_QUERY,
+            (
+                experiment_config.prompt_template.name,
+                experiment_config.prompt_template.version,
+            ),
+        )[0]
+        template = Utils.split_prompt_template(prompt_template["asset_binary"])
+
+        return (
+            experiment_config,
+            worker_id,
+            template,
+            self._dataset_path(experiment_config),
+        )
+
+    def _start_experiment(self, experiment_config: ExperimentConfig):
+        experiment_id = experiment_config.experiment_id
+        if experiment_id and self.tracer.experiment_exists(experiment_id):
+            # Workers look up traced records shard by shard, as they read them
+            return experiment_id, False
+        return super()._start_experiment(experiment_config)
+
+    def _finish_experiment(self, experiment_id: str) -> None:
+        # Metrics are recorded per shard once the shard is completed
+        pass
+
+    def _dataset_path(self, experiment_config: ExperimentConfig) -> str:
+        return self.tracer.db_client.fetch_data(
+            SQLQuery.SELECT_DATASET_FILE_PATH_QUERY,
+            (experiment_config.dataset.name, experiment_config.dataset.version),
+        )[0]["file_path"]
+
+    def _leased_records(
+        self,
+        experiment_id: str,
+        dataset_path: str,
+        shard: Dict,
+        lost: threading.Event,
+    ):
+        """
+        Records of a shard that weren't traced yet, until the worker loses
+        the shard's lease
+        """
+        records = Utils.stream_dataset_range(
+            dataset_path, shard["start_offset"], shard["end_offset"]
+        )
+        for record in untraced_records(self.tracer, experiment_id, records):
+            if lost.is_set():
+                raise LeaseLost(f"Lost the lease on shard {shard['shard_index']}")
+            yield record
+
+    @contextmanager
+    def _shard(self, experiment_config: ExperimentConfig, shard: Dict, worker_id: str):
+        """Hold the lease of a shard while it runs, and settle it afterwards"""
+        experiment_id = experiment_config.experiment_id
+        shard_index = shard["shard_index"]
+
+        # A worker whose lease ran out may still write the chunk it had in
+        # flight while the shard's new owner processes the same records
+        self.tracer.skip_traced_records = True
+        try:
+            with self.queue.lease(experiment_id, shard_index, worker_id) as lost:
+                yield lost
+        except BaseException:
+            # Let another worker retry the shard without waiting for the
+            # lease to run out
+            self.queue.release(experiment_id, shard_index, worker_id)
+            raise
+        finally:
+            self.tracer.skip_traced_records = False
+
+        if not self.queue.complete(
+            experiment_id, shard_index, worker_id, self.run_metrics
+        ):
+            raise LeaseLost(f"Lost the lease on shard {shard_index}")
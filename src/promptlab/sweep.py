@@ -0,0 +1,227 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+import asyncio
+import copy
+
+from promptlab.cache.embedding_cache import (
+    CachedEmbedding,
+    EmbeddingCache,
+    SharedEmbedding,
+)
+from promptlab.cache.inference_cache import InferenceCache
+from promptlab.config import ConfigValidator, ExperimentConfig
+from promptlab.db.sql import SQLQuery
+from promptlab.experiment import Experiment, ExperimentRun
+from promptlab.model.concurrency import AdaptiveLimiter
+from promptlab.types import SweepConfig
+from promptlab.utils import CompiledPromptTemplate, Utils
+
+
+@dataclass
+class SweepCell:
+    experiment_config: ExperimentConfig
+    template_key: Tuple[str, int]
+
+
+class Sweep(Experiment):
+    """
+    Runs every combination of inference models and prompt template versions
+    over one dataset. The dataset is read once, each template renders a record
+    once for all models, and embeddings (e.g. of reference answers) are shared
+    by all cells. Each cell is still recorded as its own experiment, with run
+    metrics of its own, and runs through the same loop as an Experiment.
+    """
+
+    def run(self, sweep_config: SweepConfig) -> List[str]:
+        """
+        Synchronous version of sweep execution, returns the experiment id of
+        every cell
+        """
+        sweep_config = SweepConfig(**sweep_config)
+        shared_embedding, templates, cells, eval_dataset = self._prepare(sweep_config)
+        self._warm_models(
+            self._unique_models(sweep_config) + [sweep_config.embedding_model]
+        )
+
+        with self._attach_inference_cache(sweep_config):
+            runs = [
+                self._begin_run(cell.experiment_config, templates[cell.template_key])
+                for cell in cells
+            ]
+            try:
+                for eval_records in Utils.batched(
+                    eval_dataset, sweep_config.evaluation_batch_size
+                ):
+                    prompts = self._render(templates, eval_records)
+                    for cell, run in zip(cells, runs):
+                        self._run_chunk(run, eval_records, prompts[cell.template_key])
+
+                    # Every cell is done with this chunk's texts
+                    shared_embedding.clear()
+            finally:
+                self._flush(runs)
+
+        return self._end_runs(runs)
+
+    async def run_async(self, sweep_config: SweepConfig) -> List[str]:
+        """
+        Asynchronous version of sweep execution. Every record is handed to all
+        cells as soon as it is read, and each cell completes its requests
+        independently of the others. Each model's concurrency limit is shared
+        by all the cells that use it.
+        """
+        sweep_config = SweepConfig(**sweep_config)
+        _, templates, cells, eval_dataset = self._prepare(sweep_config)
+
+        models = self._unique_models(sweep_config)
+        await self._awarm_models(models + [sweep_config.embedding_model])
+        limiters = {id(model): AdaptiveLimiter.for_model(model) for model in models}
+        previous_limiters = [getattr(model, "limiter", None) for model in models]
+        for model in models:
+            model.limiter = limiters[id(model)]
+
+        with self._attach_inference_cache(sweep_config):
+            runs = [
+                self._begin_run(
+                    cell.experiment_config,
+                    templates[cell.template_key],
+                    limiters[id(cell.experiment_config.inference_model)],
+                )
+                for cell in cells
+            ]
+            # Each cell queues up to a chunk of records beyond those it has in
+            # flight, so a slow cell only holds up reading once its queue is full
+            queues = [asyncio.Queue(sweep_config.evaluation_batch_size) for _ in cells]
+
+            async def feed():
+                for eval_record in eval_dataset:
+                    prompts = {
+                        key: template.render(eval_record)
+                        for key, template in templates.items()
+                    }
+                    for cell, queue in zip(cells, queues):
+                        await queue.put((eval_record, prompts[cell.template_key]))
+                for queue in queues:
+                    await queue.put(None)
+
+            with self._limit_embeddings(sweep_config.embedding_model, models):
+                tasks = [asyncio.create_task(feed())] + [
+                    asyncio.create_task(self._run_cell_async(run, queue))
+                    for run, queue in zip(runs, queues)
+                ]
+                try:
+                    await asyncio.gather(*tasks)
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    for run in runs:
+                        run.cancel()
+                    for model, previous_limiter in zip(models, previous_limiters):
+                        model.limiter = previous_limiter
+                    self._flush(runs)
+
+        return self._end_runs(runs)
+
+    async def _run_cell_async(self, run: ExperimentRun, queue: asyncio.Queue) -> None:
+        """Process the records handed to a cell until the dataset is exhausted"""
+        while (item := await queue.get()) is not None:
+            eval_record, prompt = item
+            await self._add_record_async(run, eval_record, prompt)
+
+        await self._drain_async(run)
+
+    def _end_runs(self, runs: List[ExperimentRun]) -> List[str]:
+        """Record every cell's run metrics, keeping them by experiment id"""
+        cell_metrics = {}
+        for run in runs:
+            self._end_run(run)
+            cell_metrics[run.experiment_id] = self.run_metrics
+        self.run_metrics = cell_metrics
+
+        return list(cell_metrics)
+
+    def _prepare(self, sweep_config: SweepConfig):
+        embedding_model = sweep_config.embedding_model
+        if sweep_config.embedding_cache:
+            self.embedding_cache = EmbeddingCache(self.tracer.db_client)
+            embedding_model = CachedEmbedding(embedding_model, self.embedding_cache)
+        shared_embedding = SharedEmbedding(embedding_model)
+
+        templates = {}
+        for prompt_template in sweep_config.prompt_templates:
+            asset = self.tracer.db_client.fetch_data(
+                SQLQuery.SELECT_ASSET_QUERY,
+                (prompt_template.name, prompt_template.version),
+            )[0]
+            templates[(prompt_template.name, prompt_template.version)] = (
+                CompiledPromptTemplate(
+                    *Utils.split_prompt_template(asset["asset_binary"])
+                )
+            )
+
+        cells = []
+        for inference_model in sweep_config.inference_models:
+            for prompt_template in sweep_config.prompt_templates:
+                experiment_config = ExperimentConfig(
+                    inference_model=inference_model,
+                    embedding_model=shared_embedding,
+                    prompt_template=prompt_template,
+                    dataset=sweep_config.dataset,
+                    # EvaluatorFactory attaches the cell's models to custom
+                    # evaluators, so every cell needs its own copy
+                    evaluation=[
+                        evaluation.model_copy(
+                            update={"evaluator": copy.copy(evaluation.evaluator)}
+                        )
+                        for evaluation in sweep_config.evaluation
+                    ],
+                    evaluation_batch_size=sweep_config.evaluation_batch_size,
+                )
+                ConfigValidator.validate_experiment_config(experiment_config)
+                cells.append(
+                    SweepCell(
+                        experiment_config,
+                        (prompt_template.name, prompt_template.version),
+                    )
+                )
+
+        eval_dataset_path = self.tracer.db_client.fetch_data(
+            SQLQuery.SELECT_DATASET_FILE_PATH_QUERY,
+            (sweep_config.dataset.name, sweep_config.dataset.version),
+        )[0]
+        eval_dataset = Utils.stream_dataset(eval_dataset_path["file_path"])
+
+        return shared_embedding, templates, cells, eval_dataset
+
+    @contextmanager
+    def _attach_inference_cache(self, sweep_config: SweepConfig):
+        """One inference cache for all the models of the sweep"""
+        models = self._unique_models(sweep_config)
+        previous_caches = [getattr(model, "cache", None) for model in models]
+
+        if sweep_config.inference_cache is not None:
+            self.inference_cache = InferenceCache(
+                self.tracer.db_client, sweep_config.inference_cache
+            )
+            for model in models:
+                model.cache = self.inference_cache
+
+        try:
+            yield
+        finally:
+            for model, previous_cache in zip(models, previous_caches):
+                model.cache = previous_cache
+
+    @staticmethod
+    def _unique_models(sweep_config: SweepConfig) -> List:
+        return list(
+            {id(model): model for model in sweep_config.inference_models}.values()
+        )
+
+    @staticmethod
+    def _render(templates: Dict, eval_records: List) -> Dict:
+        return {
+            key: template.render_many(eval_records)
+            for key, template in templates.items()
+        }
@@ -0,0 +1,108 @@
+import math
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict
+
+
+class LogHistogram:
+    """
+    Fixed-size histogram of durations in nanoseconds with log scaled buckets,
+    in the style of HdrHistogram. Every power of two range is split into
+    2 ** sub_bucket_bits equal buckets, so percentiles are within about
+    2 ** -sub_bucket_bits of the recorded values while memory stays the same
+    however many values are recorded. Durations below 2 ** (sub_bucket_bits
+    + 1) are counted exactly, and durations beyond max_bits are counted in
+    the last bucket. The count, mean and maximum are exact.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 7, max_bits: int = 43):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_buckets = 1 << sub_bucket_bits
+        # Durations of up to 2 ** 43 ns, about two and a half hours
+        self.max_shift = max_bits - sub_bucket_bits - 1
+        self.counts = [0] * (self.sub_buckets * (self.max_shift + 2))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: int, count: int = 1) -> None:
+        """Count value count times"""
+        value = max(value, 0)
+        self.counts[self._index(value)] += count
+        self.count += count
+        self.total += value * count
+        self.max = max(self.max, value)
+
+    def percentile(self, percentile: float) -> float:
+        """Nearest rank percentile, the middle of the bucket it falls in"""
+        rank = max(math.ceil(percentile / 100 * self.count), 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and index < len(self.counts) - 1:
+                lowest, width = self._bucket(index)
+                return min(lowest + (width - 1) / 2, self.max)
+        # The last bucket has no upper bound
+        return self.max
+
+    def _index(self, value: int) -> int:
+        shift = value.bit_length() - self.sub_bucket_bits - 1
+        if shift <= 0:
+            return value
+        if shift > self.max_shift:
+            return len(self.counts) - 1
+        return shift * self.sub_buckets + (value >> shift)
+
+    def _bucket(self, index: int):
+        """Lowest value and width of a bucket"""
+        shift = index // self.sub_buckets - 1
+        if shift <= 0:
+            return index, 1
+        return (index - shift * self.sub_buckets) << shift, 1 << shift
+
+
+class StageTimings:
+    """
+    Durations of the pipeline stages of every record in a run, measured with
+    time.perf_counter_ns and kept in a LogHistogram per stage. Work done for
+    a whole chunk of records at once is shared evenly between them.
+    """
+
+    percentiles = (50, 90, 99)
+
+    def __init__(self):
+        self._histograms: Dict[str, LogHistogram] = defaultdict(LogHistogram)
+
+    def record(self, stage: str, duration_ns: int, records: int = 1) -> None:
+        if records < 1:
+            return
+        self._histograms[stage].record(duration_ns // records, records)
+
+    def add(self, timings: Dict[str, int]) -> None:
+        """Record the stage durations reported for a single record"""
+        for stage, duration_ns in timings.items():
+            self.record(stage, duration_ns)
+
+    @contextmanager
+    def measure(self, stage: str, records: int = 1):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter_ns() - start, records)
+
+    def histograms(self) -> Dict[str, Dict[str, float]]:
+        """Count, mean, percentiles and maximum of every stage, in milliseconds"""
+        histograms = {}
+        for stage, durations in self._histograms.items():
+            histogram = {
+                "count": durations.count,
+                "mean_ms": durations.total / durations.count / 1e6,
+            }
+            for percentile in self.percentiles:
+                histogram[f"p{percentile}_ms"] = durations.percentile(percentile) / 1e6
+            histogram["max_ms"] = durations.max / 1e6
+            histograms[stage] = histogram
+
+        return histograms
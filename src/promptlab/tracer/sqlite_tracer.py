@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional, Set
 import json
 
 from promptlab.config import ExperimentConfig, TracerConfig
@@ -9,19 +9,66 @@ from promptlab.db.sql import SQLQuery
 
 
 class SQLiteTracer(Tracer):
+    # Values of the optional columns of results traced without them
+    _result_defaults = {
+        "retries": 0,
+        "time_to_first_token_ms": None,
+        "inter_token_latency_ms": None,
+        "tokens_per_second": None,
+    }
+
     def __init__(self, tracer_config: TracerConfig):
         self.db_client = SQLiteClient(tracer_config.db_file)
+        self.chunk_size = tracer_config.chunk_size
+        self._buffer: List[Dict] = []
 
     def init_db(self):
         self.db_client.execute_query(SQLQuery.CREATE_ASSETS_TABLE_QUERY)
         self.db_client.execute_query(SQLQuery.CREATE_EXPERIMENTS_TABLE_QUERY)
         self.db_client.execute_query(SQLQuery.CREATE_EXPERIMENT_RESULT_TABLE_QUERY)
+        self.db_client.execute_query(SQLQuery.CREATE_EXPERIMENT_RESULT_INDEX_QUERY)
+
+        # Databases created by earlier versions miss the newer columns
+        self._add_missing_columns(
+            "experiments", {"metrics": "BLOB", "records_evaluated": "INTEGER"}
+        )
+        self._add_missing_columns(
+            "experiment_result",
+            {
+                "retries": "INTEGER DEFAULT 0",
+                "time_to_first_token_ms": "REAL",
+                "inter_token_latency_ms": "REAL",
+                "tokens_per_second": "REAL",
+            },
+        )
+
+    def _add_missing_columns(self, table: str, columns: Dict[str, str]) -> None:
+        existing = {
+            row["name"]
+            for row in self.db_client.fetch_data(
+                SQLQuery.SELECT_TABLE_COLUMNS_QUERY, (table,)
+            )
+        }
+        for column, column_type in columns.items():
+            if column not in existing:
+                self.db_client.execute_query(
+                    SQLQuery.ADD_COLUMN_QUERY.format(
+                        table=table, column=column, column_type=column_type
+                    )
+                )
 
     def trace(
         self, experiment_config: ExperimentConfig, experiment_summary: List[Dict]
+    ) -> None:
+        self.start_experiment(experiment_config, experiment_summary[0]["experiment_id"])
+        for result in experiment_summary:
+            self.trace_result(result)
+        self.flush()
+
+    def start_experiment(
+        self, experiment_config: ExperimentConfig, experiment_id: str
     ) -> None:
         timestamp = datetime.now().isoformat()
-        experiment_id = experiment_summary[0]["experiment_id"]
 
         model = {
             "inference_model_type": experiment_config.inference_model.model_config.type,
@@ -49,6 +96,67 @@ class SQLiteTracer(Tracer):
             SQLQuery.INSERT_EXPERIMENT_QUERY,
             (experiment_id, json.dumps(model), json.dumps(asset), timestamp),
         )
-        self.db_client.execute_query_many(
-            SQLQuery.INSERT_BATCH_EXPERIMENT_RESULT_QUERY, experiment_summary
+
+    def finish_experiment(self, experiment_id: str, metrics: Dict) -> None:
+        self.db_client.execute_query(
+            SQLQuery.UPDATE_EXPERIMENT_METRICS_QUERY,
+            {"metrics": json.dumps(metrics), "experiment_id": experiment_id},
+        )
+
+    def experiment_exists(self, experiment_id: str) -> bool:
+        return bool(
+            self.db_client.fetch_data(
+                SQLQuery.SELECT_EXPERIMENT_QUERY, (experiment_id,)
+            )
+        )
+
+    def get_completed_record_ids(
+        self, experiment_id: str, record_ids: Optional[List[str]] = None
+    ) -> Set[str]:
+        # Served entirely from idx_experiment_result_unique_record
+        if record_ids is None:
+            rows = self.db_client.fetch_data(
+                SQLQuery.SELECT_COMPLETED_RECORD_IDS_QUERY, (experiment_id,)
+            )
+            return {str(row["dataset_record_id"]) for row in rows}
+
+        completed = set()
+        # Stay well under SQLite's limit on the number of bound parameters
+        for start in range(0, len(record_ids), 500):
+            batch = record_ids[start : start + 500]
+            query = SQLQuery.SELECT_COMPLETED_RECORD_IDS_BATCH_QUERY.format(
+                placeholders=", ".join("?" * len(batch))
+            )
+            rows = self.db_client.fetch_data(query, (experiment_id, *batch))
+            completed.update(str(row["dataset_record_id"]) for row in rows)
+
+        return completed
+
+    def get_evaluations(self, experiment_id: str) -> Dict[str, str]:
+        rows = self.db_client.fetch_data(
+            SQLQuery.SELECT_EXPERIMENT_EVALUATIONS_QUERY, (experiment_id,)
+        )
+        return {str(row["dataset_record_id"]): row["evaluation"] for row in rows}
+
+    def trace_result(self, result: Dict) -> int:
+        self._buffer.append({**self._result_defaults, **result})
+        if len(self._buffer) >= self.chunk_size:
+            return self.flush()
+        return 0
+
+    def flush(self) -> int:
+        if not self._buffer:
+            return 0
+
+        # Each chunk is written in a single transaction. The results stay
+        # buffered until it commits, so a failed write, e.g. on a locked
+        # database, raises and is retried by the next flush.
+        self.db_client.execute_batch(
+            SQLQuery.INSERT_BATCH_NEW_EXPERIMENT_RESULT_QUERY
+            if self.skip_traced_records
+            else SQLQuery.INSERT_BATCH_EXPERIMENT_RESULT_QUERY,
+            self._buffer,
         )
+        written = len(self._buffer)
+        self._buffer = []
+        return written
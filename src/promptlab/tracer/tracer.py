@@ -1,10 +1,14 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from typing import Dict, List, Optional, Set
 
 from promptlab.config import ExperimentConfig, TracerConfig
 
 
 class Tracer(ABC):
+    # When set, results of records already traced for their experiment are
+    # dropped as they are written, e.g. by shard workers
+    skip_traced_records = False
+
     def __init__(self, tracer_config: TracerConfig):
         pass
 
@@ -17,3 +21,48 @@ class Tracer(ABC):
         self, experiment_config: ExperimentConfig, experiment_summary: List[Dict]
     ):
         pass
+
+    @abstractmethod
+    def start_experiment(self, experiment_config: ExperimentConfig, experiment_id: str):
+        """Record the experiment before any of its results are traced"""
+        pass
+
+    @abstractmethod
+    def finish_experiment(self, experiment_id: str, metrics: Dict):
+        """
+        Record run level metrics and the number of records evaluated once an
+        experiment run has finished
+        """
+        pass
+
+    @abstractmethod
+    def experiment_exists(self, experiment_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    def get_completed_record_ids(
+        self, experiment_id: str, record_ids: Optional[List[str]] = None
+    ) -> Set[str]:
+        """
+        Return the dataset record ids already traced for an experiment, only
+        looking among record_ids when given
+        """
+        pass
+
+    @abstractmethod
+    def get_evaluations(self, experiment_id: str) -> Dict[str, str]:
+        """Return the evaluation of every dataset record traced for an experiment"""
+        pass
+
+    @abstractmethod
+    def trace_result(self, result: Dict) -> int:
+        """
+        Buffer a single experiment result, persisting it in chunks. Returns
+        the number of results persisted by the call, 0 if it only buffered.
+        """
+        pass
+
+    @abstractmethod
+    def flush(self) -> int:
+        """Persist any buffered experiment results and return their number"""
+        pass
@@ -1,9 +1,9 @@
-from dataclasses import dataclass
-from typing import List, Optional, Any, Protocol, runtime_checkable
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any, Protocol, Union, runtime_checkable
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, field_validator, model_validator
 
-from promptlab.enums import TracerType
+from promptlab.enums import ExecutionMode, TracerType
 from promptlab.evaluator.evaluator import Evaluator
 from promptlab.utils import Utils
 
@@ -14,6 +14,14 @@ class InferenceResult:
     prompt_tokens: int
     completion_tokens: int
     latency_ms: int
+    retries: int = 0
+    # Only measured for streamed responses
+    time_to_first_token_ms: Optional[float] = None
+    inter_token_latency_ms: Optional[float] = None
+    tokens_per_second: Optional[float] = None
+    # Nanoseconds spent waiting for quota and a concurrency slot, and in the
+    # model call itself
+    timings: Dict[str, int] = field(default_factory=dict, compare=False)
 
 
 @dataclass
@@ -25,6 +33,22 @@ class ModelConfig:
     inference_model_deployment: Optional[str] = None
     embedding_model_deployment: Optional[str] = None
     max_concurrent_tasks: int = 5
+    adaptive_concurrency: bool = False
+    max_adaptive_concurrency: int = 64
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+    max_attempts: int = 3
+    retry_base_delay: float = 0.5
+    retry_max_delay: float = 30.0
+    hedge_percentile: Optional[float] = None
+    hedge_budget: float = 0.05
+    execution: str = ExecutionMode.THREAD.value
+    embedding_batch_size: Optional[int] = None
+    keep_alive: Optional[Union[str, float]] = None
+    max_connections: Optional[int] = None
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    stream: bool = False
 
 
 @dataclass
@@ -59,6 +83,13 @@ class EmbeddingModel(Protocol):
     def __call__(self, text: str) -> Any: ...
 
 
+@dataclass
+class CacheConfig:
+    max_entries: Optional[int] = 100_000
+    ttl_seconds: Optional[float] = None
+    bypass: bool = False
+
+
 @dataclass
 class Dataset:
     name: str
@@ -80,32 +111,112 @@ class EvaluationConfig(BaseModel):
     metric: str
     column_mapping: dict
     evaluator: Optional[Evaluator] = None
+    execution: str = ExecutionMode.THREAD.value
 
     model_config = {"arbitrary_types_allowed": True}
 
+    @field_validator("execution")
+    def validate_execution(cls, value):
+        valid_modes = [mode.value for mode in ExecutionMode]
+        if value not in valid_modes:
+            raise ValueError(f"execution must be one of: {', '.join(valid_modes)}")
+        return value
+
 
 class AssetConfig(BaseModel):
     name: str
     version: int
 
 
+class EarlyStoppingConfig(BaseModel):
+    metric: str
+    confidence: float = 0.95
+    max_interval_width: Optional[float] = None
+    baseline_experiment_id: Optional[str] = None
+    min_records: int = 30
+    seed: Optional[int] = None
+
+    @field_validator("confidence")
+    def validate_confidence(cls, value):
+        if not 0 < value < 1:
+            raise ValueError("confidence must be between 0 and 1")
+        return value
+
+    @field_validator("min_records")
+    def validate_min_records(cls, value):
+        if value < 2:
+            raise ValueError("min_records must be at least 2")
+        return value
+
+    @model_validator(mode="after")
+    def validate_stopping_rule(self):
+        if self.max_interval_width is None and self.baseline_experiment_id is None:
+            raise ValueError(
+                "early stopping needs max_interval_width or baseline_experiment_id"
+            )
+        return self
+
+
 class ExperimentConfig(BaseModel):
     inference_model: Model
     embedding_model: EmbeddingModel
     prompt_template: PromptTemplate
     dataset: Dataset
     evaluation: List[EvaluationConfig]
+    experiment_id: Optional[str] = None
+    inference_cache: Optional[CacheConfig] = None
+    embedding_cache: bool = False
+    evaluation_batch_size: int = 100
+    early_stopping: Optional[EarlyStoppingConfig] = None
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    @field_validator("evaluation_batch_size")
+    def validate_evaluation_batch_size(cls, value):
+        if value < 1:
+            raise ValueError("evaluation_batch_size must be at least 1")
+        return value
+
+
+class SweepConfig(BaseModel):
+    inference_models: List[Model]
+    embedding_model: EmbeddingModel
+    prompt_templates: List[PromptTemplate]
+    dataset: Dataset
+    evaluation: List[EvaluationConfig]
+    inference_cache: Optional[CacheConfig] = None
+    embedding_cache: bool = False
+    evaluation_batch_size: int = 100
 
     model_config = {"arbitrary_types_allowed": True}
 
+    @field_validator("inference_models", "prompt_templates")
+    def validate_not_empty(cls, value):
+        if not value:
+            raise ValueError("a sweep needs at least one model and prompt template")
+        return value
+
+    @field_validator("evaluation_batch_size")
+    def validate_evaluation_batch_size(cls, value):
+        if value < 1:
+            raise ValueError("evaluation_batch_size must be at least 1")
+        return value
+
 
 class TracerConfig(BaseModel):
     type: TracerType
     db_file: str
+    chunk_size: int = 100
 
     @field_validator("db_file")
     def validate_db_server(cls, value):
         return Utils.sanitize_path(value)
 
+    @field_validator("chunk_size")
+    def validate_chunk_size(cls, value):
+        if value < 1:
+            raise ValueError("chunk_size must be at least 1")
+        return value
+
     class Config:
         use_enum_values = True
@@ -1,7 +1,9 @@
 import json
 import os
+import random
 import re
-from typing import Dict, List, Tuple
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 
 class Utils:
@@ -20,13 +22,88 @@ class Utils:
 
     @staticmethod
     def load_dataset(dataset_path: str) -> List[Dict]:
+        return list(Utils.stream_dataset(dataset_path))
+
+    @staticmethod
+    def stream_dataset(dataset_path: str) -> Iterator[Dict]:
+        """
+        Lazily yield dataset records one line at a time, so memory use does
+        not grow with the size of the JSONL file.
+        """
         dataset_path = Utils.sanitize_path(dataset_path)
 
-        dataset = []
         with open(dataset_path, "r") as file:
             for line in file:
-                dataset.append(json.loads(line.strip()))
-        return dataset
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    @staticmethod
+    def stream_dataset_shuffled(
+        dataset_path: str, seed: Optional[int] = None
+    ) -> Iterator[Dict]:
+        """
+        Lazily yield dataset records in random order. Only the byte offset of
+        each record is kept in memory, records are read back one at a time.
+        """
+        dataset_path = Utils.sanitize_path(dataset_path)
+
+        with open(dataset_path, "rb") as file:
+            offsets = []
+            offset = 0
+            for line in file:
+                if line.strip():
+                    offsets.append(offset)
+                offset += len(line)
+
+            random.Random(seed).shuffle(offsets)
+            for offset in offsets:
+                file.seek(offset)
+                yield json.loads(file.readline())
+
+    @staticmethod
+    def dataset_shards(
+        dataset_path: str, shard_size: int
+    ) -> Iterator[Tuple[int, int, int]]:
+        """
+        Split a JSONL dataset into runs of shard_size records, yielding the
+        start and end byte offsets and the record count of each run
+        """
+        dataset_path = Utils.sanitize_path(dataset_path)
+
+        with open(dataset_path, "rb") as file:
+            start = end = records = 0
+            for line in file:
+                end += len(line)
+                if line.strip():
+                    records += 1
+                if records == shard_size:
+                    yield start, end, records
+                    start, records = end, 0
+            if records:
+                yield start, end, records
+
+    @staticmethod
+    def stream_dataset_range(dataset_path: str, start: int, end: int) -> Iterator[Dict]:
+        """Lazily yield the dataset records between two byte offsets"""
+        dataset_path = Utils.sanitize_path(dataset_path)
+
+        with open(dataset_path, "rb") as file:
+            file.seek(start)
+            while file.tell() < end:
+                line = file.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    @staticmethod
+    def batched(iterable: Iterable, size: int) -> Iterator[List]:
+        """Yield lists of up to size items, pulling lazily from iterable"""
+        iterator = iter(iterable)
+        while batch := list(islice(iterator, size)):
+            yield batch
 
     @staticmethod
     def split_prompt_template(asset) -> Tuple[str, str, List[str]]:
@@ -45,3 +122,47 @@ class Utils:
         prompt_template_variables = list(set(prompt_template_variables))
 
         return system_prompt, user_prompt, prompt_template_variables
+
+
+class CompiledPromptTemplate:
+    """
+    System and user prompts pre-split into literal segments and variable
+    slots, so rendering a record is a single join per prompt instead of one
+    str.replace per variable
+    """
+
+    def __init__(
+        self, system_prompt: str, user_prompt: str, prompt_template_variables: List[str]
+    ):
+        self.variables = list(prompt_template_variables)
+
+        # Longest names first, so a variable that is a prefix of another one
+        # doesn't take its place in the alternation
+        names = sorted(self.variables, key=len, reverse=True)
+        pattern = re.compile(
+            "<(" + "|".join(re.escape(name) for name in names) + ")>"
+            if names
+            else "(?!)"
+        )
+
+        # re.split with a capturing group alternates literal segments (even
+        # indices) and variable names (odd indices)
+        self.system_segments = pattern.split(system_prompt)
+        self.user_segments = pattern.split(user_prompt)
+
+    def render(self, item: Dict) -> Tuple[str, str]:
+        values = {variable: f"<{item[variable]}>" for variable in self.variables}
+
+        return (
+            self._render(self.system_segments, values),
+            self._render(self.user_segments, values),
+        )
+
+    def render_many(self, items: Iterable[Dict]) -> List[Tuple[str, str]]:
+        return [self.render(item) for item in items]
+
+    @staticmethod
+    def _render(segments: List[str], values: Dict[str, str]) -> str:
+        parts = segments[:]
+        parts[1::2] = [values[name] for name in segments[1::2]]
+        return "".join(parts)
@@ -1,8 +1,17 @@
 import asyncio
+import json
 import time
 from unittest.mock import MagicMock
-from promptlab.model.model import Model
-from promptlab.types import InferenceResult, ModelConfig
+from promptlab.asset import Asset
+from promptlab.model.model import EmbeddingModel, Model
+from promptlab.tracer.sqlite_tracer import SQLiteTracer
+from promptlab.types import (
+    Dataset,
+    InferenceResult,
+    ModelConfig,
+    PromptTemplate,
+    TracerConfig,
+)
 
 
 class MockModel(Model):
@@ -39,20 +48,49 @@ class MockModel(Model):
         )
 
 
-def create_mock_experiment_config():
+class MockEmbedding(EmbeddingModel):
+    """A mock embedding model that embeds a text by its length"""
+
+    def __init__(self):
+        super().__init__(ModelConfig(type="mock", embedding_model_deployment="e"))
+
+    def __call__(self, text):
+        return [1.0, float(len(text))]
+
+
+def create_mock_experiment_config(model=None, evaluation=None):
     """Create a mock experiment config for testing"""
     config = MagicMock()
+    config.inference_model = model or MockModel(delay_seconds=0)
+    config.embedding_model = MockEmbedding()
     config.prompt_template = MagicMock()
     config.prompt_template.name = "test"
     config.prompt_template.version = "1.0"
     config.dataset = MagicMock()
     config.dataset.name = "test"
     config.dataset.version = "1.0"
-    config.evaluation = []
+    config.evaluation = evaluation or []
     config.model = MagicMock()
+    config.experiment_id = None
+    config.evaluation_batch_size = 4
+    config.early_stopping = None
     return config
 
 
+def create_experiment_config(**kwargs):
+    """Create an experiment config for the assets made by create_assets"""
+    experiment_config = {
+        "inference_model": MockModel(delay_seconds=0),
+        "embedding_model": MockEmbedding(),
+        "prompt_template": PromptTemplate(name="template", version=0),
+        "dataset": Dataset(name="dataset", description="", file_path="", version=0),
+        "evaluation": [],
+        "evaluation_batch_size": 2,
+    }
+    experiment_config.update(kwargs)
+    return experiment_config
+
+
 def create_mock_tracer():
     """Create a mock tracer for testing"""
     tracer = MagicMock()
@@ -60,3 +98,32 @@ def create_mock_tracer():
         {"asset_binary": "system: test\nuser: test", "file_path": "test.jsonl"}
     ]
     return tracer
+
+
+def create_sqlite_tracer(tmp_path, **kwargs):
+    """Create a SQLite tracer with its tables in a temporary directory"""
+    tracer = SQLiteTracer(
+        TracerConfig(type="sqlite", db_file=str(tmp_path / "promptlab.db"), **kwargs)
+    )
+    tracer.init_db()
+    return tracer
+
+
+def create_dataset_file(tmp_path, records, text="text", blank_lines=False):
+    """Write a JSONL dataset, with a blank line after every third record if asked"""
+    dataset_file = tmp_path / "dataset.jsonl"
+    with open(dataset_file, "w") as file:
+        for i in range(records):
+            file.write(json.dumps({"id": i, "text": f"{text} {i}"}) + "\n")
+            if blank_lines and i % 3 == 0:
+                file.write("\n")
+    return str(dataset_file)
+
+
+def create_assets(tracer, dataset_file):
+    """Create the dataset and prompt template assets used by create_experiment_config"""
+    asset = Asset(tracer)
+    asset.create(Dataset(name="dataset", description="", file_path=dataset_file))
+    asset.create(
+        PromptTemplate(name="template", system_prompt="Be brief", user_prompt="<text>")
+    )
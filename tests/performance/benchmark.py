@@ -0,0 +1,280 @@
+"""
+End to end throughput benchmark of Experiment.run and Experiment.run_async
+against mock models and evaluators with a configurable latency.
+
+    python -m tests.performance.benchmark --records 1000 10000 100000 \
+        --latency-ms 5 --output benchmark.json --baseline previous.json
+
+Every case runs in a fresh process, so its peak RSS isn't inflated by the
+cases before it. Results are written as JSON, and comparing them with the
+results of a previous version exits with status 1 when the throughput of
+any case dropped by more than --tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+import promptlab  # noqa: E402
+from promptlab.asset import Asset  # noqa: E402
+from promptlab.evaluator.evaluator import Evaluator  # noqa: E402
+from promptlab.experiment import Experiment  # noqa: E402
+from promptlab.model.model import EmbeddingModel, Model  # noqa: E402
+from promptlab.tracer.sqlite_tracer import SQLiteTracer  # noqa: E402
+from promptlab.types import (  # noqa: E402
+    Dataset,
+    EvaluationConfig,
+    InferenceResult,
+    ModelConfig,
+    PromptTemplate,
+    TracerConfig,
+)
+
+MODES = ("sync", "async")
+
+
+class LatencyModel(Model):
+    """Answers every prompt after a fixed delay"""
+
+    def __init__(self, latency_ms: float, max_concurrent_tasks: int):
+        super().__init__(
+            ModelConfig(
+                type="mock",
+                inference_model_deployment="benchmark",
+                max_concurrent_tasks=max_concurrent_tasks,
+            )
+        )
+        self.latency = latency_ms / 1000
+
+    def invoke(self, system_prompt, user_prompt) -> InferenceResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._result(user_prompt)
+
+    async def ainvoke(self, system_prompt, user_prompt) -> InferenceResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._result(user_prompt)
+
+    def _result(self, user_prompt) -> InferenceResult:
+        return InferenceResult(
+            inference=f"Answer to {user_prompt}",
+            prompt_tokens=len(user_prompt) // 4,
+            completion_tokens=8,
+            latency_ms=self.latency * 1000,
+        )
+
+
+class StaticEmbedding(EmbeddingModel):
+    def __init__(self):
+        super().__init__(
+            ModelConfig(type="mock", embedding_model_deployment="benchmark")
+        )
+
+    def __call__(self, text):
+        return [1.0, float(len(text))]
+
+
+class LatencyEvaluator(Evaluator):
+    """Scores each record by its length after a fixed delay"""
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+
+    def evaluate(self, data: dict):
+        if self.latency:
+            time.sleep(self.latency)
+        return len(data["response"])
+
+
+def peak_rss_mb() -> float:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    if sys.platform == "darwin":
+        return peak_rss / 1024 / 1024
+    return peak_rss / 1024
+
+
+def run_case(
+    mode: str,
+    records: int,
+    latency_ms: float = 1.0,
+    evaluator_latency_ms: float = 0.0,
+    max_concurrent_tasks: int = 50,
+) -> Dict:
+    """Run one experiment over a generated dataset and measure it"""
+    with tempfile.TemporaryDirectory() as directory:
+        tracer = SQLiteTracer(
+            TracerConfig(type="sqlite", db_file=os.path.join(directory, "promptlab.db"))
+        )
+        tracer.init_db()
+
+        dataset_path = os.path.join(directory, "dataset.jsonl")
+        with open(dataset_path, "w") as file:
+            for i in range(records):
+                file.write(json.dumps({"id": i, "question": f"question {i}"}) + "\n")
+
+        asset = Asset(tracer)
+        asset.create(
+            Dataset(name="benchmark_dataset", description="", file_path=dataset_path)
+        )
+        asset.create(
+            PromptTemplate(
+                name="benchmark_template",
+                system_prompt="Answer the question",
+                user_prompt="<question>",
+            )
+        )
+
+        experiment_config = {
+            "inference_model": LatencyModel(latency_ms, max_concurrent_tasks),
+            "embedding_model": StaticEmbedding(),
+            "prompt_template": PromptTemplate(name="benchmark_template", version=0),
+            "dataset": Dataset(
+                name="benchmark_dataset", description="", file_path="", version=0
+            ),
+            "evaluation": [
+                EvaluationConfig(
+                    metric="Length",
+                    column_mapping={"response": "$inference"},
+                    evaluator=LatencyEvaluator(evaluator_latency_ms),
+                )
+            ],
+        }
+
+        experiment = Experiment(tracer)
+        start = time.perf_counter()
+        if mode == "async":
+            experiment_id = asyncio.run(experiment.run_async(experiment_config))
+        else:
+            experiment_id = experiment.run(experiment_config)
+        seconds = time.perf_counter() - start
+
+        traced = tracer.db_client.fetch_data(
+            "SELECT records_evaluated FROM experiments WHERE experiment_id = ?",
+            (experiment_id,),
+        )[0]["records_evaluated"]
+
+    return {
+        "mode": mode,
+        "records": records,
+        "latency_ms": latency_ms,
+        "evaluator_latency_ms": evaluator_latency_ms,
+        "max_concurrent_tasks": max_concurrent_tasks,
+        "traced": traced,
+        "seconds": seconds,
+        "records_per_sec": records / seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "timings": experiment.run_metrics["timings"],
+    }
+
+
+def case_key(result: Dict) -> tuple:
+    return (
+        result["mode"],
+        result["records"],
+        result["latency_ms"],
+        result["evaluator_latency_ms"],
+        result["max_concurrent_tasks"],
+    )
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """Describe every case whose throughput fell below the baseline"""
+    baseline_results = {case_key(result): result for result in baseline}
+
+    regressions = []
+    for result in results:
+        previous = baseline_results.get(case_key(result))
+        if previous is None:
+            continue
+        if result["records_per_sec"] < previous["records_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{result['mode']} {result['records']} records: "
+                f"{result['records_per_sec']:.0f} records/sec, "
+                f"was {previous['records_per_sec']:.0f}"
+            )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--records", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--latency-ms", type=float, default=1.0)
+    parser.add_argument("--evaluator-latency-ms", type=float, default=0.0)
+    parser.add_argument("--max-concurrent-tasks", type=int, default=50)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="results of a previous run to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for records in args.records:
+        for mode in args.modes:
+            with context.Pool(1) as pool:
+                result = pool.apply(
+                    run_case,
+                    (
+                        mode,
+                        records,
+                        args.latency_ms,
+                        args.evaluator_latency_ms,
+                        args.max_concurrent_tasks,
+                    ),
+                )
+            results.append(result)
+            print(
+                f"{mode:>5} {records:>7} records: "
+                f"{result['records_per_sec']:>9.0f} records/sec, "
+                f"{result['seconds']:>8.2f} s, "
+                f"peak RSS {result['peak_rss_mb']:.0f} MB"
+            )
+            for stage, histogram in result["timings"].items():
+                print(
+                    f"      {stage:<20} p50 {histogram['p50_ms']:.3f} ms, "
+                    f"p90 {histogram['p90_ms']:.3f} ms, "
+                    f"p99 {histogram['p99_ms']:.3f} ms"
+                )
+
+    with open(args.output, "w") as file:
+        json.dump(
+            {
+                "promptlab_version": promptlab.__version__,
+                "python_version": platform.python_version(),
+                "platform": platform.platform(),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "results": results,
+            },
+            file,
+            indent=2,
+        )
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
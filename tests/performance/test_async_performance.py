@@ -40,12 +40,8 @@ async def test_parallel_execution():
     print(f"Asynchronous execution time: {async_time:.2f} seconds")
 
     # Async should be significantly faster
-    if async_time < sync_time / 2:
-        print("✅ Async execution is at least 2x faster than synchronous execution")
-        return True
-    else:
-        print("❌ Async execution is not significantly faster")
-        return False
+    assert async_time < sync_time / 2
+    print("✅ Async execution is at least 2x faster than synchronous execution")
 
 
 @pytest.mark.asyncio
@@ -54,9 +50,7 @@ async def main():
     print("Testing async implementation...")
 
     # Test parallel execution
-    parallel_ok = await test_parallel_execution()
-    if not parallel_ok:
-        return
+    await test_parallel_execution()
 
     print("All tests passed!")
 
@@ -0,0 +1,64 @@
+import json
+import pytest
+from tests.performance.benchmark import compare, main, run_case
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_benchmark_runs_experiment_end_to_end(mode):
+    """Test that a benchmark case traces every record and reports each stage"""
+    result = run_case(mode, 1000, latency_ms=0)
+
+    assert result["traced"] == 1000
+    assert result["records_per_sec"] > 0
+    assert result["peak_rss_mb"] > 0
+    assert {"render", "network", "evaluation.Length", "persist"} <= set(
+        result["timings"]
+    )
+
+
+def test_async_overlaps_model_latency():
+    """Test that run_async keeps many slow requests in flight"""
+    sync_result = run_case("sync", 100, latency_ms=10)
+    async_result = run_case("async", 100, latency_ms=10)
+
+    assert async_result["records_per_sec"] > 5 * sync_result["records_per_sec"]
+
+
+def test_results_are_compared_with_a_baseline(tmp_path):
+    """Test that a throughput drop beyond the tolerance fails the run"""
+    baseline_path = tmp_path / "baseline.json"
+    assert main(["--records", "200", "--output", str(baseline_path)]) == 0
+
+    baseline = json.loads(baseline_path.read_text())
+    for result in baseline["results"]:
+        result["records_per_sec"] *= 100
+    baseline_path.write_text(json.dumps(baseline))
+
+    assert (
+        main(
+            [
+                "--records",
+                "200",
+                "--output",
+                str(tmp_path / "current.json"),
+                "--baseline",
+                str(baseline_path),
+            ]
+        )
+        == 1
+    )
+
+
+def test_compare_ignores_cases_missing_from_the_baseline():
+    result = {
+        "mode": "async",
+        "records": 1000,
+        "latency_ms": 1.0,
+        "evaluator_latency_ms": 0.0,
+        "max_concurrent_tasks": 50,
+        "records_per_sec": 100.0,
+    }
+
+    assert compare([result], [], tolerance=0.1) == []
+    assert compare([result], [{**result, "records_per_sec": 105.0}], 0.1) == []
+    assert len(compare([result], [{**result, "records_per_sec": 200.0}], 0.1)) == 1
@@ -112,6 +112,9 @@ async def test_experiment_async_execution():
             mock_instance.dataset.version = "1.0"
             mock_instance.evaluation = []
             mock_instance.model = MagicMock()
+            mock_instance.inference_cache = None
+            mock_instance.embedding_cache = False
+            mock_instance.early_stopping = None
 
             # Create a mock experiment config
             experiment_config = {}
@@ -131,8 +134,9 @@ async def test_experiment_async_execution():
                 # Check that init_batch_eval_async was called
                 mock_batch_eval.assert_called_once()
 
-                # Check that tracer.trace was called
-                tracer.trace.assert_called_once()
+                # Results are traced incrementally by init_batch_eval_async,
+                # not as one summary at the end of the run
+                tracer.trace.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -85,6 +85,8 @@ async def test_experiment_async_execution():
 
     # Create a mock tracer
     tracer = MagicMock()
+    tracer.trace_result.return_value = 0
+    tracer.flush.return_value = 0
     tracer.db_client.fetch_data.return_value = [
         {"asset_binary": "system: test\nuser: test", "file_path": "test.jsonl"}
     ]
@@ -112,6 +114,9 @@ async def test_experiment_async_execution():
             mock_instance.dataset.version = "1.0"
             mock_instance.evaluation = []
             mock_instance.model = MagicMock()
+            mock_instance.inference_cache = None
+            mock_instance.embedding_cache = False
+            mock_instance.early_stopping = None
 
             # Create a mock experiment config
             experiment_config = {}
@@ -131,8 +136,9 @@ async def test_experiment_async_execution():
                 # Check that init_batch_eval_async was called
                 mock_batch_eval.assert_called_once()
 
-                # Check that tracer.trace was called
-                tracer.trace.assert_called_once()
+                # Results are traced incrementally by init_batch_eval_async,
+                # not as one summary at the end of the run
+                tracer.trace.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -319,6 +325,8 @@ async def test_experiment_concurrency_limit():
 
     # Create a mock tracer
     tracer = MagicMock()
+    tracer.trace_result.return_value = 0
+    tracer.flush.return_value = 0
     tracer.db_client.fetch_data.return_value = [
         {"asset_binary": "system: test\nuser: test", "file_path": "test.jsonl"}
     ]
@@ -362,6 +370,7 @@ async def test_experiment_concurrency_limit():
         experiment_config.dataset = dataset
         experiment_config.inference_model = model
         experiment_config.evaluation = []
+        experiment_config.early_stopping = None
 
         # Run the experiment asynchronously
         await experiment.init_batch_eval_async(
@@ -0,0 +1,153 @@
+import asyncio
+import pytest
+import sys
+import os
+from unittest.mock import MagicMock
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.model.concurrency import AdaptiveLimiter, is_throttling_error  # noqa: E402
+
+
+class ThrottledError(Exception):
+    status_code = 429
+
+
+async def request(limiter, error=None, delay=0.0):
+    async with limiter.slot():
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+
+
+async def failing_request(limiter, error):
+    with pytest.raises(type(error)):
+        await request(limiter, error)
+
+
+@pytest.mark.asyncio
+async def test_limit_increases_after_a_healthy_window():
+    """Test that the limit grows by one per window of successful requests"""
+    limiter = AdaptiveLimiter(2, max_limit=3, latency_tolerance=1000)
+
+    for _ in range(2):
+        await request(limiter)
+    assert limiter.limit == 3
+
+    for _ in range(10):
+        await request(limiter)
+    assert limiter.limit == 3
+    assert [limit for _, limit in limiter.history] == [2, 3]
+
+
+@pytest.mark.asyncio
+async def test_limit_halves_once_per_burst_of_throttling():
+    """Test that concurrent throttled requests only cut the limit once"""
+    limiter = AdaptiveLimiter(8, max_limit=16)
+
+    await asyncio.gather(
+        *(failing_request(limiter, ThrottledError()) for _ in range(4))
+    )
+    assert limiter.limit == 4
+
+    await failing_request(limiter, ThrottledError())
+    assert limiter.limit == 2
+    assert limiter.metrics()["throttled"] == 5
+
+
+@pytest.mark.asyncio
+async def test_untracked_latency_is_not_recorded():
+    """Test that slots without latency tracking don't feed the latency check"""
+    limiter = AdaptiveLimiter(4, max_limit=8)
+
+    async with limiter.slot(track_latency=False):
+        pass
+    await request(limiter, delay=0.02)
+
+    assert limiter.requests == 2
+    assert len(limiter._latencies) == 1
+    assert limiter._latencies[0] >= 0.02
+
+
+def test_one_fast_response_does_not_pin_the_latency_baseline():
+    """Test that varying latencies without a sustained drift keep the limit"""
+    limiter = AdaptiveLimiter(4, max_limit=4)
+
+    limiter._on_success(0.001, limiter._epoch)
+    for i in range(100):
+        limiter._on_success(0.5 if i % 3 else 2.0, limiter._epoch)
+
+    assert limiter.limit == 4
+
+
+def test_sustained_latency_drift_halves_the_limit_once():
+    """Test that a slowdown cuts the limit, and is judged anew afterwards"""
+    limiter = AdaptiveLimiter(8, max_limit=8)
+
+    for _ in range(40):
+        limiter._on_success(0.5, limiter._epoch)
+    # Half of the recent window is slow
+    for _ in range(5):
+        limiter._on_success(5.0, limiter._epoch)
+    assert limiter.limit == 4
+
+    # Too few samples at the new limit to judge it yet
+    for _ in range(3):
+        limiter._on_success(5.0, limiter._epoch)
+    assert limiter.limit == 4
+
+
+@pytest.mark.asyncio
+async def test_other_errors_do_not_change_the_limit():
+    """Test that non-throttling errors are counted but don't cut the limit"""
+    limiter = AdaptiveLimiter(4, max_limit=16)
+
+    await failing_request(limiter, ValueError("bad request"))
+
+    assert limiter.limit == 4
+    assert limiter.metrics()["errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fixed_limit_bounds_concurrency():
+    """Test that a non adaptive limiter never runs more than its limit"""
+    limiter = AdaptiveLimiter(3, adaptive=False)
+    active = 0
+    max_active = 0
+
+    async def tracked():
+        nonlocal active, max_active
+        async with limiter.slot():
+            active += 1
+            max_active = max(max_active, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    await asyncio.gather(*(tracked() for _ in range(10)))
+    await failing_request(limiter, ThrottledError())
+
+    assert max_active == 3
+    assert limiter.limit == 3
+
+
+def test_is_throttling_error():
+    """Test which errors count as throttling"""
+    response_error = Exception()
+    response_error.response = MagicMock(status_code=503)
+
+    assert is_throttling_error(ThrottledError())
+    assert is_throttling_error(asyncio.TimeoutError())
+    assert is_throttling_error(response_error)
+    assert not is_throttling_error(ValueError())
+
+
+def test_limiter_follows_model_config(mock_model_config):
+    """Test that adaptive concurrency is opt-in per model"""
+    model = MagicMock(max_concurrent_tasks=4, model_config=mock_model_config)
+    assert not AdaptiveLimiter.for_model(model).adaptive
+
+    mock_model_config.adaptive_concurrency = True
+    limiter = AdaptiveLimiter.for_model(model)
+    assert limiter.adaptive
+    assert (limiter.limit, limiter.max_limit) == (4, 64)
@@ -0,0 +1,171 @@
+import json
+import pytest
+import random
+import statistics
+import sys
+import os
+from tests.fixtures.test_utils import (
+    create_assets,
+    create_dataset_file,
+    create_experiment_config,
+    create_sqlite_tracer,
+)
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.early_stopping import EarlyStopping, RunningStats  # noqa: E402
+from promptlab.evaluator.evaluator import Evaluator  # noqa: E402
+from promptlab.experiment import Experiment  # noqa: E402
+from promptlab.types import EarlyStoppingConfig, EvaluationConfig  # noqa: E402
+from promptlab.utils import Utils  # noqa: E402
+
+
+class ScoreEvaluator(Evaluator):
+    """Scores a record by the parity of its id"""
+
+    def evaluate(self, data: dict):
+        return 0.5 + int(data["record_id"]) % 2 * 0.01
+
+
+def make_experiment(tmp_path, records=200):
+    tracer = create_sqlite_tracer(tmp_path)
+    create_assets(tracer, create_dataset_file(tmp_path, records))
+    return Experiment(tracer)
+
+
+def make_experiment_config(early_stopping):
+    return create_experiment_config(
+        evaluation=[
+            EvaluationConfig(
+                metric="Score",
+                column_mapping={"record_id": "id"},
+                evaluator=ScoreEvaluator(),
+            )
+        ],
+        evaluation_batch_size=10,
+        early_stopping=early_stopping,
+    )
+
+
+def records_evaluated(tracer, experiment_id):
+    return tracer.db_client.fetch_data(
+        "SELECT records_evaluated FROM experiments WHERE experiment_id = ?",
+        (experiment_id,),
+    )[0]["records_evaluated"]
+
+
+def test_running_stats_match_batch_statistics():
+    """Test that the streaming mean and variance match the batch ones"""
+    values = [0.2, 0.9, 0.4, 0.4, 0.7, 0.1]
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+
+    assert stats.mean == pytest.approx(statistics.mean(values))
+    assert stats.variance == pytest.approx(statistics.variance(values))
+
+
+def test_checking_after_every_record_keeps_the_error_rate():
+    """Test that the interval rarely excludes the true mean at any record"""
+    rng = random.Random(0)
+    early_stopping = EarlyStopping(
+        EarlyStoppingConfig(metric="Score", max_interval_width=0.1)
+    )
+    runs, misses = 200, 0
+    for _ in range(runs):
+        stats = RunningStats()
+        for _ in range(500):
+            stats.add(rng.gauss(0, 1))
+            low, high = stats.confidence_sequence(
+                early_stopping.alpha, early_stopping.rho
+            )
+            if stats.count >= 30 and not low <= 0 <= high:
+                misses += 1
+                break
+
+    assert misses / runs <= 0.05
+
+
+def test_shuffled_dataset_is_a_permutation(tmp_path):
+    """Test that shuffled records are all read back, in a seeded order"""
+    dataset_file = tmp_path / "dataset.jsonl"
+    with open(dataset_file, "w") as file:
+        for i in range(20):
+            file.write(json.dumps({"id": i}) + "\n\n")
+
+    first = [
+        record["id"] for record in Utils.stream_dataset_shuffled(str(dataset_file), 1)
+    ]
+    second = [
+        record["id"] for record in Utils.stream_dataset_shuffled(str(dataset_file), 1)
+    ]
+
+    assert sorted(first) == list(range(20))
+    assert first != list(range(20))
+    assert first == second
+
+
+def test_experiment_stops_once_interval_is_narrow(tmp_path):
+    """Test that a run stops early and records how many records it used"""
+    experiment = make_experiment(tmp_path)
+
+    experiment_id = experiment.run(
+        make_experiment_config(
+            {
+                "metric": "Score",
+                "max_interval_width": 0.01,
+                "min_records": 20,
+                "seed": 0,
+            }
+        )
+    )
+
+    summary = experiment.run_metrics["early_stopping"]
+    assert summary["stopped"]
+    assert 20 <= summary["records"] < 200
+    assert summary["interval"][1] - summary["interval"][0] <= 0.01
+    assert records_evaluated(experiment.tracer, experiment_id) == summary["records"]
+
+
+@pytest.mark.asyncio
+async def test_async_experiment_stops_on_baseline_decision(tmp_path):
+    """Test that run_async stops once the comparison to a baseline is decided"""
+    experiment = make_experiment(tmp_path)
+    baseline_id = await experiment.run_async(make_experiment_config(None))
+
+    class BetterEvaluator(ScoreEvaluator):
+        def evaluate(self, data: dict):
+            return super().evaluate(data) + 0.02
+
+    experiment_config = make_experiment_config(
+        {"metric": "Score", "baseline_experiment_id": baseline_id, "min_records": 10}
+    )
+    experiment_config["evaluation"][0].evaluator = BetterEvaluator()
+    experiment_id = await experiment.run_async(experiment_config)
+
+    summary = experiment.run_metrics["early_stopping"]
+    assert summary["baseline"]["decision"] == "better"
+    assert records_evaluated(experiment.tracer, experiment_id) < 200
+    assert records_evaluated(experiment.tracer, baseline_id) == 200
+
+
+def test_undecided_comparison_does_not_stop():
+    early_stopping = EarlyStopping(
+        EarlyStoppingConfig(
+            metric="Score", baseline_experiment_id="baseline", min_records=2
+        ),
+        baseline={"0": 0.5, "1": 0.5, "2": 0.5},
+    )
+    for record_id, value in enumerate([0.4, 0.6, 0.5]):
+        early_stopping.update(
+            record_id, json.dumps([{"metric": "Score", "result": value}])
+        )
+
+    assert early_stopping.decision() is None
+    assert not early_stopping.should_stop()
+
+
+def test_early_stopping_needs_a_stopping_rule():
+    with pytest.raises(ValueError):
+        EarlyStoppingConfig(metric="Score")
@@ -0,0 +1,126 @@
+import sys
+import os
+import numpy as np
+import pytest
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.cache.embedding_cache import CachedEmbedding, EmbeddingCache  # noqa: E402
+from promptlab.db.sqlite import SQLiteClient  # noqa: E402
+from promptlab.model.model import EmbeddingModel  # noqa: E402
+from promptlab.types import ModelConfig  # noqa: E402
+
+
+class CountingEmbedding(EmbeddingModel):
+    def __init__(self, deployment="mock-embedding"):
+        super().__init__(
+            ModelConfig(type="mock", embedding_model_deployment=deployment)
+        )
+        self.texts = []
+
+    def __call__(self, text):
+        self.texts.append(text)
+        return [float(len(text)), 1.0, 0.5]
+
+
+def test_embeddings_round_trip_as_float32(tmp_path):
+    """Test that embeddings are stored as float32 and read back without a copy"""
+    cache = EmbeddingCache(SQLiteClient(str(tmp_path / "promptlab.db")))
+    model_config = ModelConfig(type="mock", embedding_model_deployment="e")
+
+    cache.put(model_config, "text", [0.1, 0.2, 0.3])
+    embedding = cache.get(model_config, "text")
+
+    assert embedding.dtype == np.float32
+    assert not embedding.flags.owndata
+    np.testing.assert_allclose(embedding, [0.1, 0.2, 0.3], rtol=1e-6)
+    assert cache.get(model_config, "other text") is None
+
+
+def test_cached_embedding_only_embeds_new_texts(tmp_path):
+    """Test that a re-run only embeds texts that were not seen before"""
+    db_client = SQLiteClient(str(tmp_path / "promptlab.db"))
+    model = CountingEmbedding()
+
+    first_run = CachedEmbedding(model, EmbeddingCache(db_client))
+    first_run("reference")
+    first_run("inference v1")
+
+    second_run = CachedEmbedding(model, EmbeddingCache(db_client))
+    second_run("reference")
+    embedding = second_run("inference v2")
+
+    assert model.texts == ["reference", "inference v1", "inference v2"]
+    assert second_run.cache.stats() == {"hits": 1, "misses": 1}
+    np.testing.assert_allclose(embedding, [12.0, 1.0, 0.5])
+
+
+def test_cache_is_keyed_on_deployment(tmp_path):
+    """Test that embeddings from different deployments are not mixed up"""
+    cache = EmbeddingCache(SQLiteClient(str(tmp_path / "promptlab.db")))
+    model_a = CountingEmbedding("embedding-a")
+    model_b = CountingEmbedding("embedding-b")
+
+    CachedEmbedding(model_a, cache)("text")
+    CachedEmbedding(model_b, cache)("text")
+
+    assert model_a.texts == ["text"]
+    assert model_b.texts == ["text"]
+
+
+class BatchingEmbedding(CountingEmbedding):
+    max_batch_size = 2
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def _embed_batch(self, texts):
+        self.batches.append(list(texts))
+        return [self(text) for text in texts]
+
+
+def test_embed_many_packs_unique_texts_into_batches():
+    """Test that embed_many dedupes texts and respects the provider batch size"""
+    model = BatchingEmbedding()
+
+    embeddings = model.embed_many(["a", "bb", "a", "ccc", "dddd"])
+
+    assert model.batches == [["a", "bb"], ["ccc", "dddd"]]
+    assert [embedding[0] for embedding in embeddings] == [1.0, 2.0, 1.0, 3.0, 4.0]
+
+
+def test_cached_embed_many_only_embeds_new_texts(tmp_path):
+    """Test that the batched path also reads from and fills the cache"""
+    db_client = SQLiteClient(str(tmp_path / "promptlab.db"))
+    model = BatchingEmbedding()
+
+    CachedEmbedding(model, EmbeddingCache(db_client)).embed_many(["a", "bb"])
+    embeddings = CachedEmbedding(model, EmbeddingCache(db_client)).embed_many(
+        ["bb", "ccc", "ccc"]
+    )
+
+    assert model.batches == [["a", "bb"], ["ccc"]]
+    np.testing.assert_allclose(embeddings[2], [3.0, 1.0, 0.5])
+
+
+class FailingEmbedding(BatchingEmbedding):
+    def _embed_batch(self, texts):
+        raise ConnectionError("provider unavailable")
+
+
+def test_failures_and_zero_vectors_are_not_cached(tmp_path):
+    """Test that a failed or empty embedding never reaches the cache"""
+    db_client = SQLiteClient(str(tmp_path / "promptlab.db"))
+    model = FailingEmbedding()
+    model.retry_policy.max_attempts = 1
+
+    with pytest.raises(ConnectionError):
+        CachedEmbedding(model, EmbeddingCache(db_client)).embed_many(["a"])
+
+    cache = EmbeddingCache(db_client)
+    cache.put_many(model.model_config, ["zeros", "nan"], [[0.0, 0.0], [np.nan, 1]])
+    cache.put(model.model_config, "zeros", [0.0, 0.0])
+
+    assert cache.get_many(model.model_config, ["a", "zeros", "nan"]) == [None] * 3
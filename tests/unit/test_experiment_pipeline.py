@@ -0,0 +1,280 @@
+import asyncio
+import json
+import pytest
+import sys
+import time
+import os
+import types
+from unittest.mock import MagicMock, patch
+from tests.fixtures.test_utils import MockModel, create_mock_experiment_config
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.evaluator.evaluation_plan import EvaluationPlan  # noqa: E402
+from promptlab.evaluator.evaluator import Evaluator  # noqa: E402
+from promptlab.evaluator.evaluator_factory import EvaluatorFactory  # noqa: E402
+from promptlab.experiment import Experiment  # noqa: E402
+from promptlab.model.model import EmbeddingModel  # noqa: E402
+from promptlab.types import InferenceResult, ModelConfig  # noqa: E402
+from promptlab.utils import Utils  # noqa: E402
+
+
+class BatchingEmbedding(EmbeddingModel):
+    max_batch_size = 16
+
+    def __init__(self):
+        super().__init__(ModelConfig(type="mock", embedding_model_deployment="e"))
+        self.batches = []
+
+    def __call__(self, text):
+        return [1.0, float(len(text))]
+
+    def _embed_batch(self, texts):
+        self.batches.append(list(texts))
+        return [self(text) for text in texts]
+
+
+def test_stream_dataset_is_lazy(tmp_path):
+    """Test that dataset records are read one line at a time"""
+    dataset_file = tmp_path / "dataset.jsonl"
+    with open(dataset_file, "w") as file:
+        for i in range(3):
+            file.write(json.dumps({"id": i, "text": f"text {i}"}) + "\n")
+        file.write("\n")
+
+    records = Utils.stream_dataset(str(dataset_file))
+
+    assert isinstance(records, types.GeneratorType)
+    assert next(records) == {"id": 0, "text": "text 0"}
+    assert [record["id"] for record in records] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_async_pipeline_pulls_records_lazily():
+    """Test that run_async never holds more records than the concurrency window"""
+    window = 3
+    pulled = 0
+    max_outstanding = 0
+
+    model = MockModel(delay_seconds=0.01)
+    model.max_concurrent_tasks = window
+    completed = []
+    original_ainvoke = model.ainvoke
+
+    async def tracked_ainvoke(system_prompt, user_prompt):
+        result = await original_ainvoke(system_prompt, user_prompt)
+        completed.append(user_prompt)
+        return result
+
+    model.ainvoke = tracked_ainvoke
+
+    def dataset():
+        nonlocal pulled, max_outstanding
+        for i in range(20):
+            pulled += 1
+            max_outstanding = max(max_outstanding, pulled - len(completed))
+            yield {"id": i, "text": f"text {i}"}
+
+    tracer = MagicMock()
+
+    tracer.trace_result.return_value = 0
+
+    tracer.flush.return_value = 0
+    experiment = Experiment(tracer)
+    await experiment.init_batch_eval_async(
+        dataset(),
+        "system",
+        "user <text>",
+        ["text"],
+        create_mock_experiment_config(model),
+    )
+
+    assert tracer.trace_result.call_count == 20
+    assert max_outstanding <= window + 1
+
+
+def test_resume_skips_completed_records():
+    """Test that resuming an experiment only runs the remaining records"""
+    tracer = MagicMock()
+    tracer.trace_result.return_value = 0
+    tracer.flush.return_value = 0
+    tracer.experiment_exists.return_value = True
+    tracer.get_completed_record_ids.return_value = {"0", "1", "3"}
+
+    model = MockModel(delay_seconds=0)
+    experiment_config = create_mock_experiment_config(model)
+    experiment_config.experiment_id = "existing"
+
+    dataset = [{"id": i, "text": f"text {i}"} for i in range(5)]
+    experiment_id = Experiment(tracer).init_batch_eval(
+        dataset, "system", "user <text>", ["text"], experiment_config
+    )
+
+    assert experiment_id == "existing"
+    tracer.start_experiment.assert_not_called()
+    traced = [
+        call.args[0]["dataset_record_id"] for call in tracer.trace_result.call_args_list
+    ]
+    assert traced == [2, 4]
+    # Traced records are looked up for the records read, not loaded at once
+    tracer.get_completed_record_ids.assert_called_once_with(
+        "existing", ["0", "1", "2", "3", "4"]
+    )
+
+
+def similarity_evaluation():
+    evaluation = MagicMock()
+    evaluation.metric = "SemanticSimilarity"
+    evaluation.column_mapping = {"response": "$inference", "reference": "text"}
+    evaluation.evaluator = None
+    return [evaluation]
+
+
+def test_similarity_embeddings_are_batched_per_chunk():
+    """Test that SemanticSimilarity embeds a whole chunk of records at once"""
+    tracer = MagicMock()
+    tracer.trace_result.return_value = 0
+    tracer.flush.return_value = 0
+    experiment_config = create_mock_experiment_config(
+        MockModel(delay_seconds=0), similarity_evaluation()
+    )
+    embedding_model = BatchingEmbedding()
+    experiment_config.embedding_model = embedding_model
+
+    dataset = [{"id": i, "text": f"text {i}"} for i in range(6)]
+    Experiment(tracer).init_batch_eval(
+        dataset, "system", "user <text>", ["text"], experiment_config
+    )
+
+    # Two chunks of at most 4 records, each embedding responses and references
+    assert [len(batch) for batch in embedding_model.batches] == [8, 4]
+    assert tracer.trace_result.call_count == 6
+    evaluation = json.loads(tracer.trace_result.call_args.args[0]["evaluation"])
+    assert evaluation[0]["metric"] == "SemanticSimilarity"
+    assert 0 < evaluation[0]["result"] <= 1
+
+
+@pytest.mark.asyncio
+async def test_async_similarity_embeddings_are_batched_per_chunk():
+    """Test that the async pipeline evaluates inferred records in chunks"""
+    tracer = MagicMock()
+    tracer.trace_result.return_value = 0
+    tracer.flush.return_value = 0
+    experiment_config = create_mock_experiment_config(
+        MockModel(delay_seconds=0.01), similarity_evaluation()
+    )
+    embedding_model = BatchingEmbedding()
+    experiment_config.embedding_model = embedding_model
+
+    dataset = [{"id": i, "text": f"text {i}"} for i in range(10)]
+    await Experiment(tracer).init_batch_eval_async(
+        dataset, "system", "user <text>", ["text"], experiment_config
+    )
+
+    assert len(embedding_model.batches) == 3
+    traced = [
+        call.args[0]["dataset_record_id"] for call in tracer.trace_result.call_args_list
+    ]
+    assert sorted(traced) == list(range(10))
+
+
+def test_evaluation_plan_is_compiled_once():
+    """Test that evaluators are created once per experiment, not per record"""
+    tracer = MagicMock()
+    tracer.trace_result.return_value = 0
+    tracer.flush.return_value = 0
+    experiment_config = create_mock_experiment_config(
+        MockModel(delay_seconds=0), similarity_evaluation()
+    )
+    experiment_config.embedding_model = BatchingEmbedding()
+
+    dataset = [{"id": i, "text": f"text {i}"} for i in range(10)]
+    with patch(
+        "promptlab.evaluator.evaluation_plan.EvaluatorFactory.get_evaluator",
+        wraps=EvaluatorFactory.get_evaluator,
+    ) as get_evaluator:
+        Experiment(tracer).init_batch_eval(
+            dataset, "system", "user <text>", ["text"], experiment_config
+        )
+
+    assert get_evaluator.call_count == 1
+    assert tracer.trace_result.call_count == 10
+
+
+class SlowEvaluator(Evaluator):
+    def evaluate(self, data):
+        return data["response"]
+
+    async def aevaluate_batch(self, data):
+        await asyncio.sleep(0.2)
+        return [record["response"] for record in data]
+
+
+@pytest.mark.asyncio
+async def test_metrics_run_concurrently():
+    """Test that a chunk's metrics are evaluated concurrently in async mode"""
+    evaluations = []
+    for metric in ("first", "second", "third"):
+        evaluation = MagicMock()
+        evaluation.metric = metric
+        evaluation.column_mapping = {"response": "$inference"}
+        evaluation.evaluator = SlowEvaluator()
+        evaluations.append(evaluation)
+    plan = EvaluationPlan(
+        create_mock_experiment_config(MockModel(delay_seconds=0), evaluations)
+    )
+
+    start = time.perf_counter()
+    results = await plan.aevaluate_batch(["a", "b"], [{}, {}])
+
+    assert time.perf_counter() - start < 0.4
+    assert json.loads(results[1]) == [
+        {"metric": "first", "result": "b"},
+        {"metric": "second", "result": "b"},
+        {"metric": "third", "result": "b"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_judge_requests_share_the_model_concurrency_limit():
+    """Test that inference and judge calls together respect max_concurrent_tasks"""
+    active = 0
+    max_active = 0
+
+    model = MockModel(delay_seconds=0)
+    model.max_concurrent_tasks = 2
+
+    async def tracked_ainvoke(system_prompt, user_prompt):
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return InferenceResult(
+            inference="4", prompt_tokens=1, completion_tokens=1, latency_ms=10
+        )
+
+    model.ainvoke = tracked_ainvoke
+    evaluation = MagicMock()
+    evaluation.metric = "Fluency"
+    evaluation.column_mapping = {"response": "$inference"}
+    evaluation.evaluator = None
+
+    tracer = MagicMock()
+
+    tracer.trace_result.return_value = 0
+
+    tracer.flush.return_value = 0
+    dataset = [{"id": i, "text": f"text {i}"} for i in range(12)]
+    await Experiment(tracer).init_batch_eval_async(
+        dataset,
+        "system",
+        "user <text>",
+        ["text"],
+        create_mock_experiment_config(model, [evaluation]),
+    )
+
+    assert tracer.trace_result.call_count == 12
+    assert max_active <= 2
+    assert model.limiter is None
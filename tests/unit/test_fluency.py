@@ -0,0 +1,48 @@
+import asyncio
+import pytest
+import sys
+import os
+from tests.fixtures.test_utils import MockModel
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.evaluator.fluency import Fluency  # noqa: E402
+
+
+class JudgeModel(MockModel):
+    def __init__(self):
+        super().__init__(delay_seconds=0.01)
+        self.max_concurrent_tasks = 2
+        self.sync_calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    def invoke(self, system_prompt, user_prompt):
+        self.sync_calls += 1
+        return super().invoke(system_prompt, user_prompt)
+
+    async def ainvoke(self, system_prompt, user_prompt):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay_seconds)
+        finally:
+            self.active -= 1
+        return await super().ainvoke(system_prompt, "4")
+
+
+@pytest.mark.asyncio
+async def test_aevaluate_batch_uses_async_client():
+    """Test that Fluency judges a chunk natively async, within the model limit"""
+    judge = JudgeModel()
+    evaluator = Fluency()
+    evaluator.inference = judge
+
+    results = await evaluator.aevaluate_batch(
+        [{"response": f"response {i}"} for i in range(6)]
+    )
+
+    assert results == ["Async response to: 4"] * 6
+    assert judge.sync_calls == 0
+    assert judge.max_active == 2
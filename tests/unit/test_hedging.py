@@ -0,0 +1,154 @@
+import asyncio
+import time
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.model.concurrency import AdaptiveLimiter  # noqa: E402
+from promptlab.model.hedging import Hedger  # noqa: E402
+from promptlab.model.model import Model  # noqa: E402
+from promptlab.model.rate_limit import RateLimiter  # noqa: E402
+from promptlab.types import InferenceResult, ModelConfig  # noqa: E402
+
+
+class SlowModel(Model):
+    async def ainvoke(self, system_prompt, user_prompt):
+        await asyncio.sleep(0.05)
+        return InferenceResult(
+            inference="ok", prompt_tokens=1, completion_tokens=1, latency_ms=50
+        )
+
+    def invoke(self, system_prompt, user_prompt):
+        raise AssertionError("the async path must not use invoke")
+
+
+def make_hedger(**kwargs):
+    hedger = Hedger(percentile=90, min_samples=5, **kwargs)
+    hedger._latencies.extend([0.01] * 10)
+    return hedger
+
+
+def make_request(*delays, error=None):
+    calls = []
+    cancelled = []
+
+    async def request():
+        call = len(calls)
+        calls.append(call)
+        try:
+            await asyncio.sleep(delays[call])
+        except asyncio.CancelledError:
+            cancelled.append(call)
+            raise
+        if error is not None and call == 0:
+            raise error
+        return call
+
+    return request, calls, cancelled
+
+
+@pytest.mark.asyncio
+async def test_slow_request_is_hedged():
+    """Test that a straggler is duplicated and the faster copy wins"""
+    hedger = make_hedger(budget=1.0)
+    request, calls, cancelled = make_request(1.0, 0.01)
+
+    start = time.perf_counter()
+    result = await hedger.run(request)
+
+    assert result == 1
+    assert time.perf_counter() - start < 0.5
+    await asyncio.sleep(0)
+    assert cancelled == [0]
+    assert hedger.stats() == {"requests": 1, "hedged": 1, "hedge_wins": 1}
+
+
+@pytest.mark.asyncio
+async def test_fast_request_is_not_hedged():
+    """Test that requests faster than the percentile are sent once"""
+    hedger = make_hedger(budget=1.0)
+    request, calls, _ = make_request(0.0)
+
+    assert await hedger.run(request) == 0
+    assert calls == [0]
+
+
+@pytest.mark.asyncio
+async def test_budget_caps_hedging():
+    """Test that no more than the budget share of requests is hedged"""
+    hedger = make_hedger(budget=0.0)
+    request, calls, _ = make_request(0.05)
+
+    assert await hedger.run(request) == 0
+    assert calls == [0]
+    assert hedger.stats()["hedged"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_copy_leaves_the_other_a_chance():
+    """Test that a failing original doesn't fail a request whose hedge succeeds"""
+    hedger = make_hedger(budget=1.0)
+    request, _, _ = make_request(0.05, 0.1, error=ConnectionError())
+
+    assert await hedger.run(request) == 1
+
+
+@pytest.mark.asyncio
+async def test_hedger_times_only_the_provider_call():
+    """Test that the wait for a concurrency slot doesn't count as latency"""
+    model = SlowModel(ModelConfig(type="mock", hedge_percentile=95))
+    model.limiter = AdaptiveLimiter(1, max_limit=1)
+
+    results = await asyncio.gather(*(model("system", str(i)) for i in range(4)))
+
+    # Each request waited for the ones ahead of it before being sent
+    assert max(result.timings["queue_wait"] for result in results) > 0.1e9
+    assert len(model.hedger._latencies) == 4
+    assert max(model.hedger._latencies) < 0.09
+
+
+@pytest.mark.asyncio
+async def test_hedge_reserves_quota_and_a_slot_of_its_own():
+    """Test that a hedge is rate limited and counted in flight like any request"""
+    in_flight = []
+
+    class CountingModel(SlowModel):
+        async def ainvoke(self, system_prompt, user_prompt):
+            in_flight.append(self.limiter.in_flight)
+            return await super().ainvoke(system_prompt, user_prompt)
+
+    model = CountingModel(ModelConfig(type="mock"))
+    model.hedger = make_hedger(budget=1.0)
+    model.limiter = AdaptiveLimiter(4)
+    model.rate_limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=10**6)
+
+    with (
+        patch.object(
+            model.rate_limiter, "aacquire", wraps=model.rate_limiter.aacquire
+        ) as aacquire,
+        patch.object(
+            model.rate_limiter, "settle", wraps=model.rate_limiter.settle
+        ) as settle,
+    ):
+        await model("system", "user")
+
+    # Both copies reserved a request and held a slot, and the cancelled
+    # hedge keeps its estimate charged
+    assert in_flight == [1, 2]
+    assert aacquire.call_count == 2
+    assert settle.call_count == 1
+
+
+def test_hedging_is_opt_in():
+    """Test that models only hedge when a percentile is configured"""
+    assert Hedger.for_config(ModelConfig(type="mock")) is None
+
+    hedger = Hedger.for_config(
+        ModelConfig(type="mock", hedge_percentile=99, hedge_budget=0.1)
+    )
+    assert (hedger.percentile, hedger.budget) == (99, 0.1)
+    assert hedger.delay() is None
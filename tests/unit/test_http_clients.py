@@ -0,0 +1,205 @@
+import asyncio
+import importlib.util
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+
+import httpx
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.cache.embedding_cache import SharedEmbedding  # noqa: E402
+from promptlab.experiment import Experiment  # noqa: E402
+from promptlab.model.azure_openai import AzOpenAI, AzOpenAI_Embedding  # noqa: E402
+from promptlab.model.concurrency import AdaptiveLimiter  # noqa: E402
+from promptlab.model.deepseek import DeepSeek, DeepSeek_Embedding  # noqa: E402
+from promptlab.model.http_clients import SharedClients  # noqa: E402
+from promptlab.types import ModelConfig  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def registry():
+    SharedClients.close_all()
+    yield
+    SharedClients.close_all()
+
+
+def azure_config(**kwargs):
+    config = {
+        "type": "azure_openai",
+        "api_key": "key",
+        "api_version": "2024-10-21",
+        "endpoint": "https://example.openai.azure.com",
+        "inference_model_deployment": "gpt-4o",
+        "embedding_model_deployment": "text-embedding-3-small",
+    }
+    config.update(kwargs)
+    return ModelConfig(**config)
+
+
+def test_models_with_same_endpoint_share_clients():
+    inference = AzOpenAI(azure_config())
+    judge = AzOpenAI(azure_config())
+    embedding = AzOpenAI_Embedding(azure_config())
+
+    assert inference.clients.client is judge.clients.client
+    assert inference.clients.client is embedding.clients.client
+
+    other_key = AzOpenAI(azure_config(api_key="other"))
+    other_version = AzOpenAI(azure_config(api_version="2025-01-01"))
+    assert other_key.clients.client is not inference.clients.client
+    assert other_version.clients.client is not inference.clients.client
+
+    deepseek = DeepSeek(
+        ModelConfig(
+            type="deepseek",
+            api_key="key",
+            endpoint="https://api.deepseek.com",
+            inference_model_deployment="deepseek-chat",
+        )
+    )
+    deepseek_embedding = DeepSeek_Embedding(deepseek.model_config)
+    assert deepseek.clients.client is deepseek_embedding.clients.client
+    assert deepseek.clients.client is not inference.clients.client
+
+
+def test_embeddings_share_limiter_of_same_endpoint():
+    inference = AzOpenAI(azure_config())
+    inference.limiter = AdaptiveLimiter(4)
+    embedding = AzOpenAI_Embedding(azure_config())
+    other = AzOpenAI_Embedding(azure_config(endpoint="https://other.azure.com"))
+
+    with Experiment._limit_embeddings(SharedEmbedding(embedding), [inference]):
+        assert embedding.limiter is inference.limiter
+    assert embedding.limiter is None
+
+    with Experiment._limit_embeddings(other, [inference]):
+        assert other.limiter is not None
+        assert other.limiter is not inference.limiter
+
+
+def test_single_text_embeddings_are_retried():
+    """Test that __call__ goes through the retry policy like batches do"""
+    embedding = AzOpenAI_Embedding(azure_config(retry_base_delay=0))
+    requests = []
+
+    def create(input, model):
+        requests.append(input)
+        if len(requests) == 1:
+            raise httpx.ConnectError("reset")
+        return SimpleNamespace(data=[SimpleNamespace(index=0, embedding=[1.0])])
+
+    embedding.clients = SimpleNamespace(
+        client=SimpleNamespace(embeddings=SimpleNamespace(create=create))
+    )
+
+    assert embedding("text") == [1.0]
+    assert requests == [["text"], ["text"]]
+
+
+def test_pool_settings():
+    clients = AzOpenAI(
+        azure_config(max_concurrent_tasks=12, keepalive_expiry=90.0)
+    ).clients
+    assert clients.limits.max_connections == 12
+    assert clients.limits.max_keepalive_connections == 12
+    assert clients.limits.keepalive_expiry == 90.0
+
+    # A model created later on the same endpoint enlarges the shared pool
+    configured = AzOpenAI(azure_config(max_connections=40)).clients
+    assert configured.limits.max_connections == 40
+    assert clients.limits.max_connections == 40
+    assert configured.client is clients.client
+
+
+def test_models_with_different_concurrency_share_one_pool():
+    inference = AzOpenAI(azure_config(max_concurrent_tasks=20))
+    embedding = AzOpenAI_Embedding(azure_config())
+
+    assert inference.clients.key == embedding.clients.key
+    assert inference.clients.client is embedding.clients.client
+    assert embedding.clients.limits.max_connections == 20
+
+    inference.limiter = AdaptiveLimiter(20)
+    with Experiment._limit_embeddings(embedding, [inference]):
+        assert embedding.limiter is inference.limiter
+
+
+def test_async_clients_are_per_event_loop():
+    model = AzOpenAI(azure_config())
+
+    async def async_client():
+        return model.clients.async_client, model.clients.async_client
+
+    first, same = asyncio.run(async_client())
+    second, _ = asyncio.run(async_client())
+
+    assert first is same
+    assert first is not second
+
+
+@pytest.mark.skipif(
+    importlib.util.find_spec("h2") is not None, reason="h2 is installed"
+)
+def test_http2_requires_h2():
+    with pytest.raises(ValueError, match="h2"):
+        AzOpenAI(azure_config(http2=True))
+
+
+def test_awarm_opens_connections_ahead_of_run():
+    async def run():
+        connections = []
+
+        async def handle(reader, writer):
+            connections.append(writer)
+            while await reader.readuntil(b"\r\n\r\n"):
+                # Answer slowly, so concurrent requests need connections of
+                # their own
+                await asyncio.sleep(0.05)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        model = DeepSeek(
+            ModelConfig(
+                type="deepseek",
+                api_key="key",
+                endpoint=f"http://127.0.0.1:{port}/v1",
+                inference_model_deployment="deepseek-chat",
+                max_concurrent_tasks=4,
+            )
+        )
+
+        await model.awarm()
+        warmed = len(connections)
+
+        # Requests of the run reuse the warm connections
+        http_client = model.clients._async_entry()[1]
+        await asyncio.gather(
+            *(http_client.get(f"http://127.0.0.1:{port}/v1") for _ in range(4))
+        )
+
+        await http_client.aclose()
+        server.close()
+        return warmed, len(connections)
+
+    warmed, total = asyncio.run(run())
+
+    assert warmed == 4
+    assert total == 4
+
+
+def test_warm_ignores_unreachable_endpoint():
+    model = DeepSeek(
+        ModelConfig(
+            type="deepseek",
+            api_key="key",
+            endpoint="http://127.0.0.1:9/v1",
+            inference_model_deployment="deepseek-chat",
+        )
+    )
+
+    model.warm()
@@ -0,0 +1,137 @@
+import time
+import pytest
+import sys
+import os
+from tests.fixtures.test_utils import MockModel
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.cache.inference_cache import InferenceCache  # noqa: E402
+from promptlab.db.sqlite import SQLiteClient  # noqa: E402
+from promptlab.types import CacheConfig, InferenceResult  # noqa: E402
+
+
+class CountingModel(MockModel):
+    def __init__(self):
+        super().__init__(delay_seconds=0)
+        self.calls = 0
+
+    def invoke(self, system_prompt, user_prompt):
+        self.calls += 1
+        return super().invoke(system_prompt, user_prompt)
+
+    async def ainvoke(self, system_prompt, user_prompt):
+        self.calls += 1
+        return await super().ainvoke(system_prompt, user_prompt)
+
+
+def make_cache(tmp_path, **kwargs):
+    db_client = SQLiteClient(str(tmp_path / "promptlab.db"))
+    return InferenceCache(db_client, CacheConfig(**kwargs))
+
+
+def make_result(inference):
+    return InferenceResult(
+        inference=inference, prompt_tokens=1, completion_tokens=2, latency_ms=3
+    )
+
+
+def test_cache_hit_and_miss(tmp_path):
+    """Test that cached responses are returned and counted"""
+    cache = make_cache(tmp_path)
+
+    assert cache.get("key") is None
+    cache.put("key", make_result("cached"))
+
+    assert cache.get("key") == make_result("cached")
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "entries": 1}
+
+
+def test_replacing_an_entry_does_not_count_it_again(tmp_path):
+    """Test that putting an existing key replaces it without a new entry"""
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.put("a", make_result("a"))
+    cache.put("b", make_result("b"))
+    cache.put("b", make_result("newer"))
+
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 0
+    assert cache.get("a") == make_result("a")
+    assert cache.get("b") == make_result("newer")
+
+
+def test_cache_key_depends_on_model_and_prompts(mock_model_config):
+    """Test that the cache key covers the model config and both prompts"""
+    key = InferenceCache.key(mock_model_config, "system", "user")
+
+    assert key == InferenceCache.key(mock_model_config, "system", "user")
+    assert key != InferenceCache.key(mock_model_config, "system", "other")
+    assert key != InferenceCache.key(mock_model_config, "other", "user")
+
+    mock_model_config.inference_model_deployment = "another-model"
+    assert key != InferenceCache.key(mock_model_config, "system", "user")
+
+
+def test_cache_ttl_eviction(tmp_path):
+    """Test that expired entries are treated as misses and removed"""
+    cache = make_cache(tmp_path, ttl_seconds=0.05)
+    cache.put("key", make_result("cached"))
+    time.sleep(0.1)
+
+    assert cache.get("key") is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_cache_lru_eviction(tmp_path):
+    """Test that the least recently used entries are evicted first"""
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.put("a", make_result("a"))
+    time.sleep(0.01)
+    cache.put("b", make_result("b"))
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.put("c", make_result("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_model_uses_cache(tmp_path):
+    """Test that repeated calls to a model are served from the cache"""
+    model = CountingModel()
+    model.cache = make_cache(tmp_path)
+
+    first = model("system", "user")
+    second = model("system", "user")
+
+    assert model.calls == 1
+    assert first == second
+
+
+def test_model_cache_bypass(tmp_path):
+    """Test that a bypassed cache always calls the model"""
+    model = CountingModel()
+    model.cache = make_cache(tmp_path, bypass=True)
+
+    model("system", "user")
+    model("system", "user")
+
+    assert model.calls == 2
+    assert model.cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_model_uses_cache_async(tmp_path):
+    """Test that the async call path is served from the cache"""
+    model = CountingModel()
+    model.cache = make_cache(tmp_path)
+
+    first = await model("system", "user")
+    second = await model("system", "user")
+
+    assert model.calls == 1
+    assert first == second
@@ -0,0 +1,152 @@
+import asyncio
+import pickle
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+
+import ollama
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.model.http_clients import SharedClients  # noqa: E402
+from promptlab.model.ollama import Ollama, Ollama_Embedding  # noqa: E402
+from promptlab.types import ModelConfig  # noqa: E402
+
+
+class FakeClient:
+    """Records the requests of every client created"""
+
+    instances = []
+
+    def __init__(self, host=None, **kwargs):
+        self.host = host
+        self.kwargs = kwargs
+        self.requests = []
+        self._client = SimpleNamespace(
+            base_url=host or "http://localhost:11434", close=lambda: None
+        )
+        FakeClient.instances.append(self)
+
+    def chat(self, **kwargs):
+        self.requests.append(kwargs)
+        return SimpleNamespace(
+            message=SimpleNamespace(content="Paris"),
+            prompt_eval_count=12,
+            eval_count=3,
+        )
+
+    def embed(self, **kwargs):
+        self.requests.append(kwargs)
+        inputs = kwargs["input"]
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        return {"embeddings": [[float(len(text))] for text in inputs]}
+
+
+class FakeAsyncClient(FakeClient):
+    async def chat(self, **kwargs):
+        return FakeClient.chat(self, **kwargs)
+
+    async def embed(self, **kwargs):
+        return FakeClient.embed(self, **kwargs)
+
+
+@pytest.fixture
+def fake_clients(monkeypatch):
+    FakeClient.instances = []
+    SharedClients.close_all()
+    monkeypatch.setattr(ollama, "Client", FakeClient)
+    monkeypatch.setattr(ollama, "AsyncClient", FakeAsyncClient)
+    yield FakeClient.instances
+    SharedClients.close_all()
+
+
+def make_config(**kwargs):
+    return ModelConfig(
+        type="ollama",
+        inference_model_deployment="llama3",
+        embedding_model_deployment="nomic-embed-text",
+        **kwargs,
+    )
+
+
+def test_invoke_uses_persistent_client_with_keep_alive(fake_clients):
+    model = Ollama(make_config(endpoint="http://gpu:11434", keep_alive="30m"))
+
+    first = model.invoke("system", "question")
+    model.invoke("system", "question")
+
+    client = model.clients.client
+    assert client.host == "http://gpu:11434"
+    assert len(fake_clients) == 1
+    assert len(client.requests) == 2
+    assert client.requests[0]["keep_alive"] == "30m"
+    assert client.requests[0]["model"] == "llama3"
+    assert first.inference == "Paris"
+    assert first.prompt_tokens == 12
+    assert first.completion_tokens == 3
+
+
+def test_connection_pool_matches_concurrency(fake_clients):
+    model = Ollama(make_config(max_concurrent_tasks=8))
+    assert model.clients.limits.max_connections == 8
+    assert model.clients.limits.max_keepalive_connections == 8
+
+    adaptive = Ollama(
+        make_config(
+            max_concurrent_tasks=4,
+            adaptive_concurrency=True,
+            max_adaptive_concurrency=32,
+        )
+    )
+    assert adaptive.clients.limits.max_connections == 32
+
+
+def test_ainvoke_reuses_async_client_within_loop(fake_clients):
+    model = Ollama(make_config(keep_alive=-1))
+
+    async def run():
+        results = await asyncio.gather(
+            *(model.ainvoke("system", f"question {i}") for i in range(5))
+        )
+        return results, model.clients.async_client
+
+    results, async_client = asyncio.run(run())
+
+    assert [result.inference for result in results] == ["Paris"] * 5
+    assert isinstance(async_client, FakeAsyncClient)
+    assert len(async_client.requests) == 5
+    assert async_client.requests[0]["keep_alive"] == -1
+    assert not model.clients.client.requests
+
+    # A later run on a new event loop gets a client of its own
+    _, next_async_client = asyncio.run(run())
+    assert next_async_client is not async_client
+
+
+def test_embedding_batches_sync_and_async(fake_clients):
+    embedding = Ollama_Embedding(make_config(keep_alive="1h"))
+
+    assert embedding.embed_many(["a", "bb"]) == [[1.0], [2.0]]
+    assert embedding("dddd") == [4.0]
+    assert asyncio.run(embedding.aembed_many(["ccc"])) == [[3.0]]
+
+    assert embedding.clients.client.requests[0]["input"] == ["a", "bb"]
+    assert embedding.clients.client.requests[0]["keep_alive"] == "1h"
+    async_requests = fake_clients[-1].requests
+    assert async_requests == [
+        {"model": "nomic-embed-text", "input": ["ccc"], "keep_alive": "1h"}
+    ]
+
+
+def test_pickled_model_shares_clients():
+    model = Ollama(make_config(max_concurrent_tasks=3, keep_alive="10m"))
+    client = model.clients.client
+
+    copy = pickle.loads(pickle.dumps(model))
+
+    assert isinstance(copy.clients.client, ollama.Client)
+    assert copy.clients.client is client
+    assert copy.clients.limits.max_connections == 3
+    assert copy.keep_alive == "10m"
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import pytest
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import MagicMock, patch
+from tests.fixtures.test_utils import MockModel
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.evaluator.evaluation_plan import EvaluationPlan  # noqa: E402
+from promptlab.evaluator.evaluator import Evaluator  # noqa: E402
+from promptlab import process_pool  # noqa: E402
+from promptlab.process_pool import ProcessPoolEvaluator, get_process_pool  # noqa: E402
+from promptlab.types import InferenceResult, ModelConfig  # noqa: E402
+
+
+class PidEvaluator(Evaluator):
+    def evaluate(self, data):
+        return [data["response"], os.getpid()]
+
+
+class LocalModel(MockModel):
+    def invoke(self, system_prompt, user_prompt):
+        return InferenceResult(
+            inference=str(os.getpid()),
+            prompt_tokens=1,
+            completion_tokens=1,
+            latency_ms=0,
+        )
+
+
+def test_process_evaluator_runs_in_workers_in_order():
+    """Test that a chunk is evaluated in worker processes, keeping record order"""
+    evaluator = PidEvaluator()
+    evaluator.inference = MagicMock()
+
+    results = ProcessPoolEvaluator(evaluator).evaluate_batch(
+        [{"response": i} for i in range(20)]
+    )
+
+    assert [response for response, _ in results] == list(range(20))
+    assert os.getpid() not in {pid for _, pid in results}
+
+
+@pytest.mark.asyncio
+async def test_evaluation_plan_selects_process_execution():
+    """Test that execution="process" on an evaluation runs it in the pool"""
+    evaluation = MagicMock()
+    evaluation.metric = "pid"
+    evaluation.column_mapping = {"response": "$inference"}
+    evaluation.evaluator = PidEvaluator()
+    evaluation.execution = "process"
+    experiment_config = MagicMock()
+    experiment_config.evaluation = [evaluation]
+
+    plan = EvaluationPlan(experiment_config)
+    results = await plan.aevaluate_batch(["a", "b"], [{}, {}])
+
+    assert isinstance(plan.steps[0][1], ProcessPoolEvaluator)
+    assert '"a"' in results[0] and str(os.getpid()) not in results[0]
+
+
+@pytest.mark.asyncio
+async def test_process_model_batches_calls():
+    """Test that concurrent calls to a process mode model share worker tasks"""
+    model = LocalModel(ModelConfig(type="mock", execution="process"), delay_seconds=0)
+    pool = get_process_pool()
+
+    with patch.object(pool, "submit", wraps=pool.submit) as submit:
+        results = await asyncio.gather(*(model("system", f"{i}") for i in range(10)))
+
+    # One batch, resent with the model if its worker didn't hold it yet
+    assert [call.args[2] for call in submit.call_args_list].count(None) == 1
+    assert all(result.inference != str(os.getpid()) for result in results)
+
+
+def test_workers_receive_the_evaluator_once():
+    """Test that batches only carry the key of an evaluator a worker holds"""
+    pool = ProcessPoolExecutor(max_workers=1)
+    evaluator = ProcessPoolEvaluator(PidEvaluator())
+
+    with patch.object(process_pool, "_pool", pool):
+        with patch.object(pool, "submit", wraps=pool.submit) as submit:
+            results = [evaluator.evaluate_batch([{"response": i}]) for i in range(3)]
+    pool.shutdown()
+
+    payloads = [call.args[2] for call in submit.call_args_list]
+    assert [response for [[response, _]] in results] == [0, 1, 2]
+    assert payloads[:2] == [None, evaluator.worker_evaluator._pickled()]
+    assert payloads[2:] == [None, None]
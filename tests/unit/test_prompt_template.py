@@ -0,0 +1,38 @@
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.utils import CompiledPromptTemplate, Utils  # noqa: E402
+
+
+def test_compiled_template_renders_variables():
+    """Test that variables are substituted in both prompts, keeping brackets"""
+    system_prompt, user_prompt, variables = Utils.split_prompt_template(
+        "<<system>> You answer in <language>. <<user>> <question> (<language>)"
+    )
+    template = CompiledPromptTemplate(system_prompt, user_prompt, variables)
+
+    assert template.render({"language": "French", "question": "Why?"}) == (
+        "You answer in <French>.",
+        "<Why?> (<French>)",
+    )
+
+
+def test_values_are_not_rendered_again():
+    """Test that a value containing a placeholder is inserted literally"""
+    template = CompiledPromptTemplate("<a>", "<ab> <a>", ["a", "ab"])
+
+    assert template.render({"a": "<ab>", "ab": 1}) == ("<<ab>>", "<1> <<ab>>")
+
+
+def test_render_many():
+    """Test that a chunk of records is rendered in one call"""
+    template = CompiledPromptTemplate("system", "user <text>", ["text"])
+
+    assert template.render_many([{"text": "a"}, {"text": "b"}]) == [
+        ("system", "user <a>"),
+        ("system", "user <b>"),
+    ]
+    assert CompiledPromptTemplate("s", "u <x>", []).render({}) == ("s", "u <x>")
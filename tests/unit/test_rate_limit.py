@@ -0,0 +1,79 @@
+import pytest
+import sys
+import os
+from tests.fixtures.test_utils import MockModel
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.model.rate_limit import RateLimiter, TokenBucket  # noqa: E402
+from promptlab.types import InferenceResult, ModelConfig  # noqa: E402
+
+
+def make_model_config(**kwargs):
+    return ModelConfig(type="mock", inference_model_deployment="rate-limited", **kwargs)
+
+
+def test_bucket_waits_once_the_burst_is_spent():
+    """Test that reservations beyond the burst have to wait for the refill"""
+    bucket = TokenBucket(per_minute=60, burst_seconds=2)
+
+    assert bucket.reserve(2) == 0
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+    assert bucket.reserve(1) == pytest.approx(2.0, abs=0.05)
+
+
+def test_settle_corrects_the_estimate():
+    """Test that actual token usage replaces the reserved estimate"""
+    limiter = RateLimiter(tokens_per_minute=6000)
+    capacity = limiter.tokens.capacity
+
+    estimated_tokens = limiter.acquire("s" * 40, "u" * 40)
+    assert estimated_tokens == 21
+    limiter.settle(
+        estimated_tokens,
+        InferenceResult(
+            inference="", prompt_tokens=20, completion_tokens=100, latency_ms=1
+        ),
+    )
+
+    assert limiter.tokens.balance == pytest.approx(capacity - 120, abs=1)
+
+
+def test_limiters_are_shared_per_model_config():
+    """Test that models built from the same config share one quota"""
+    first = MockModel(make_model_config(requests_per_minute=60), delay_seconds=0)
+    second = MockModel(make_model_config(requests_per_minute=60), delay_seconds=0)
+
+    assert first.rate_limiter is second.rate_limiter
+    assert MockModel(make_model_config(), delay_seconds=0).rate_limiter is None
+
+
+def test_model_calls_draw_from_the_quota():
+    """Test that sync and cached paths reserve a request per model call"""
+    model = MockModel(
+        make_model_config(requests_per_minute=6000, tokens_per_minute=60000),
+        delay_seconds=0,
+    )
+    requests_before = model.rate_limiter.requests.balance
+
+    model("system", "user")
+
+    assert model.rate_limiter.requests.balance == pytest.approx(
+        requests_before - 1, abs=0.5
+    )
+
+
+@pytest.mark.asyncio
+async def test_async_calls_wait_for_quota():
+    """Test that the async path holds requests back once the burst is spent"""
+    model = MockModel(
+        make_model_config(requests_per_minute=60, tokens_per_minute=10**6),
+        delay_seconds=0,
+    )
+    model.rate_limiter.requests.balance = 0
+
+    result = await model("system", "user")
+
+    assert result.inference == "Async response to: user"
+    assert model.rate_limiter.requests.balance < 0.1
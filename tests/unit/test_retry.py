@@ -0,0 +1,110 @@
+import pytest
+import sys
+import os
+from unittest.mock import MagicMock, patch
+from tests.fixtures.test_utils import MockModel
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.model.retry import (  # noqa: E402
+    RetryPolicy,
+    is_retryable_error,
+    retry_after_seconds,
+)
+from promptlab.types import ModelConfig  # noqa: E402
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = MagicMock(status_code=status_code, headers=headers or {})
+
+
+class FlakyModel(MockModel):
+    def __init__(self, errors):
+        super().__init__(
+            ModelConfig(type="mock", retry_base_delay=0.001), delay_seconds=0
+        )
+        self.errors = list(errors)
+
+    def invoke(self, system_prompt, user_prompt):
+        if self.errors:
+            raise self.errors.pop(0)
+        return super().invoke(system_prompt, user_prompt)
+
+    async def ainvoke(self, system_prompt, user_prompt):
+        if self.errors:
+            raise self.errors.pop(0)
+        return await super().ainvoke(system_prompt, user_prompt)
+
+
+def test_retryable_errors():
+    """Test that only transient errors are retried"""
+    assert is_retryable_error(StatusError(429))
+    assert is_retryable_error(StatusError(502))
+    assert is_retryable_error(ConnectionError())
+    assert not is_retryable_error(StatusError(400))
+    assert not is_retryable_error(ValueError())
+
+
+def test_retry_after_headers():
+    """Test that Retry-After is read in seconds, milliseconds or as a date"""
+    assert retry_after_seconds(StatusError(429, {"retry-after": "2"})) == 2.0
+    assert retry_after_seconds(StatusError(429, {"retry-after-ms": "250"})) == 0.25
+    assert (
+        retry_after_seconds(
+            StatusError(429, {"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})
+        )
+        == 0.0
+    )
+    assert retry_after_seconds(StatusError(429)) is None
+
+
+def test_backoff_uses_full_jitter_and_retry_after():
+    """Test the delay between attempts"""
+    policy = RetryPolicy(base_delay=1, max_delay=5)
+
+    with patch("promptlab.model.retry.random.uniform", return_value=0.5) as uniform:
+        assert policy.delay(3, StatusError(503)) == 0.5
+        uniform.assert_called_once_with(0, 5)
+
+    assert policy.delay(1, StatusError(429, {"retry-after": "7"})) == 7.0
+
+
+def test_model_retries_and_records_the_count():
+    """Test that a transient failure is retried and counted on the result"""
+    model = FlakyModel([StatusError(429), StatusError(503)])
+
+    result = model("system", "user")
+
+    assert result.inference == "Sync response to: user"
+    assert result.retries == 2
+
+
+def test_model_gives_up_after_max_attempts():
+    """Test that the last error is raised once all attempts failed"""
+    model = FlakyModel([StatusError(429)] * 3)
+
+    with pytest.raises(StatusError):
+        model("system", "user")
+
+
+def test_model_does_not_retry_client_errors():
+    """Test that non retryable errors are raised immediately"""
+    model = FlakyModel([StatusError(400)])
+
+    with pytest.raises(StatusError):
+        model("system", "user")
+    assert model.errors == []
+
+
+@pytest.mark.asyncio
+async def test_async_model_retries():
+    """Test that the async path retries transient failures"""
+    model = FlakyModel([ConnectionError()])
+
+    result = await model("system", "user")
+
+    assert result.retries == 1
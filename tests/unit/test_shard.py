@@ -0,0 +1,230 @@
+import json
+import pytest
+import sys
+import os
+import threading
+import time
+from tests.fixtures.test_utils import (
+    MockModel,
+    create_assets,
+    create_dataset_file,
+    create_experiment_config,
+    create_sqlite_tracer,
+)
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.shard import ShardedExperiment  # noqa: E402
+from promptlab.utils import Utils  # noqa: E402
+
+
+class FailingModel(MockModel):
+    def invoke(self, system_prompt, user_prompt):
+        raise ValueError("model failed")
+
+
+class LeaseTakingModel(MockModel):
+    """Hands the shard to another worker during the first request"""
+
+    def __init__(self, db_client):
+        super().__init__(delay_seconds=0)
+        self.db_client = db_client
+        self.calls = 0
+
+    def invoke(self, system_prompt, user_prompt):
+        self.calls += 1
+        if self.calls == 1:
+            self.db_client.execute_query(
+                "UPDATE experiment_shard SET worker_id = 'other', lease_expires_at = ?",
+                (time.time() + 60,),
+            )
+            # Give the worker's next renewal time to fail
+            time.sleep(0.2)
+        return super().invoke(system_prompt, user_prompt)
+
+
+def setup_assets(tmp_path, records=10):
+    create_assets(
+        create_sqlite_tracer(tmp_path),
+        create_dataset_file(tmp_path, records, blank_lines=True),
+    )
+
+
+def result_record_ids(tracer, experiment_id):
+    rows = tracer.db_client.fetch_data(
+        "SELECT dataset_record_id FROM experiment_result WHERE experiment_id = ?",
+        (experiment_id,),
+    )
+    return sorted(int(row["dataset_record_id"]) for row in rows)
+
+
+def test_dataset_shards_cover_every_record(tmp_path):
+    """Test that byte ranges of shards split the dataset without gaps"""
+    dataset_path = create_dataset_file(tmp_path, 10, blank_lines=True)
+
+    shards = list(Utils.dataset_shards(dataset_path, 4))
+
+    assert [records for _, _, records in shards] == [4, 4, 2]
+    ids = [
+        record["id"]
+        for start, end, _ in shards
+        for record in Utils.stream_dataset_range(dataset_path, start, end)
+    ]
+    assert ids == list(range(10))
+
+
+def test_workers_merge_results_under_one_experiment(tmp_path):
+    """Test that concurrent workers process every shard exactly once"""
+    setup_assets(tmp_path, records=10)
+    experiment_id = ShardedExperiment(create_sqlite_tracer(tmp_path)).submit(
+        create_experiment_config(), shard_size=3
+    )
+
+    completed = []
+
+    def work():
+        worker = ShardedExperiment(create_sqlite_tracer(tmp_path))
+        completed.append(
+            worker.work(create_experiment_config(experiment_id=experiment_id))
+        )
+
+    workers = [threading.Thread(target=work) for _ in range(3)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    tracer = create_sqlite_tracer(tmp_path)
+    assert sum(completed) == 4
+    assert result_record_ids(tracer, experiment_id) == list(range(10))
+    progress = ShardedExperiment(tracer).progress(experiment_id)
+    assert progress == {"done": {"shards": 4, "records": 10}}
+
+    # Every shard keeps its own run metrics
+    metrics = json.loads(
+        tracer.db_client.fetch_data(
+            "SELECT metrics FROM experiments WHERE experiment_id = ?",
+            (experiment_id,),
+        )[0]["metrics"]
+    )
+    assert sorted(metrics["shards"]) == ["0", "1", "2", "3"]
+    assert all("timings" in shard for shard in metrics["shards"].values())
+
+
+@pytest.mark.asyncio
+async def test_async_worker_processes_all_shards(tmp_path):
+    """Test that work_async drains the queue"""
+    setup_assets(tmp_path, records=5)
+    sharded_experiment = ShardedExperiment(create_sqlite_tracer(tmp_path))
+    experiment_id = sharded_experiment.submit(create_experiment_config(), shard_size=2)
+
+    assert (
+        await sharded_experiment.work_async(
+            create_experiment_config(experiment_id=experiment_id)
+        )
+        == 3
+    )
+    assert result_record_ids(sharded_experiment.tracer, experiment_id) == list(range(5))
+
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    """Test that a crashed worker's shard goes back to the queue"""
+    setup_assets(tmp_path, records=4)
+    sharded_experiment = ShardedExperiment(
+        create_sqlite_tracer(tmp_path), lease_seconds=0.2
+    )
+    experiment_id = sharded_experiment.submit(create_experiment_config(), shard_size=4)
+    queue = sharded_experiment.queue
+
+    shard = queue.claim(experiment_id, "crashed")
+    assert queue.claim(experiment_id, "other") is None
+
+    time.sleep(0.3)
+    reclaimed = queue.claim(experiment_id, "other")
+
+    assert reclaimed["shard_index"] == shard["shard_index"]
+    assert reclaimed["attempts"] == 2
+    # The first worker lost its lease and can't complete the shard
+    assert not queue.complete(experiment_id, shard["shard_index"], "crashed")
+    assert queue.complete(experiment_id, shard["shard_index"], "other")
+
+
+def test_failed_shard_is_released(tmp_path):
+    """Test that a shard is requeued right away when its worker fails"""
+    setup_assets(tmp_path, records=4)
+    sharded_experiment = ShardedExperiment(create_sqlite_tracer(tmp_path))
+    experiment_id = sharded_experiment.submit(create_experiment_config(), shard_size=4)
+
+    experiment_config = create_experiment_config(experiment_id=experiment_id)
+    experiment_config["inference_model"] = FailingModel(delay_seconds=0)
+
+    with pytest.raises(ValueError):
+        sharded_experiment.work(experiment_config)
+
+    assert sharded_experiment.progress(experiment_id) == {
+        "queued": {"shards": 1, "records": 4}
+    }
+
+
+def test_shard_fails_after_max_attempts(tmp_path):
+    """Test that a failing shard is not retried forever"""
+    setup_assets(tmp_path, records=4)
+    sharded_experiment = ShardedExperiment(
+        create_sqlite_tracer(tmp_path), max_attempts=2
+    )
+    experiment_id = sharded_experiment.submit(create_experiment_config(), shard_size=4)
+
+    experiment_config = create_experiment_config(experiment_id=experiment_id)
+    experiment_config["inference_model"] = FailingModel(delay_seconds=0)
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            sharded_experiment.work(experiment_config)
+
+    assert sharded_experiment.work(experiment_config) == 0
+    assert sharded_experiment.progress(experiment_id) == {
+        "failed": {"shards": 1, "records": 4}
+    }
+
+
+def test_crashed_shard_fails_after_max_attempts(tmp_path):
+    setup_assets(tmp_path, records=4)
+    sharded_experiment = ShardedExperiment(
+        create_sqlite_tracer(tmp_path), lease_seconds=0.1, max_attempts=1
+    )
+    experiment_id = sharded_experiment.submit(create_experiment_config(), shard_size=4)
+
+    assert sharded_experiment.queue.claim(experiment_id, "crashed")
+    time.sleep(0.15)
+
+    assert sharded_experiment.queue.claim(experiment_id, "other") is None
+    assert sharded_experiment.progress(experiment_id) == {
+        "failed": {"shards": 1, "records": 4}
+    }
+
+
+def test_lost_lease_aborts_the_shard(tmp_path):
+    """Test that a worker stops a shard as soon as it loses the lease"""
+    setup_assets(tmp_path, records=6)
+    tracer = create_sqlite_tracer(tmp_path)
+    sharded_experiment = ShardedExperiment(tracer, lease_seconds=0.15)
+    experiment_id = sharded_experiment.submit(create_experiment_config(), shard_size=6)
+
+    experiment_config = create_experiment_config(experiment_id=experiment_id)
+    experiment_config["inference_model"] = LeaseTakingModel(tracer.db_client)
+
+    assert sharded_experiment.work(experiment_config) == 0
+    # The chunk in progress is kept, the rest is left to the lease's owner
+    assert result_record_ids(tracer, experiment_id) == [0, 1]
+    assert sharded_experiment.progress(experiment_id) == {
+        "leased": {"shards": 1, "records": 6}
+    }
+
+
+def test_work_requires_a_submitted_experiment(tmp_path):
+    setup_assets(tmp_path)
+    sharded_experiment = ShardedExperiment(create_sqlite_tracer(tmp_path))
+
+    with pytest.raises(ValueError):
+        sharded_experiment.work(create_experiment_config(experiment_id="missing"))
@@ -0,0 +1,181 @@
+import asyncio
+import pytest
+import sys
+from types import SimpleNamespace
+import os
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.evaluator.similarity import SemanticSimilarity  # noqa: E402
+from promptlab.cache.embedding_cache import SharedEmbedding  # noqa: E402
+from promptlab.model.concurrency import AdaptiveLimiter  # noqa: E402
+from promptlab.model.deepseek import DeepSeek_Embedding  # noqa: E402
+from promptlab.model.model import EmbeddingModel  # noqa: E402
+from promptlab.types import EmbeddingModel as EmbeddingModelProtocol  # noqa: E402
+from promptlab.types import ModelConfig  # noqa: E402
+
+
+class HashEmbedding(EmbeddingModel):
+    max_batch_size = 64
+
+    def __init__(self):
+        super().__init__(ModelConfig(type="mock", embedding_model_deployment="e"))
+
+    def __call__(self, text):
+        rng = np.random.default_rng(sum(text.encode("utf-8")))
+        return rng.normal(size=8).tolist()
+
+
+class AsyncHashEmbedding(HashEmbedding):
+    """Embeds natively async, recording how many batches were in flight"""
+
+    max_batch_size = 2
+
+    def __init__(self):
+        super().__init__()
+        self.active = 0
+        self.max_active = 0
+
+    def _embed_batch(self, texts):
+        raise AssertionError("the async path must not use the sync client")
+
+    async def _aembed_batch(self, texts):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.active -= 1
+        return [self(text) for text in texts]
+
+
+def make_evaluator():
+    evaluator = SemanticSimilarity()
+    evaluator.embedding = HashEmbedding()
+    return evaluator
+
+
+def test_batch_matches_per_record_scores():
+    """Test that the vectorized batch path scores like the per-record path"""
+    evaluator = make_evaluator()
+    data = [
+        {"response": f"response {i}", "reference": f"reference {i % 3}"}
+        for i in range(10)
+    ]
+
+    batch_scores = evaluator.evaluate_batch(data)
+
+    assert len(batch_scores) == 10
+    np.testing.assert_allclose(
+        batch_scores, [evaluator.evaluate(record) for record in data]
+    )
+
+
+def test_identical_texts_score_one():
+    """Test that a response equal to its reference has similarity 1"""
+    evaluator = make_evaluator()
+
+    scores = evaluator.evaluate_batch([{"response": "same", "reference": "same"}])
+
+    np.testing.assert_allclose(scores, [1.0])
+    assert evaluator.evaluate_batch([]) == []
+
+
+def test_aembed_matches_call():
+    """Test that the async contract returns what __call__ does"""
+    embedding = HashEmbedding()
+
+    assert asyncio.run(embedding.aembed("text")) == embedding("text")
+
+
+def test_async_batch_uses_async_path_within_limit():
+    """Test that async scoring embeds natively async within the shared limit"""
+    evaluator = make_evaluator()
+    evaluator.embedding = AsyncHashEmbedding()
+    limiter = AdaptiveLimiter(2, adaptive=False)
+    evaluator.embedding.limiter = limiter
+    data = [
+        {"response": f"response {i}", "reference": f"reference {i}"} for i in range(6)
+    ]
+
+    scores = asyncio.run(evaluator.aevaluate_batch(data))
+
+    np.testing.assert_allclose(
+        scores, [make_evaluator().evaluate(record) for record in data]
+    )
+    assert evaluator.embedding.max_active == 2
+    assert limiter.requests == 6
+
+
+def test_zero_vector_scores_zero_instead_of_nan():
+    similarities = SemanticSimilarity._similarities(
+        [[0.0, 0.0], [1.0, 0.0]], [[1.0, 0.0], [1.0, 0.0]]
+    )
+
+    assert similarities == [0.0, 1.0]
+
+
+class PlainEmbedding:
+    """A user supplied embedding model implementing only the protocol"""
+
+    def __call__(self, text):
+        return HashEmbedding()(text)
+
+
+def test_plain_callable_embedding_model():
+    """Test that models without embed_many or aembed_many are called per text"""
+    data = [{"response": f"response {i}", "reference": "reference"} for i in range(4)]
+    expected = make_evaluator().evaluate_batch(data)
+
+    for embedding in [PlainEmbedding(), SharedEmbedding(PlainEmbedding())]:
+        assert isinstance(embedding, EmbeddingModelProtocol)
+        evaluator = SemanticSimilarity()
+        evaluator.embedding = embedding
+
+        np.testing.assert_allclose(evaluator.evaluate_batch(data), expected)
+        np.testing.assert_allclose(
+            asyncio.run(evaluator.aevaluate_batch(data)), expected
+        )
+
+
+class FailingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        raise ConnectionError("provider unavailable")
+
+    async def acreate(self, **kwargs):
+        return self.create(**kwargs)
+
+
+def test_embedding_failures_are_retried_once_per_attempt():
+    """Test that a failing batch is retried by one retry policy, not two"""
+    embedding = DeepSeek_Embedding(
+        ModelConfig(
+            type="deepseek",
+            api_key="key",
+            endpoint="https://api.deepseek.com",
+            embedding_model_deployment="e",
+            max_attempts=2,
+            retry_base_delay=0,
+        )
+    )
+    embeddings = FailingEmbeddings()
+    embedding.clients = SimpleNamespace(
+        client=SimpleNamespace(embeddings=embeddings),
+        async_client=SimpleNamespace(
+            embeddings=SimpleNamespace(create=embeddings.acreate)
+        ),
+    )
+
+    with pytest.raises(ConnectionError):
+        embedding.embed_many(["a", "b"])
+    assert embeddings.calls == 2
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(embedding.aembed_many(["a", "b"]))
+    assert embeddings.calls == 4
@@ -0,0 +1,189 @@
+import json
+import pytest
+import sqlite3
+import sys
+import os
+from tests.fixtures.test_utils import (
+    create_mock_experiment_config,
+    create_sqlite_tracer,
+)
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.db.sqlite import SQLiteClient  # noqa: E402
+
+
+def make_result(experiment_id, record_id):
+    return {
+        "experiment_id": experiment_id,
+        "dataset_record_id": record_id,
+        "inference": "inference",
+        "prompt_tokens": 1,
+        "completion_tokens": 1,
+        "latency_ms": 1.0,
+        "evaluation": "[]",
+        "created_at": "2025-01-01T00:00:00",
+    }
+
+
+def count_results(tracer, experiment_id):
+    return tracer.db_client.fetch_data(
+        "SELECT COUNT(*) AS n FROM experiment_result WHERE experiment_id = ?",
+        (experiment_id,),
+    )[0]["n"]
+
+
+def test_results_are_persisted_in_chunks(tmp_path):
+    """Test that results are flushed to the database as each chunk fills up"""
+    tracer = create_sqlite_tracer(tmp_path, chunk_size=2)
+    tracer.start_experiment(create_mock_experiment_config(), "exp-1")
+
+    experiments = tracer.db_client.fetch_data("SELECT experiment_id FROM experiments")
+    assert experiments == [{"experiment_id": "exp-1"}]
+
+    for record_id in range(3):
+        tracer.trace_result(make_result("exp-1", record_id))
+
+    # The first full chunk is durable, the partial one is still buffered
+    assert count_results(tracer, "exp-1") == 2
+
+    tracer.flush()
+    assert count_results(tracer, "exp-1") == 3
+
+
+def test_failed_write_keeps_results_buffered(tmp_path):
+    """Test that a chunk that can't be written raises and is written later"""
+    tracer = create_sqlite_tracer(tmp_path, chunk_size=1)
+    tracer.db_client.execute_query("ALTER TABLE experiment_result RENAME TO moved")
+
+    with pytest.raises(sqlite3.OperationalError):
+        tracer.trace_result(make_result("exp", 1))
+
+    tracer.db_client.execute_query("ALTER TABLE moved RENAME TO experiment_result")
+    assert count_results(tracer, "exp") == 0
+    assert tracer.flush() == 1
+    assert count_results(tracer, "exp") == 1
+
+
+def test_trace_persists_full_summary(tmp_path):
+    """Test that the one-shot trace API still persists a complete experiment"""
+    tracer = create_sqlite_tracer(tmp_path, chunk_size=4)
+    summary = [make_result("exp-2", record_id) for record_id in range(10)]
+
+    tracer.trace(create_mock_experiment_config(), summary)
+
+    assert count_results(tracer, "exp-2") == 10
+
+
+def test_completed_record_ids(tmp_path):
+    """Test the lookup used to resume an experiment"""
+    tracer = create_sqlite_tracer(tmp_path, chunk_size=2)
+    tracer.start_experiment(create_mock_experiment_config(), "exp-3")
+    for record_id in [1, 2, "a"]:
+        tracer.trace_result(make_result("exp-3", record_id))
+    tracer.flush()
+
+    assert tracer.experiment_exists("exp-3")
+    assert not tracer.experiment_exists("missing")
+    assert tracer.get_completed_record_ids("exp-3") == {"1", "2", "a"}
+    assert tracer.get_completed_record_ids("missing") == set()
+    assert tracer.get_completed_record_ids("exp-3", ["2", "a", "9"]) == {"2", "a"}
+
+
+def test_init_db_adds_metrics_column_to_old_databases(tmp_path):
+    """Test that an experiments table without metrics is migrated"""
+    db_client = SQLiteClient(str(tmp_path / "promptlab.db"))
+    db_client.execute_query(
+        "CREATE TABLE experiments (experiment_id TEXT PRIMARY KEY, model BLOB, "
+        "asset BLOB, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    )
+
+    tracer = create_sqlite_tracer(tmp_path, chunk_size=2)
+    tracer.start_experiment(create_mock_experiment_config(), "exp")
+    tracer.finish_experiment("exp", {"concurrency": {"concurrency_limit": 7}})
+
+    rows = db_client.fetch_data("SELECT metrics FROM experiments")
+    assert json.loads(rows[0]["metrics"]) == {"concurrency": {"concurrency_limit": 7}}
+
+
+def test_streaming_metrics_are_persisted(tmp_path):
+    """Test that streamed results keep their time to first token, others NULL"""
+    db_client = SQLiteClient(str(tmp_path / "promptlab.db"))
+    db_client.execute_query(
+        "CREATE TABLE experiment_result (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "experiment_id TEXT, dataset_record_id TEXT, inference TEXT, "
+        "prompt_tokens INTEGER, completion_tokens INTEGER, latency_ms REAL, "
+        "evaluation BLOB, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    )
+
+    tracer = create_sqlite_tracer(tmp_path, chunk_size=2)
+    tracer.start_experiment(create_mock_experiment_config(), "exp")
+    streamed = make_result("exp", 1)
+    streamed.update(
+        time_to_first_token_ms=120.0,
+        inter_token_latency_ms=15.0,
+        tokens_per_second=66.7,
+    )
+    tracer.trace_result(streamed)
+    tracer.trace_result(make_result("exp", 2))
+    tracer.flush()
+
+    rows = db_client.fetch_data(
+        "SELECT time_to_first_token_ms, inter_token_latency_ms, tokens_per_second "
+        "FROM experiment_result ORDER BY dataset_record_id"
+    )
+    assert rows == [
+        {
+            "time_to_first_token_ms": 120.0,
+            "inter_token_latency_ms": 15.0,
+            "tokens_per_second": 66.7,
+        },
+        {
+            "time_to_first_token_ms": None,
+            "inter_token_latency_ms": None,
+            "tokens_per_second": None,
+        },
+    ]
+
+
+def test_init_db_keeps_existing_results(tmp_path):
+    """Test that results traced more than once by earlier versions are kept"""
+    db_client = SQLiteClient(str(tmp_path / "promptlab.db"))
+    db_client.execute_query(
+        "CREATE TABLE experiment_result (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "experiment_id TEXT, dataset_record_id TEXT, inference TEXT, "
+        "prompt_tokens INTEGER, completion_tokens INTEGER, latency_ms REAL, "
+        "evaluation BLOB, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    )
+    for inference in ["first", "second"]:
+        db_client.execute_query(
+            "INSERT INTO experiment_result (experiment_id, dataset_record_id, "
+            "inference) VALUES ('exp', '1', ?)",
+            (inference,),
+        )
+
+    tracer = create_sqlite_tracer(tmp_path, chunk_size=2)
+    # Datasets may repeat an id, every record is traced
+    for record_id in [2, 2]:
+        tracer.trace_result(make_result("exp", record_id))
+    tracer.flush()
+
+    assert count_results(tracer, "exp") == 4
+
+
+def test_skip_traced_records(tmp_path):
+    """Test that shard workers don't trace a record that has a result"""
+    tracer = create_sqlite_tracer(tmp_path, chunk_size=2)
+    tracer.trace_result(make_result("exp", 1))
+    tracer.flush()
+
+    tracer.skip_traced_records = True
+    for record_id in [1, 2, 2]:
+        tracer.trace_result(make_result("exp", record_id))
+    tracer.flush()
+
+    rows = tracer.db_client.fetch_data(
+        "SELECT dataset_record_id FROM experiment_result ORDER BY id"
+    )
+    assert [row["dataset_record_id"] for row in rows] == ["1", "2"]
@@ -0,0 +1,205 @@
+import asyncio
+import pytest
+import sys
+import os
+import time
+from types import SimpleNamespace
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.model.deepseek import DeepSeek  # noqa: E402
+from promptlab.model.ollama import Ollama  # noqa: E402
+from promptlab.model.streaming import (  # noqa: E402
+    StreamTimer,
+    aread_chat_completion_stream,
+    read_chat_completion_stream,
+)
+from promptlab.types import ModelConfig  # noqa: E402
+
+TOKENS = ["The", " capital", " is", " Paris"]
+
+
+def chat_completion_chunks():
+    for token in TOKENS:
+        time.sleep(0.002)
+        yield SimpleNamespace(
+            choices=[SimpleNamespace(delta=SimpleNamespace(content=token))],
+            usage=None,
+        )
+    yield SimpleNamespace(
+        choices=[], usage=SimpleNamespace(prompt_tokens=9, completion_tokens=4)
+    )
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.requests = []
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return chat_completion_chunks()
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+
+        async def chunks():
+            for chunk in chat_completion_chunks():
+                await asyncio.sleep(0)
+                yield chunk
+
+        return chunks()
+
+
+def fake_openai_clients():
+    return SimpleNamespace(
+        client=SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions())),
+        async_client=SimpleNamespace(
+            chat=SimpleNamespace(completions=FakeAsyncCompletions())
+        ),
+    )
+
+
+def assert_streamed(result):
+    assert result.inference == "The capital is Paris"
+    assert result.prompt_tokens == 9
+    assert result.completion_tokens == 4
+    assert 0 < result.time_to_first_token_ms <= result.latency_ms
+    assert result.inter_token_latency_ms >= 2
+    assert result.tokens_per_second > 0
+    assert result.timings["time_to_first_token"] > 0
+
+
+def make_deepseek(stream):
+    model = DeepSeek(
+        ModelConfig(
+            type="deepseek",
+            api_key="key",
+            endpoint="https://api.deepseek.com",
+            inference_model_deployment="deepseek-chat",
+            stream=stream,
+        )
+    )
+    model.clients = fake_openai_clients()
+    return model
+
+
+def test_openai_compatible_stream():
+    model = make_deepseek(stream=True)
+
+    result = model.invoke("system", "question")
+
+    assert_streamed(result)
+    request = model.clients.client.chat.completions.requests[0]
+    assert request["stream"] is True
+    assert request["stream_options"] == {"include_usage": True}
+
+
+def test_openai_compatible_async_stream():
+    model = make_deepseek(stream=True)
+
+    assert_streamed(asyncio.run(model.ainvoke("system", "question")))
+
+
+def test_streaming_metrics_reach_stage_timings():
+    """Test that the time to first token is kept next to the other stages"""
+    model = make_deepseek(stream=True)
+
+    result = model("system", "question")
+
+    assert set(result.timings) == {"time_to_first_token", "queue_wait", "network"}
+
+
+def test_ollama_stream():
+    def chunks(**kwargs):
+        for token in TOKENS:
+            time.sleep(0.002)
+            yield SimpleNamespace(
+                message=SimpleNamespace(content=token),
+                prompt_eval_count=None,
+                eval_count=None,
+            )
+        yield SimpleNamespace(
+            message=SimpleNamespace(content=""), prompt_eval_count=9, eval_count=4
+        )
+
+    model = Ollama(
+        ModelConfig(type="ollama", inference_model_deployment="llama3", stream=True)
+    )
+    model.clients = SimpleNamespace(client=SimpleNamespace(chat=chunks))
+
+    assert_streamed(model.invoke("system", "question"))
+
+
+class BrokenStream:
+    """Sends the first chunk, then fails or hangs, recording its closing"""
+
+    def __init__(self):
+        self.chunks = chat_completion_chunks()
+        self.sent = 0
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.sent:
+            raise ConnectionError("stream interrupted")
+        self.sent += 1
+        return next(self.chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.sent:
+            await asyncio.sleep(10)
+        self.sent += 1
+        return next(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_stream_is_closed_when_reading_fails():
+    stream = BrokenStream()
+
+    with pytest.raises(ConnectionError):
+        read_chat_completion_stream(stream, StreamTimer())
+
+    assert stream.closed
+
+
+def test_async_stream_is_closed_when_cancelled():
+    async def run():
+        stream = BrokenStream()
+        task = asyncio.create_task(aread_chat_completion_stream(stream, StreamTimer()))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return stream
+
+    assert asyncio.run(run()).closed
+
+
+def test_timer_without_tokens_or_usage():
+    """Test that an empty stream has no streaming metrics"""
+    timer = StreamTimer()
+    result = timer.result("", 0, 0)
+    assert result.time_to_first_token_ms is None
+    assert result.tokens_per_second is None
+
+    timer = StreamTimer()
+    timer.token()
+    timer.token()
+    time.sleep(0.001)
+    result = timer.result("ab", 0, 0)
+    # Without usage every chunk counts as a token
+    assert result.tokens_per_second > 0
+    assert result.inter_token_latency_ms is not None
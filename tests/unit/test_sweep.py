@@ -0,0 +1,159 @@
+import asyncio
+import json
+import pytest
+import sys
+import os
+from tests.fixtures.test_utils import (
+    MockModel,
+    create_dataset_file,
+    create_sqlite_tracer,
+)
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.asset import Asset  # noqa: E402
+from promptlab.model.model import EmbeddingModel  # noqa: E402
+from promptlab.sweep import Sweep  # noqa: E402
+from promptlab.types import (  # noqa: E402
+    Dataset,
+    EvaluationConfig,
+    ModelConfig,
+    PromptTemplate,
+)
+
+
+class CountingEmbedding(EmbeddingModel):
+    def __init__(self):
+        super().__init__(ModelConfig(type="mock", embedding_model_deployment="e"))
+        self.texts = []
+
+    def __call__(self, text):
+        return [1.0, float(len(text))]
+
+    def _embed_batch(self, texts):
+        self.texts.extend(texts)
+        return [self(text) for text in texts]
+
+    async def _aembed_batch(self, texts):
+        await asyncio.sleep(0.01)
+        return self._embed_batch(texts)
+
+
+def make_sweep(tmp_path, records=5):
+    tracer = create_sqlite_tracer(tmp_path)
+    dataset_file = create_dataset_file(tmp_path, records, text="reference")
+
+    asset = Asset(tracer)
+    asset.create(Dataset(name="dataset", description="", file_path=dataset_file))
+    for name in ("short", "long"):
+        asset.create(
+            PromptTemplate(
+                name=name,
+                system_prompt=f"Be {name}",
+                user_prompt="Answer <text>",
+            )
+        )
+
+    return Sweep(tracer)
+
+
+def make_sweep_config(models, embedding):
+    return {
+        "inference_models": models,
+        "embedding_model": embedding,
+        "prompt_templates": [
+            PromptTemplate(name="short", version=0),
+            PromptTemplate(name="long", version=0),
+        ],
+        "dataset": Dataset(name="dataset", description="", file_path="", version=0),
+        "evaluation": [
+            EvaluationConfig(
+                metric="SemanticSimilarity",
+                column_mapping={"response": "$inference", "reference": "text"},
+            )
+        ],
+        "evaluation_batch_size": 2,
+    }
+
+
+def count_rows(tracer, query, params=()):
+    return tracer.db_client.fetch_data(query, params)[0]["n"]
+
+
+def test_sweep_writes_one_experiment_per_cell(tmp_path):
+    """Test that every model and template pair is traced as its own experiment"""
+    sweep = make_sweep(tmp_path)
+    embedding = CountingEmbedding()
+    models = [MockModel(delay_seconds=0), MockModel(delay_seconds=0)]
+
+    experiment_ids = sweep.run(make_sweep_config(models, embedding))
+
+    assert len(set(experiment_ids)) == 4
+    assert count_rows(sweep.tracer, "SELECT COUNT(*) AS n FROM experiments") == 4
+    for experiment_id in experiment_ids:
+        assert (
+            count_rows(
+                sweep.tracer,
+                "SELECT COUNT(*) AS n FROM experiment_result WHERE experiment_id = ?",
+                (experiment_id,),
+            )
+            == 5
+        )
+
+    # References are embedded once for all four cells
+    references = [text for text in embedding.texts if text.startswith("reference")]
+    assert sorted(references) == [f"reference {i}" for i in range(5)]
+
+    # Every cell stores run metrics of its own
+    for experiment_id in experiment_ids:
+        metrics = json.loads(
+            sweep.tracer.db_client.fetch_data(
+                "SELECT metrics FROM experiments WHERE experiment_id = ?",
+                (experiment_id,),
+            )[0]["metrics"]
+        )
+        assert metrics["timings"]["network"]["count"] == 5
+
+
+@pytest.mark.asyncio
+async def test_async_sweep_shares_rendering_and_embeddings(tmp_path):
+    """Test that concurrent cells share one embedding call per text"""
+    sweep = make_sweep(tmp_path)
+    embedding = CountingEmbedding()
+    models = [MockModel(delay_seconds=0.01), MockModel(delay_seconds=0.01)]
+
+    experiment_ids = await sweep.run_async(make_sweep_config(models, embedding))
+
+    assert count_rows(sweep.tracer, "SELECT COUNT(*) AS n FROM experiments") == 4
+    assert count_rows(sweep.tracer, "SELECT COUNT(*) AS n FROM experiment_result") == 20
+    references = [text for text in embedding.texts if text.startswith("reference")]
+    assert sorted(references) == [f"reference {i}" for i in range(5)]
+    assert set(sweep.run_metrics) == set(experiment_ids)
+
+    # Models get their own limiter back after the sweep
+    assert all(model.limiter is None for model in models)
+
+
+@pytest.mark.asyncio
+async def test_async_sweep_cells_do_not_wait_for_each_other(tmp_path):
+    """Test that a fast model's cells finish without waiting for a slow model"""
+    sweep = make_sweep(tmp_path, records=6)
+    fast, slow = MockModel(delay_seconds=0), MockModel(delay_seconds=0.2)
+
+    traced = []
+    trace_result = sweep.tracer.trace_result
+
+    def record_trace(result):
+        traced.append(result["experiment_id"])
+        trace_result(result)
+
+    sweep.tracer.trace_result = record_trace
+
+    experiment_ids = await sweep.run_async(
+        make_sweep_config([fast, slow], CountingEmbedding())
+    )
+
+    fast_cells, slow_cells = set(experiment_ids[:2]), set(experiment_ids[2:])
+    first_slow = min(i for i, cell in enumerate(traced) if cell in slow_cells)
+    assert sum(cell in fast_cells for cell in traced[:first_slow]) == 12
@@ -0,0 +1,137 @@
+import asyncio
+import pytest
+import sys
+import os
+from unittest.mock import MagicMock
+from tests.fixtures.test_utils import MockModel, create_mock_experiment_config
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath("./src"))
+
+from promptlab.evaluator.evaluator import Evaluator  # noqa: E402
+from promptlab.experiment import Experiment  # noqa: E402
+from promptlab.model.concurrency import AdaptiveLimiter  # noqa: E402
+from promptlab.timing import LogHistogram, StageTimings  # noqa: E402
+
+
+class LengthEvaluator(Evaluator):
+    def evaluate(self, data: dict):
+        return len(data["response"])
+
+
+def length_evaluation():
+    evaluation = MagicMock()
+    evaluation.metric = "length"
+    evaluation.column_mapping = {"response": "$inference"}
+    evaluation.evaluator = LengthEvaluator()
+    evaluation.execution = "thread"
+    return [evaluation]
+
+
+def test_histograms_report_percentiles_in_milliseconds():
+    """Test nearest rank percentiles over recorded durations"""
+    timings = StageTimings()
+    for duration_ms in range(1, 101):
+        timings.record("network", duration_ms * 1_000_000)
+
+    histogram = timings.histograms()["network"]
+
+    assert histogram["count"] == 100
+    assert histogram["p50_ms"] == pytest.approx(50, rel=0.01)
+    assert histogram["p90_ms"] == pytest.approx(90, rel=0.01)
+    assert histogram["p99_ms"] == pytest.approx(99, rel=0.01)
+    assert histogram["max_ms"] == 100
+    assert histogram["mean_ms"] == pytest.approx(50.5)
+
+
+def test_log_histogram_has_a_fixed_size():
+    histogram = LogHistogram()
+    size = len(histogram.counts)
+
+    histogram.record(5)
+    histogram.record(1_000_003, count=1_000_000)
+    histogram.record(10**15)
+
+    assert len(histogram.counts) == size
+    assert histogram.count == 1_000_002
+    # Small durations are exact, larger ones within a bucket's width
+    assert histogram.percentile(0) == 5
+    assert histogram.percentile(50) == pytest.approx(1_000_003, rel=1 / 128)
+    assert histogram.percentile(100) == 10**15
+
+
+def test_chunk_durations_are_shared_between_records():
+    timings = StageTimings()
+    timings.record("render", 8_000_000, records=4)
+
+    histogram = timings.histograms()["render"]
+
+    assert histogram["count"] == 4
+    assert histogram["max_ms"] == 2
+
+
+@pytest.mark.asyncio
+async def test_model_reports_queue_wait_and_network_time():
+    """Test that a request waiting for a concurrency slot reports the wait"""
+    model = MockModel(delay_seconds=0.05)
+    model.limiter = AdaptiveLimiter(1)
+
+    first, second = await asyncio.gather(model("s", "u1"), model("s", "u2"))
+
+    assert first.timings["network"] >= 40_000_000
+    assert max(first.timings["queue_wait"], second.timings["queue_wait"]) >= 40_000_000
+
+
+def test_experiment_stores_stage_histograms():
+    """Test that a run reports every stage of the pipeline"""
+    tracer = MagicMock()
+    tracer.trace_result.side_effect = [0, 0, 0, 4, 0, 0]
+    tracer.flush.return_value = 2
+    experiment = Experiment(tracer)
+    dataset = [{"id": i, "text": f"text {i}"} for i in range(6)]
+
+    experiment_id = experiment.init_batch_eval(
+        dataset,
+        "system",
+        "user <text>",
+        ["text"],
+        create_mock_experiment_config(MockModel(0), length_evaluation()),
+    )
+
+    timings = experiment.run_metrics["timings"]
+    assert set(timings) == {
+        "render",
+        "queue_wait",
+        "network",
+        "evaluation.length",
+        "persist",
+    }
+    assert timings["network"]["count"] == 6
+    # Each write is shared between the results it persisted
+    assert timings["persist"]["count"] == 6
+    tracer.finish_experiment.assert_called_once_with(
+        experiment_id, experiment.run_metrics
+    )
+
+
+@pytest.mark.asyncio
+async def test_async_experiment_stores_stage_histograms():
+    tracer = MagicMock()
+    tracer.trace_result.return_value = 0
+    tracer.flush.return_value = 6
+    experiment = Experiment(tracer)
+    dataset = [{"id": i, "text": f"text {i}"} for i in range(6)]
+
+    await experiment.init_batch_eval_async(
+        dataset,
+        "system",
+        "user <text>",
+        ["text"],
+        create_mock_experiment_config(MockModel(0.01), length_evaluation()),
+    )
+
+    timings = experiment.run_metrics["timings"]
+    assert timings["render"]["count"] == 6
+    assert timings["evaluation.length"]["count"] == 6
+    assert timings["persist"]["count"] == 6
+    assert timings["network"]["p50_ms"] >= 5